@@ -0,0 +1,206 @@
+# agents/bench_fastpaths.py
+"""
+Benchmark for the fast-path engine (agents/fastpaths/engine.py).
+
+    python agents/bench_fastpaths.py                                # corpus in agents/fastpath_corpus.jsonl
+    python agents/bench_fastpaths.py --from-db 5000                 # last N user messages from the message table
+    python agents/bench_fastpaths.py --from-db 5000 --dump s.jsonl  # write them out for labelling
+    python agents/bench_fastpaths.py --labels s.jsonl               # score against hand labels
+
+For every message it compares the engine's first fast path against `legacy_route`,
+the sequential checks run_with_agent used before the engine (kept here as the
+reference), and reports:
+  - agreement with the legacy routing
+  - time to classify a message, legacy vs the engine
+  - on real messages (--from-db, --labels) only: the share a fast path would answer
+    without an LLM call (an upper bound: a handler can still pass, e.g. slots when no
+    clinic can be resolved)
+  - with --labels: accuracy of both routings against the "expect" route a person gave
+    each message (null = should go to the LLM); rows without an "expect" key are skipped
+
+The corpus is hand-written and its "expect" values are what legacy_route returns, so
+on the corpus only parity and timing mean anything. Rows marked "legacy_mismatch" are
+known legacy false positives (e.g. "facebook" matching "book"); the engine's agreement
+with their "intended" route is reported separately.
+
+Messages pulled with --from-db are anonymized (emails, phone numbers) before use.
+Routing assumes a signed-in super admin (client_id=1).
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import agents.orchestrator  # noqa: F401,E402  (registers the fast-path rules)
+from agents.fastpaths.engine import FastPathContext, fastpath_engine  # noqa: E402
+from agents.fastpaths.services import parse_service_update  # noqa: E402
+from agents.tools.helpers.parsing import (  # noqa: E402
+    EMAIL_RE, PHONE_RE, UPDATE_CLINIC_CURRENT_NEW, UPDATE_CLINIC_NAME_FREEFORM, UPDATE_CLINIC_NAME_OF_TO,
+    UPDATE_CLINIC_NAME_POSSESSIVE_TO, UPDATE_CLINIC_NAME_TO, UPDATE_CLINIC_RENAME_FROM_TO, UPDATE_CLINIC_SIMPLE,
+    parse_clinic_id, parse_lead_id, parse_lead_update_fields,
+)
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fastpath_corpus.jsonl")
+CLIENT_ID = 1
+
+_APPT_KEYS = (
+    "appointment", "appointments", "book", "booking", "schedule", "reschedule", "give me available slots",
+    "cancel appointment", "cancel booking", "slot", "slots", "availability", "available slots", "booked", "my clinic slots",
+)
+_RENAME = (UPDATE_CLINIC_NAME_TO, UPDATE_CLINIC_NAME_FREEFORM, UPDATE_CLINIC_NAME_POSSESSIVE_TO,
+           UPDATE_CLINIC_NAME_OF_TO, UPDATE_CLINIC_RENAME_FROM_TO, UPDATE_CLINIC_CURRENT_NEW)
+
+
+def legacy_route(msg: str, client_id=CLIENT_ID):
+    """First fast path the pre-engine run_with_agent would have tried (None -> LLM)."""
+    m = msg.lower()
+    if any(w in m for w in ("service", "services")) and parse_service_update(msg):
+        return "service_update"
+    lead_id, clinic_id = parse_lead_id(msg), parse_clinic_id(msg)
+    em, ph = EMAIL_RE.search(msg), PHONE_RE.search(msg)
+    rename = any(p.search(msg) for p in _RENAME)
+    if client_id is None and rename:
+        return "rename_needs_client"
+    if client_id is None and (lead_id is not None or clinic_id is not None or em or ph):
+        return "ids_need_client"
+    if rename:
+        clinic_id = None
+    if client_id is not None and (
+        UPDATE_CLINIC_SIMPLE.search(msg) or rename
+        or ("clinic name" in m and any(v in m for v in ("update", "change", "edit", "set", "rename")))
+    ):
+        return "clinic_update"
+    if parse_lead_update_fields(msg):
+        return "lead_update"
+    appt = any(k in m for k in _APPT_KEYS)
+    if appt and any(k in m for k in ("book", "create", "schedule", "make an appointment")):
+        return "appointment_book"
+    if appt and "slot" in m:
+        return "appointment_slots"
+    if "clinic" in m and any(k in m for k in ("my", "details", "info", "information", "address", "about", "show", "get", "my clinic")):
+        return "clinic_details"
+    if client_id is None:
+        return None
+    if lead_id is not None:
+        return "lead_by_id"
+    if clinic_id is not None:
+        return "clinic_by_id"
+    if em or ph:
+        return "lead_search"
+    return None
+
+
+def engine_route(msg: str, client_id=CLIENT_ID):
+    """First fast path the engine would try, built the way run_with_agent builds its context."""
+    s = fastpath_engine.scan(msg)
+    ctx = FastPathContext(
+        msg=msg, signals=s, user_id="bench", client_id=client_id, is_super_admin=True,
+        lead_id=parse_lead_id(msg) if s.has("lead_id") else None,
+        clinic_id=None if s.has("rename") else (parse_clinic_id(msg) if s.has("clinic_id") else None),
+        email=s.text("email"), phone=s.text("phone"),
+    )
+    rules = fastpath_engine.candidates(ctx)
+    return rules[0] if rules else None
+
+
+def load_corpus(path: str = CORPUS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+_PHONE_ANY = re.compile(r"\+?\d[\d\-\s().]{6,}\d")
+
+
+def anonymize(text: str) -> str:
+    text = EMAIL_RE.sub("someone@example.com", text)
+    return _PHONE_ANY.sub("206-555-0100", text)
+
+
+async def load_from_db(limit: int):
+    from tortoise import Tortoise
+    from helper.tortoise_config import TORTOISE_CONFIG
+    from models.message import Message
+    await Tortoise.init(config=TORTOISE_CONFIG)
+    try:
+        rows = await Message.all().order_by("-id").limit(limit).values_list("user_message", flat=True)
+    finally:
+        await Tortoise.close_connections()
+    return [{"text": anonymize(t), "expect": None} for t in rows if (t or "").strip()]
+
+
+def _pct(samples, q):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(q * len(s)))] if s else 0.0
+
+
+def _time_us(fn, texts, rounds):
+    per = []
+    for _ in range(rounds):
+        for t in texts:
+            t0 = time.perf_counter()
+            fn(t)
+            per.append((time.perf_counter() - t0) * 1e6)
+    return per
+
+
+def dump(rows, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps({"text": r["text"]}) + "\n")
+    print(f"wrote {len(rows)} messages to {path}; add an \"expect\" route to each and pass it with --labels")
+
+
+def run(rows, real: bool, labelled: bool = False, rounds: int = 20):
+    texts = [r["text"] for r in rows]
+    legacy = [legacy_route(t) for t in texts]
+    engine = [engine_route(t) for t in texts]
+
+    n = len(rows)
+    agree = sum(a == b for a, b in zip(legacy, engine))
+    served = sum(e is not None for e in engine)
+    print(f"messages={n} signals={len(fastpath_engine.signal_names)} rules={len(fastpath_engine.rules)}")
+    print(f"  engine == legacy routing:        {agree / n:.1%}")
+    known = [(r, e) for r, e in zip(rows, engine) if r.get("legacy_mismatch")]
+    if known:
+        print(f"  engine == intended (mismatches): {sum(r.get('intended') == e for r, e in known)}/{len(known)}")
+    if labelled:
+        scored = [(r, l, e) for r, l, e in zip(rows, legacy, engine) if "expect" in r]
+        if scored:
+            print(f"  vs hand labels ({len(scored)} rows): "
+                  f"legacy {sum(r['expect'] == l for r, l, _ in scored) / len(scored):.1%}  "
+                  f"engine {sum(r['expect'] == e for r, _, e in scored) / len(scored):.1%}")
+    if real:
+        print(f"  answered by a fast path (no LLM): {served / n:.1%}  ({served}/{n}, upper bound)")
+        for rule, c in Counter(e for e in engine if e).most_common():
+            print(f"    {rule:<20} {c}")
+
+    legacy_us = _time_us(legacy_route, texts, rounds)
+    scan_us = _time_us(fastpath_engine.scan, texts, rounds)
+    route_us = _time_us(engine_route, texts, rounds)
+    print(f"  classify p50/p95 (us): legacy {_pct(legacy_us, .5):.1f}/{_pct(legacy_us, .95):.1f}  "
+          f"engine scan {_pct(scan_us, .5):.1f}/{_pct(scan_us, .95):.1f}  "
+          f"engine scan+rules {_pct(route_us, .5):.1f}/{_pct(route_us, .95):.1f}")
+
+    for t, a, b in zip(texts, legacy, engine):
+        if a != b:
+            print(f"    differs: {t!r} legacy={a} engine={b}")
+
+
+if __name__ == "__main__":
+    if "--from-db" in sys.argv:
+        i = sys.argv.index("--from-db")
+        limit = int(sys.argv[i + 1]) if len(sys.argv) > i + 1 else 5000
+        rows = asyncio.run(load_from_db(limit))
+        if "--dump" in sys.argv:
+            dump(rows, sys.argv[sys.argv.index("--dump") + 1])
+        else:
+            run(rows, real=True)
+    elif "--labels" in sys.argv:
+        run(load_corpus(sys.argv[sys.argv.index("--labels") + 1]), real=True, labelled=True)
+    else:
+        run(load_corpus(), real=False)
@@ -24,6 +24,20 @@ register(AgentSpec(
     ),
     tools=[update_lead],             # <- important
     # allow_tool_calls defaults to True in our AgentSpec; if not, set allow_tool_calls=True here
+    examples=[
+        "mark lead 19 as won",
+        "update lead 42 status to contacted",
+        "change the email of lead 7 to sam@example.com",
+        "set lead 12 phone number to 555 201 3344",
+        "add a note to lead 8 that she prefers mornings",
+        "mark this lead as lost",
+        "assign lead 30 to the front desk",
+        "rename lead 5 to John Carter",
+        "update the lead score for lead 14",
+        "close lead 22 as converted",
+        "edit lead details for maria",
+        "change lead status to follow up",
+    ],
 ))
 
 # ✅ SQLReader for fetching
@@ -36,6 +50,21 @@ register(AgentSpec(
         "only fall back to generic sql_select when truly necessary."
     ),
     tools=[lead_get_http, lead_get, lead_search, sql_select],
+    examples=[
+        "show lead id 16",
+        "find lead by email myla@example.com",
+        "lookup lead phone +1 206 555 1234",
+        "who is lead 33",
+        "get me the details of lead 9",
+        "search leads named johnson",
+        "list my latest leads",
+        "how many leads did we get this week",
+        "show hot leads with high score",
+        "which leads came from google ads",
+        "find the patient who called yesterday",
+        "pull up the lead for sarah",
+        "show me leads that have not been contacted",
+    ],
 ))
 
 register(AgentSpec(
@@ -45,6 +74,18 @@ register(AgentSpec(
         "Use dedicated service wrappers (create_reminder/push_notification) exposed by orchestrator tools."
     ),
     tools=[],
+    examples=[
+        "remind me tomorrow at 9am to call leads",
+        "set a reminder to follow up with lead 12 on friday",
+        "notify me when new leads come in",
+        "send me a notification now",
+        "remind me in two hours to check the schedule",
+        "alert me about missed calls",
+        "create a reminder for monday morning",
+        "ping me at 5pm about the invoices",
+        "don't let me forget to call the clinic next week",
+        "push a notification to my phone",
+    ],
 ))
 
 
@@ -59,6 +100,20 @@ if "SmallTalk" not in REGISTRY:
         ),
         tools=[],
         allow_tool_calls=False,
+        examples=[
+            "hi",
+            "hello there",
+            "good morning",
+            "thanks a lot",
+            "how are you",
+            "who are you",
+            "what can you do",
+            "what is my name",
+            "tell me about my profile",
+            "ok bye",
+            "that's great, thank you",
+            "help",
+        ],
     ))
 
 register(AgentSpec(
@@ -69,6 +124,18 @@ register(AgentSpec(
         "Always include the enforced client_id (provided by the system)."
     ),
     tools=[clinic_get_http, clinic_search_http, clinic_update],
+    examples=[
+        "show my clinic details",
+        "what is the address of clinic 3",
+        "list my clinics",
+        "rename my clinic to Bright Smiles",
+        "update clinic 4 phone number",
+        "what are the opening hours of my clinic",
+        "change the clinic email",
+        "is clinic 2 active",
+        "find the downtown location",
+        "give me information about our office",
+    ],
 ))
 
 register(AgentSpec(
@@ -82,6 +149,18 @@ register(AgentSpec(
         "Return compact, structured outputs. Never guess IDs."
     ),
     tools=[tool_service_list, tool_service_get, tool_service_search, tool_service_update],
+    examples=[
+        "list services",
+        "what services do we offer",
+        "search services for whitening",
+        "show service 7",
+        "update service 7 name to Whitening",
+        "do we provide dental implants",
+        "which treatments are included in reports",
+        "find the botox service",
+        "change the description of the cleaning service",
+        "how many services are there",
+    ],
 ))
 
 register(AgentSpec(
@@ -97,4 +176,16 @@ register(AgentSpec(
         "Prefer tools over free-form text. Return compact, structured answers."
     ),
     tools=[appointment_slots, appointment_create, appointment_update, appointment_cancel, appointment_get],
+    examples=[
+        "available slots for clinic 3 today",
+        "book an appointment for lead 12 tomorrow at 10am",
+        "cancel appointment 123",
+        "reschedule lead 40 to next monday",
+        "what slots are open tomorrow",
+        "show booked slots for friday",
+        "is there availability this afternoon",
+        "schedule a consultation for maria on 2025-11-05",
+        "move my 3pm booking to 4pm",
+        "show the appointment for lead 18",
+    ],
 ))
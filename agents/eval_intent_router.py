@@ -0,0 +1,80 @@
+# agents/eval_intent_router.py
+"""
+Offline accuracy/latency evaluation for the local intent router.
+
+    python agents/eval_intent_router.py            # local router only
+    python agents/eval_intent_router.py --llm      # also time/score the LLM router on the same set
+
+Training utterances come from AgentSpec.examples (agents/defs.py); the held-out
+set is agents/intent_eval.jsonl ({"text", "agent"} per line).
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+import agents.defs  # noqa: F401,E402  (registers the agents and their examples)
+from agents.intent_router import INTENT_MIN_MARGIN, INTENT_MIN_SCORE, get_router  # noqa: E402
+
+EVAL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_eval.jsonl")
+
+
+def load_eval(path: str = EVAL_PATH):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _pct(samples, q):
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(q * len(s)))] if s else 0.0
+
+
+def eval_local(rows):
+    router = get_router()
+    for r in rows[:5]:  # warm-up
+        router.route(r["text"])
+    latencies, correct, confident, confident_correct, misses = [], 0, 0, 0, []
+    for r in rows:
+        t0 = time.perf_counter()
+        out = router.route(r["text"])
+        latencies.append((time.perf_counter() - t0) * 1000)
+        ok = out["agent"] == r["agent"]
+        correct += ok
+        if out["confident"]:
+            confident += 1
+            confident_correct += ok
+        if not ok:
+            misses.append((r["text"], r["agent"], out["agent"], out["margin"], out["confident"]))
+    n = len(rows)
+    print(f"encoder={router.encoder.name} examples={sum(len(v) for v in router.examples.values())} "
+          f"agents={len(router.centroids)} eval={n} (min_score={INTENT_MIN_SCORE}, min_margin={INTENT_MIN_MARGIN})")
+    print(f"  top-1 accuracy (all):        {correct / n:.1%}")
+    print(f"  answered locally:            {confident / n:.1%}  (rest go to the LLM)")
+    if confident:
+        print(f"  accuracy when answered:      {confident_correct / confident:.1%}")
+    print(f"  latency p50/p95/max:         {_pct(latencies, .5):.3f} / {_pct(latencies, .95):.3f} / {max(latencies):.3f} ms")
+    for text, want, got, margin, conf in misses:
+        print(f"    miss{' (sent to LLM)' if not conf else ''}: {text!r} want={want} got={got} margin={margin}")
+
+
+async def eval_llm(rows):
+    from agents.router import pick_agent_llm
+    latencies, correct = [], 0
+    for r in rows:
+        t0 = time.perf_counter()
+        out = await pick_agent_llm(r["text"])
+        latencies.append((time.perf_counter() - t0) * 1000)
+        correct += out["agent"] == r["agent"]
+    print(f"LLM router: accuracy {correct / len(rows):.1%}, latency p50 {statistics.median(latencies):.0f} ms, "
+          f"p95 {_pct(latencies, .95):.0f} ms")
+
+
+if __name__ == "__main__":
+    data = load_eval()
+    eval_local(data)
+    if "--llm" in sys.argv:
+        asyncio.run(eval_llm(data))
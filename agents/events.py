@@ -0,0 +1,59 @@
+# agents/events.py
+"""
+Progress events from the agent orchestrator.
+
+`stream_with_agent()` runs `run_with_agent()` and yields its events as they happen:
+
+    {"type": "agent", "agent": "ClinicAgent"}
+    {"type": "tool_start", "tool": "clinic_get_http", "id": "call_1"}
+    {"type": "tool_end", "tool": "clinic_get_http", "id": "call_1", "ok": true, "ms": 212.4}
+    {"type": "token", "text": "Clinic "}             # final answer, in small chunks
+    {"type": "final", "text": "<full answer>"}
+
+Code on the agent path calls `emit(...)`; it is a no-op unless a stream is listening
+(the queue is carried in a contextvar, so concurrent tool tasks inherit it).
+"""
+import asyncio
+import contextvars
+import re
+from typing import Any, AsyncIterator, Dict, Optional
+
+_events: contextvars.ContextVar[Optional[asyncio.Queue]] = contextvars.ContextVar("agent_events", default=None)
+_DONE = object()
+_CHUNK = re.compile(r"\s*\S+\s*|\s+")
+
+
+def emit(event_type: str, **data: Any) -> None:
+    q = _events.get()
+    if q is not None:
+        q.put_nowait({"type": event_type, **data})
+
+
+def answer_chunks(text: str):
+    """Word-sized pieces of a finished answer (whitespace kept, so "".join() == text)."""
+    return _CHUNK.findall(text or "")
+
+
+async def stream_with_agent(user_message: str, chat_id: int, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+    from agents.orchestrator import run_with_agent
+
+    q: asyncio.Queue = asyncio.Queue()
+    token = _events.set(q)
+    try:
+        task = asyncio.create_task(run_with_agent(user_message=user_message, chat_id=chat_id, user_id=user_id))
+    finally:
+        _events.reset(token)
+    task.add_done_callback(lambda _t: q.put_nowait(_DONE))
+
+    # a client that disconnects does not cancel the turn: tools with side effects
+    # (bookings, updates) must not be cut off half-way
+    while True:
+        ev = await q.get()
+        if ev is _DONE:
+            break
+        yield ev
+
+    answer = task.result() or "OK"  # re-raises orchestrator errors
+    for piece in answer_chunks(answer):
+        yield {"type": "token", "text": piece}
+    yield {"type": "final", "text": answer}
@@ -6,6 +6,7 @@ from datetime import date
 from typing import Optional, Dict, List, Tuple
 
 from agents.tools.helpers.logging import ai_dbg
+from agents.fastpaths.engine import SIGNALS, Signals, fastpath_engine
 from agents.tools.helpers.natural_language import (
     parse_time_any,
     parse_date_any,
@@ -20,21 +21,22 @@ from agents.tools.lead_tools import lead_search  # name-based lookup
 
 # -------- Intent + extractors
 
-RE_SLOTS   = re.compile(r"\b(slots?|availability|available\s+times?)\b", re.I)
-RE_CREATE  = re.compile(r"\b(book|create|make)\s+(?:an?\s+)?appointment\b", re.I)
-RE_UPDATE  = re.compile(r"\b(update|reschedule|change|move)\s+(?:the\s+)?appointment\b", re.I)
-RE_CANCEL  = re.compile(r"\b(cancel)\s+(?:the\s+)?appointment\b", re.I)
+# intent patterns live with the other fast-path signals (agents/fastpaths/engine.py)
+RE_SLOTS   = SIGNALS["appt_slots"]
+RE_CREATE  = SIGNALS["appt_create"]
+RE_UPDATE  = SIGNALS["appt_update"]
+RE_CANCEL  = SIGNALS["appt_cancel"]
 
 # Accept "appointment id 123" / "lead id 123" / "appointment #123"
 RE_ID = re.compile(r"\b(?:appointment|lead)\s*(?:id|#)?\s*(\d{1,10})\b", re.I)
 
 
-def parse_appt_intent(msg: str) -> str:
-    m = msg or ""
-    if RE_CANCEL.search(m): return "cancel"
-    if RE_UPDATE.search(m): return "update"
-    if RE_CREATE.search(m): return "create"
-    if RE_SLOTS.search(m):  return "slots"
+def parse_appt_intent(msg: str, signals: Optional[Signals] = None) -> str:
+    s = signals or fastpath_engine.scan(msg or "")
+    if s.has("appt_cancel"): return "cancel"
+    if s.has("appt_update"): return "update"
+    if s.has("appt_create"): return "create"
+    if s.has("appt_slots"):  return "slots"
     return "none"
 
 
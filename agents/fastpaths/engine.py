@@ -0,0 +1,245 @@
+# agents/fastpaths/engine.py
+"""
+Deterministic fast paths for the agent orchestrator, as one table of signals and rules.
+
+Every intent check the orchestrator runs before calling a model (keyword lists,
+the clinic/lead/service update patterns, id/email/phone hints, appointment verbs)
+is a named *signal*. `scan(msg)` evaluates each of them once per message, with the
+same `k in msg.lower()` / `pattern.search(msg)` check the orchestrator used, so routing
+is unchanged (agents/bench_fastpaths.py checks this):
+
+    signals = fastpath_engine.scan(msg)
+    signals.has("lead_update"), signals.any("clinic_word", "clinic_id_tail")
+
+Fast paths are rules in priority order, each declaring the signals it needs:
+
+    @fastpath_engine.rule("lead_update", all_of=("lead_update",))
+    async def _lead_update(ctx): ...
+
+`dispatch(ctx)` only calls handlers whose signals fired; the first non-None reply
+wins and no model is called. `report()` (GET /api/metrics/fastpaths) gives per-rule
+hits and the fraction of agent-path messages answered without any LLM call.
+"""
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Pattern, Sequence, Tuple, Union
+
+from agents.fastpaths.services import UPDATE_SERVICE_SIMPLE
+from agents.tools.helpers.parsing import (
+    CLINIC_ID_HEAD, CLINIC_ID_TAIL, EMAIL_RE, LEAD_ID_HEAD, LEAD_ID_TAIL, PHONE_RE,
+    UPDATE_CLINIC_CURRENT_NEW, UPDATE_CLINIC_NAME_FREEFORM, UPDATE_CLINIC_NAME_OF_TO,
+    UPDATE_CLINIC_NAME_POSSESSIVE_TO, UPDATE_CLINIC_NAME_TO, UPDATE_CLINIC_RENAME_FROM_TO,
+    UPDATE_CLINIC_SIMPLE, UPDATE_LEAD_EMAIL_TO, UPDATE_LEAD_NAME_TO, UPDATE_LEAD_PHONE_TO,
+    UPDATE_LEAD_STATUS_TO,
+)
+from helper.metrics import counter, histogram
+
+# ---------------- signals ----------------
+# keyword signals are case-insensitive substring checks, same as `k in msg.lower()`
+APPOINTMENT_KEYS = (
+    "appointment", "appointments", "book", "booking", "schedule", "reschedule", "give me available slots",
+    "cancel appointment", "cancel booking", "slot", "slots", "availability", "available slots", "booked", "my clinic slots",
+)
+BOOK_KEYS = ("book", "create", "schedule", "make an appointment")
+CLINIC_DETAIL_KEYS = ("my", "details", "info", "information", "address", "about", "show", "get", "my clinic")
+UPDATE_VERB_KEYS = ("update", "change", "edit", "set", "rename")
+
+SignalSource = Union[Pattern, Tuple[str, ...]]
+
+SIGNALS: Dict[str, SignalSource] = {
+    # services
+    "service_word": ("service",),
+    "service_update": UPDATE_SERVICE_SIMPLE,
+    # appointments
+    "appointment": APPOINTMENT_KEYS,
+    "book_word": BOOK_KEYS,
+    "slot_word": ("slot",),
+    "appt_cancel": re.compile(r"\b(cancel)\s+(?:the\s+)?appointment\b", re.I),
+    "appt_update": re.compile(r"\b(update|reschedule|change|move)\s+(?:the\s+)?appointment\b", re.I),
+    "appt_create": re.compile(r"\b(book|create|make)\s+(?:an?\s+)?appointment\b", re.I),
+    "appt_slots": re.compile(r"\b(slots?|availability|available\s+times?)\b", re.I),
+    # clinics
+    "clinic_word": ("clinic",),
+    "clinic_detail_word": CLINIC_DETAIL_KEYS,
+    "clinic_name_word": ("clinic name",),
+    "update_verb": UPDATE_VERB_KEYS,
+    "clinic_update_simple": UPDATE_CLINIC_SIMPLE,
+    "rename_name_to": UPDATE_CLINIC_NAME_TO,
+    "rename_freeform": UPDATE_CLINIC_NAME_FREEFORM,
+    "rename_possessive": UPDATE_CLINIC_NAME_POSSESSIVE_TO,
+    "rename_of_to": UPDATE_CLINIC_NAME_OF_TO,
+    "rename_from_to": UPDATE_CLINIC_RENAME_FROM_TO,
+    "rename_current_new": UPDATE_CLINIC_CURRENT_NEW,
+    # leads
+    "lead_status_to": UPDATE_LEAD_STATUS_TO,
+    "lead_phone_to": UPDATE_LEAD_PHONE_TO,
+    "lead_email_to": UPDATE_LEAD_EMAIL_TO,
+    "lead_name_to": UPDATE_LEAD_NAME_TO,
+    # ids / contact hints
+    "lead_id_tail": LEAD_ID_TAIL,
+    "lead_id_head": LEAD_ID_HEAD,
+    "clinic_id_tail": CLINIC_ID_TAIL,
+    "clinic_id_head": CLINIC_ID_HEAD,
+    "email": EMAIL_RE,
+    "phone": PHONE_RE,
+}
+
+# signals that stand for "any of these fired"
+DERIVED: Dict[str, Tuple[str, ...]] = {
+    "rename": ("rename_name_to", "rename_freeform", "rename_possessive", "rename_of_to", "rename_from_to", "rename_current_new"),
+    "lead_update": ("lead_status_to", "lead_phone_to", "lead_email_to", "lead_name_to"),
+    "lead_id": ("lead_id_tail", "lead_id_head"),
+    "clinic_id": ("clinic_id_tail", "clinic_id_head"),
+}
+
+FASTPATH_MATCH_SECONDS = histogram(
+    "agent_fastpath_match_seconds", "Time to scan a message for all fast-path signals",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.01),
+)
+FASTPATH_MESSAGES = counter("agent_fastpath_messages_total", "Agent-path messages by how they were answered (fastpath/llm)")
+FASTPATH_RULES = counter("agent_fastpath_rule_total", "Fast-path rule outcomes by rule (served/passed)")
+
+
+class Signals:
+    __slots__ = ("names", "_matches")
+
+    def __init__(self, names: FrozenSet[str], matches: Optional[Dict[str, "re.Match"]] = None):
+        self.names = names
+        self._matches = matches or {}
+
+    def has(self, name: str) -> bool:
+        return name in self.names
+
+    def any(self, *names: str) -> bool:
+        return any(n in self.names for n in names)
+
+    def text(self, name: str) -> Optional[str]:
+        """The text a pattern signal matched (e.g. the email address), or None."""
+        m = self._matches.get(name)
+        return m.group(0) if m is not None else None
+
+    def __repr__(self) -> str:
+        return f"Signals({sorted(self.names)})"
+
+
+@dataclass
+class FastPathContext:
+    """What a fast-path handler may use: the message, its signals and the caller's identity."""
+    msg: str
+    signals: Signals
+    user_id: str = ""
+    client_id: Optional[int] = None
+    is_super_admin: bool = False
+    lead_id: Optional[int] = None
+    clinic_id: Optional[int] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+
+
+Handler = Callable[[FastPathContext], Awaitable[Optional[str]]]
+
+
+class _Rule:
+    __slots__ = ("name", "all_of", "any_of", "when", "handler")
+
+    def __init__(self, name: str, all_of: Sequence[str], any_of: Sequence[str],
+                 when: Optional[Callable[[FastPathContext], bool]], handler: Handler):
+        self.name = name
+        self.all_of = frozenset(all_of)
+        self.any_of = frozenset(any_of)
+        self.when = when
+        self.handler = handler
+
+    def fires(self, ctx: FastPathContext) -> bool:
+        names = ctx.signals.names
+        if not self.all_of <= names:
+            return False
+        if self.any_of and self.any_of.isdisjoint(names):
+            return False
+        return self.when is None or bool(self.when(ctx))
+
+
+class FastPathEngine:
+    def __init__(self, signals: Dict[str, SignalSource] = SIGNALS, derived: Dict[str, Tuple[str, ...]] = DERIVED):
+        self.signal_names = tuple(signals)
+        self.keywords: Dict[str, Tuple[str, ...]] = {
+            n: tuple(k.lower() for k in src) for n, src in signals.items() if isinstance(src, tuple)
+        }
+        self.patterns: Dict[str, Pattern] = {n: p for n, p in signals.items() if not isinstance(p, tuple)}
+        self.derived = dict(derived)
+        self.rules: List[_Rule] = []
+        self.stats: Dict[str, int] = {"messages": 0, "fastpath": 0, "llm": 0}
+        self.rule_hits: Dict[str, int] = {}
+
+    # ---------- matching ----------
+    def scan(self, msg: str) -> Signals:
+        t0 = time.perf_counter()
+        msg = msg or ""
+        low = msg.lower()
+        names = {name for name, keys in self.keywords.items() if any(k in low for k in keys)}
+        matches: Dict[str, "re.Match"] = {}
+        for name, pattern in self.patterns.items():
+            m = pattern.search(msg)
+            if m is not None:
+                matches[name] = m
+                names.add(name)
+        for name, parts in self.derived.items():
+            if not names.isdisjoint(parts):
+                names.add(name)
+        FASTPATH_MATCH_SECONDS.observe(time.perf_counter() - t0)
+        return Signals(frozenset(names), matches)
+
+    # ---------- rules ----------
+    def rule(self, name: str, all_of: Iterable[str] = (), any_of: Iterable[str] = (),
+             when: Optional[Callable[[FastPathContext], bool]] = None):
+        """Register the decorated `async def handler(ctx) -> Optional[str]`, after the existing rules."""
+        all_of, any_of = tuple(all_of), tuple(any_of)
+        known = set(self.signal_names) | set(self.derived)
+        unknown = [n for n in all_of + any_of if n not in known]
+        if unknown:
+            raise ValueError(f"fast path {name!r} uses unknown signals: {unknown}")
+
+        def deco(fn: Handler) -> Handler:
+            self.rules = [r for r in self.rules if r.name != name]
+            self.rules.append(_Rule(name, all_of, any_of, when, fn))
+            return fn
+        return deco
+
+    def candidates(self, ctx: FastPathContext) -> List[str]:
+        """Names of the rules that would be tried for this context, in order."""
+        return [r.name for r in self.rules if r.fires(ctx)]
+
+    async def dispatch(self, ctx: FastPathContext) -> Tuple[Optional[str], Optional[str]]:
+        """(reply, rule name) from the first firing rule that answers, else (None, None)."""
+        self.stats["messages"] += 1
+        for r in self.rules:
+            if not r.fires(ctx):
+                continue
+            reply = await r.handler(ctx)
+            if reply is not None:
+                self.stats["fastpath"] += 1
+                self.rule_hits[r.name] = self.rule_hits.get(r.name, 0) + 1
+                FASTPATH_RULES.inc(labels={"rule": r.name, "result": "served"})
+                FASTPATH_MESSAGES.inc(labels={"path": "fastpath"})
+                return reply, r.name
+            FASTPATH_RULES.inc(labels={"rule": r.name, "result": "passed"})
+        self.stats["llm"] += 1
+        FASTPATH_MESSAGES.inc(labels={"path": "llm"})
+        return None, None
+
+    # ---------- reporting ----------
+    def report(self) -> Dict[str, Any]:
+        n = self.stats["messages"]
+        return {
+            **self.stats,
+            "served_without_llm": round(self.stats["fastpath"] / n, 4) if n else 0.0,
+            "rules": [r.name for r in self.rules],
+            "rule_hits": dict(self.rule_hits),
+            "signals": len(self.signal_names),
+            "match_p50_s": FASTPATH_MATCH_SECONDS.quantile(0.5),
+            "match_p95_s": FASTPATH_MATCH_SECONDS.quantile(0.95),
+        }
+
+
+fastpath_engine = FastPathEngine()
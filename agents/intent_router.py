@@ -0,0 +1,186 @@
+# agents/intent_router.py
+"""
+Local intent router: nearest-centroid classification over the labeled example
+utterances each agent declares in agents/defs.py (`AgentSpec.examples`).
+
+Encoders:
+  - TF-IDF over word uni/bi-grams and in-word character trigrams (default, pure Python,
+    ~0.1 ms per message for the current example set)
+  - a sentence-embedding ONNX model via onnxruntime when INTENT_ONNX_MODEL and
+    INTENT_ONNX_TOKENIZER (a tokenizers `tokenizer.json`) are set; mean-pooled
+    last hidden state
+
+`route()` returns the best agent with its cosine score and the margin over the
+runner-up. agents/router.py only falls back to the LLM when the margin or score
+is below INTENT_MIN_MARGIN / INTENT_MIN_SCORE.
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("uvicorn.error")
+
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.06"))
+INTENT_MIN_SCORE = float(os.getenv("INTENT_MIN_SCORE", "0.12"))
+INTENT_ONNX_MODEL = os.getenv("INTENT_ONNX_MODEL", "")
+INTENT_ONNX_TOKENIZER = os.getenv("INTENT_ONNX_TOKENIZER", "")
+
+Vector = Dict[str, float]
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_PHONE = re.compile(r"\+?\d[\d\s().-]{6,}\d")
+_NUM = re.compile(r"\d+")
+_WORD = re.compile(r"[a-z0-9_']+")
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercased word tokens with emails/phones/numbers folded to placeholders."""
+    t = (text or "").lower()
+    t = _EMAIL.sub(" _email_ ", t)
+    t = _PHONE.sub(" _phone_ ", t)
+    t = _NUM.sub(" _num_ ", t)
+    return _WORD.findall(t)
+
+
+def _features(tokens: Sequence[str]) -> Counter:
+    feats: Counter = Counter()
+    for i, tok in enumerate(tokens):
+        feats["w:" + tok] += 1
+        if i + 1 < len(tokens):
+            feats["b:" + tok + " " + tokens[i + 1]] += 1
+        if not tok.startswith("_"):
+            padded = f"<{tok}>"
+            for j in range(len(padded) - 2):
+                feats["c:" + padded[j:j + 3]] += 0.5
+    return feats
+
+
+def _unit(vec: Vector) -> Vector:
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    return {k: v / norm for k, v in vec.items()} if norm else {}
+
+
+def _dot(a: Vector, b: Vector) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+class TfidfEncoder:
+    name = "tfidf"
+
+    def __init__(self):
+        self.idf: Dict[str, float] = {}
+
+    def fit(self, texts: Iterable[str]) -> "TfidfEncoder":
+        docs = [_features(normalize(t)) for t in texts]
+        df: Counter = Counter()
+        for d in docs:
+            df.update(d.keys())
+        n = len(docs)
+        self.idf = {f: math.log((1 + n) / (1 + c)) + 1.0 for f, c in df.items()}
+        return self
+
+    def encode(self, text: str) -> Vector:
+        feats = _features(normalize(text))
+        # unseen features carry no class signal; dropping them keeps vectors small
+        return _unit({f: (1 + math.log(c)) * self.idf[f] for f, c in feats.items() if f in self.idf})
+
+
+class OnnxEncoder:
+    """Mean-pooled sentence embeddings from an exported encoder (e.g. a MiniLM ONNX export)."""
+
+    name = "onnx"
+
+    def __init__(self, model_path: str, tokenizer_path: str):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self._np = np
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = 1
+        self.session = ort.InferenceSession(model_path, sess_options=opts, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=128)
+
+    def fit(self, texts: Iterable[str]) -> "OnnxEncoder":
+        return self
+
+    def encode(self, text: str) -> Vector:
+        np = self._np
+        enc = self.tokenizer.encode(text or "")
+        ids = np.array([enc.ids], dtype=np.int64)
+        mask = np.array([enc.attention_mask], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.zeros_like(ids)
+        hidden = self.session.run(None, feed)[0][0]
+        pooled = (hidden * mask[0][:, None]).sum(axis=0) / max(1, int(mask.sum()))
+        return _unit({str(i): float(v) for i, v in enumerate(pooled)})
+
+
+def make_encoder():
+    if INTENT_ONNX_MODEL and INTENT_ONNX_TOKENIZER:
+        try:
+            return OnnxEncoder(INTENT_ONNX_MODEL, INTENT_ONNX_TOKENIZER)
+        except Exception as e:
+            logger.warning("[intent] ONNX encoder unavailable (%s); using TF-IDF", e)
+    return TfidfEncoder()
+
+
+class IntentRouter:
+    def __init__(self, examples: Dict[str, List[str]], encoder=None):
+        self.examples = {label: list(texts) for label, texts in examples.items() if texts}
+        self.encoder = encoder or make_encoder()
+        self.encoder.fit(t for texts in self.examples.values() for t in texts)
+        self.centroids: Dict[str, Vector] = {}
+        for label, texts in self.examples.items():
+            acc: Vector = defaultdict(float)
+            for t in texts:
+                for k, v in self.encoder.encode(t).items():
+                    acc[k] += v
+            self.centroids[label] = _unit(dict(acc))
+
+    def scores(self, text: str) -> List[Tuple[str, float]]:
+        vec = self.encoder.encode(text)
+        return sorted(((label, _dot(vec, c)) for label, c in self.centroids.items()), key=lambda x: -x[1])
+
+    def route(self, text: str) -> Dict[str, object]:
+        ranked = self.scores(text)
+        if not ranked:
+            return {"agent": None, "score": 0.0, "margin": 0.0, "confident": False, "runner_up": None}
+        best, score = ranked[0]
+        runner_up, second = ranked[1] if len(ranked) > 1 else (None, 0.0)
+        margin = score - second
+        return {
+            "agent": best,
+            "score": round(score, 4),
+            "margin": round(margin, 4),
+            "runner_up": runner_up,
+            "confident": score >= INTENT_MIN_SCORE and margin >= INTENT_MIN_MARGIN,
+        }
+
+
+_router: Optional[IntentRouter] = None
+_router_key: Optional[Tuple] = None
+
+
+def registry_examples() -> Dict[str, List[str]]:
+    from agents.registry import REGISTRY
+    return {name: list(spec.examples) for name, spec in REGISTRY.items() if spec.examples}
+
+
+def get_router() -> IntentRouter:
+    """Router over the current REGISTRY examples (rebuilt if agents/examples change)."""
+    global _router, _router_key
+    examples = registry_examples()
+    key = tuple(sorted((k, len(v)) for k, v in examples.items()))
+    if _router is None or key != _router_key:
+        _router = IntentRouter(examples)
+        _router_key = key
+    return _router
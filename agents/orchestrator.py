@@ -6,12 +6,13 @@ import difflib
 # Ensure all agents register before use
 import agents.defs  # noqa: F401
 import httpx
-from langchain.chat_models import init_chat_model
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import ToolMessage
 
 from agents.registry import get_agent, REGISTRY
 from agents.router import pick_agent
+from agents.events import emit
+from agents.runtime import agent_runtime
+from agents.tool_executor import execute_tool_calls
 from helper.chat_context import get_chat_history
 from helper.get_data import get_client_data
 # tools
@@ -21,24 +22,16 @@ from agents.tools.helpers.natural_language import parse_time_any, parse_date_any
 from agents.fastpaths.services import parse_service_update
 from agents.tools.service_tools import tool_service_update
 
-from agents.tools.helpers.parsing import (
-    EMAIL_RE, PHONE_RE,
-    parse_lead_id, parse_clinic_id,
-    UPDATE_CLINIC_NAME_TO,
-    UPDATE_CLINIC_NAME_FREEFORM,
-    UPDATE_CLINIC_NAME_POSSESSIVE_TO,
-    UPDATE_CLINIC_NAME_OF_TO,
-    UPDATE_CLINIC_RENAME_FROM_TO,
-    UPDATE_CLINIC_CURRENT_NEW,
-)
+from agents.tools.helpers.parsing import CLINIC_ID_TAIL, parse_lead_id, parse_clinic_id
 from agents.tools.helpers.logging import ai_dbg
 from agents.tools.helpers.formatting import fmt_lead_details, fmt_clinic_details
 from agents.tools.helpers.security import (
-    get_client_id, enforce_client_id, remember_client_id,
+    get_client_id, enforce_client_id,
     get_user_role_info, is_super_admin
 )
 from agents.fastpaths.leads import fastpath_fetch_lead_by_id, fastpath_search_leads, fastpath_update_lead
 from agents.fastpaths.clinics import fastpath_update_clinic
+from agents.fastpaths.engine import FastPathContext, Signals, fastpath_engine
 
 # clinic HTTP tools
 from agents.tools.http_clinics import clinic_get_http, clinic_search_http
@@ -57,20 +50,14 @@ APP_ONLY_HINT = (
 
 # ---------------- intent helpers ----------------
 
-def _looks_like_appointment(msg: str) -> bool:
-    m = (msg or "").lower()
-    keys = (
-        "appointment", "appointments", "book", "booking", "schedule", "reschedule", "give me available slots",
-        "cancel appointment", "cancel booking", "slot", "slots", "availability", "available slots", "booked", "my clinic slots"
-    )
-    return any(k in m for k in keys)
+# keyword/pattern checks are signals of the fast-path engine (agents/fastpaths/engine.py)
+def _looks_like_appointment(msg: str, signals: Optional[Signals] = None) -> bool:
+    return (signals or fastpath_engine.scan(msg)).has("appointment")
 
-def _looks_like_clinic(msg: str) -> bool:
-    m = (msg or "").lower()
-    if "clinic" not in m:
-        return False
-    # broaden triggers
-    return any(k in m for k in ("my", "details", "info", "information", "address", "about", "show", "get", "my clinic"))
+def _looks_like_clinic(msg: str, signals: Optional[Signals] = None) -> bool:
+    # "clinic" plus a broad trigger word (my/details/info/address/show/get ...)
+    s = signals or fastpath_engine.scan(msg)
+    return s.has("clinic_word") and s.has("clinic_detail_word")
 
 def _parse_slots_query(msg: str) -> Dict[str, Optional[str]]:
     """
@@ -81,7 +68,7 @@ def _parse_slots_query(msg: str) -> Dict[str, Optional[str]]:
       - "slots for clinic 5 on 2025-11-05"
     """
     out: Dict[str, Optional[str]] = {"clinic_id": None, "date": None}
-    m = re.search(r"\bclinic\s*(?:id|#)?\s*(\d{1,10})\b", msg, flags=re.I)
+    m = CLINIC_ID_TAIL.search(msg)
     if m:
         out["clinic_id"] = m.group(1)
 
@@ -370,6 +357,131 @@ async def _deterministic_book_reply(user_message: str, client_user_id: str, clie
     chosen_from, chosen_to = flat[0]
 # ------------------------------------------------------
 
+# ---------------- deterministic fast paths ----------------
+# Tried in this order by fastpath_engine.dispatch(); each runs only when its signals
+# fired, and the first one that answers ends the turn without a model call.
+
+@fastpath_engine.rule("service_update", all_of=("service_update",))
+async def _fp_service_update(ctx: FastPathContext) -> Optional[str]:
+    parsed = parse_service_update(ctx.msg)
+    if not parsed:
+        return None
+    if not ctx.is_super_admin:
+        return "You don't have permission to update services. Only a Super Admin can perform this action."
+    try:
+        return await tool_service_update.ainvoke(parsed)
+    except Exception as e:
+        return json.dumps({"ok": False, "error": f"Service fastpath update failed: {e}"}, ensure_ascii=False)
+
+
+@fastpath_engine.rule("rename_needs_client", all_of=("rename",), when=lambda ctx: ctx.client_id is None)
+async def _fp_rename_needs_client(ctx: FastPathContext) -> Optional[str]:
+    return ("I can’t update your clinic because this session isn’t linked to a client. "
+            "Please sign in, then try again.")
+
+
+@fastpath_engine.rule("ids_need_client", any_of=("lead_id", "clinic_id", "email", "phone"),
+                      when=lambda ctx: ctx.client_id is None)
+async def _fp_ids_need_client(ctx: FastPathContext) -> Optional[str]:
+    return ("I can’t access lead or clinic data because your account isn’t linked to a client yet. "
+            "Please sign in or ensure your user has a client_id assigned.")
+
+
+def _clinic_update_requested(ctx: FastPathContext) -> bool:
+    # the same triggers fastpath_update_clinic checks, so it is only awaited when it can answer
+    s = ctx.signals
+    return ctx.client_id is not None and (
+        s.any("clinic_update_simple", "rename") or (s.has("clinic_name_word") and s.has("update_verb"))
+    )
+
+
+@fastpath_engine.rule("clinic_update", when=_clinic_update_requested)
+async def _fp_clinic_update(ctx: FastPathContext) -> Optional[str]:
+    upd = await fastpath_update_clinic(ctx.msg, ctx.client_id)
+    if upd is not None:
+        ai_dbg("clinic.update.return", upd[:300].replace("\n", " | "))
+    return upd
+
+
+@fastpath_engine.rule("lead_update", all_of=("lead_update",))
+async def _fp_lead_update(ctx: FastPathContext) -> Optional[str]:
+    upd_lead = await fastpath_update_lead(ctx.msg, ctx.client_id)
+    if upd_lead is not None:
+        ai_dbg("lead.update.return", upd_lead[:300].replace("\n", " | "))
+    return upd_lead
+
+
+@fastpath_engine.rule("appointment_book", all_of=("appointment", "book_word"))
+async def _fp_appointment_book(ctx: FastPathContext) -> Optional[str]:
+    # best-effort booking of the nearest free slot; the post-LLM path tries it again
+    return await _deterministic_book_reply(ctx.msg, ctx.user_id, ctx.client_id, ctx.clinic_id)
+
+
+@fastpath_engine.rule("appointment_slots", all_of=("appointment", "slot_word"))
+async def _fp_appointment_slots(ctx: FastPathContext) -> Optional[str]:
+    ai_dbg("slots.fastpath.trigger", {"phase": "pre-LLM"})
+    return await _deterministic_slots_reply(ctx.msg, ctx.client_id, ctx.clinic_id)
+
+
+@fastpath_engine.rule("clinic_details", all_of=("clinic_word", "clinic_detail_word"))
+async def _fp_clinic_details(ctx: FastPathContext) -> Optional[str]:
+    if ctx.client_id is None:
+        return "I can’t get clinic details because this session isn’t linked to a client. Please sign in."
+    # If clinic id explicitly in message, use it; else attempt single-clinic autopick.
+    clinic_for_details = ctx.clinic_id
+    if not clinic_for_details:
+        try:
+            args = {"client_id": int(ctx.client_id), "is_active": 1, "limit": 5}
+            ai_dbg("clinic.search.request", {"url": "http://127.0.0.1:8080/api/clinics", "params": args})
+            raw = await clinic_search_http.ainvoke(args)
+            data = json.loads(raw) if isinstance(raw, str) else raw
+            rows = (data or {}).get("rows") or []
+            if len(rows) == 1:
+                clinic_for_details = rows[0]["id"]
+        except Exception as e:
+            ai_dbg("clinic.autopick.error", repr(e))
+
+    if clinic_for_details:
+        try:
+            args_c = {"client_id": int(ctx.client_id), "clinic_id": int(clinic_for_details)}
+            rawc = await clinic_get_http.ainvoke(args_c)
+            dc = json.loads(rawc) if isinstance(rawc, str) else rawc
+            if dc.get("ok") and dc.get("clinic"):
+                return "Clinic details:\n" + fmt_clinic_details(dc["clinic"])
+            return "Clinic not found for your account."
+        except Exception as e:
+            return _json({"ok": False, "error": f"clinic details fastpath failed: {e}"})
+    # If user has multiple clinics, agent path will ask which one.
+    return None
+
+
+@fastpath_engine.rule("lead_by_id", all_of=("lead_id",), when=lambda ctx: ctx.client_id is not None)
+async def _fp_lead_by_id(ctx: FastPathContext) -> Optional[str]:
+    return await fastpath_fetch_lead_by_id(ctx.client_id, ctx.lead_id, ctx.phone, ctx.email)
+
+
+@fastpath_engine.rule("clinic_by_id", when=lambda ctx: ctx.client_id is not None and ctx.clinic_id is not None)
+async def _fp_clinic_by_id(ctx: FastPathContext) -> Optional[str]:
+    try:
+        args_c = {"client_id": ctx.client_id, "clinic_id": ctx.clinic_id}
+        ai_dbg("fastpath.clinic_get.args", args_c)
+        rawc = await clinic_get_http.ainvoke(args_c)
+        ai_dbg("fastpath.clinic_get.raw", (rawc[:500] if isinstance(rawc, str) else str(rawc)[:500]))
+        dc = json.loads(rawc) if isinstance(rawc, str) else rawc
+    except Exception as e:
+        ai_dbg("fastpath.clinic_get.error", repr(e))
+        dc = {"ok": False}
+
+    if dc.get("ok") and dc.get("clinic"):
+        return f"Clinic #{ctx.clinic_id} details:\n" + fmt_clinic_details(dc["clinic"])
+    return f"Clinic #{ctx.clinic_id} not found for your account."
+
+
+@fastpath_engine.rule("lead_search", any_of=("email", "phone"), when=lambda ctx: ctx.client_id is not None)
+async def _fp_lead_search(ctx: FastPathContext) -> Optional[str]:
+    return await fastpath_search_leads(ctx.client_id, ctx.phone, ctx.email, ctx.lead_id)
+
+
 async def run_with_agent(user_message: str, chat_id: int, user_id: str) -> str:
     ai_dbg("chat.incoming", {"user_id": user_id, "chat_id": chat_id, "user_message": user_message})
     msg = (user_message or "").strip()
@@ -379,37 +491,22 @@ async def run_with_agent(user_message: str, chat_id: int, user_id: str) -> str:
     ai_dbg("user.role", role_info)
     sa = await is_super_admin(user_id)
 
-    # Detect intents
-    svc_intent   = any(w in msg.lower() for w in ("service", "services"))
-    appt_intent  = _looks_like_appointment(msg)
-    clinic_intent = _looks_like_clinic(msg)
-
-    # Service fast-path update (block non-SA)
-    parsed = None
-    if svc_intent:
-        parsed = parse_service_update(msg)
-    if parsed:
-        if not sa:
-            return "You don't have permission to update services. Only a Super Admin can perform this action."
-        try:
-            res = await tool_service_update.ainvoke(parsed)
-            return res
-        except Exception as e:
-            return json.dumps({"ok": False, "error": f"Service fastpath update failed: {e}"}, ensure_ascii=False)
+    # Detect intents: every keyword/pattern check, once per message
+    signals = fastpath_engine.scan(msg)
+    ai_dbg("fastpath.signals", sorted(signals.names))
+    svc_intent    = signals.has("service_word")
+    appt_intent   = _looks_like_appointment(msg, signals)
+    clinic_intent = _looks_like_clinic(msg, signals)
 
     # tenancy
     client_id_val = await get_client_id(user_id)
     ai_dbg("user.client_id", client_id_val)
-    ai_dbg("clinic.fastpath.precheck", {"client_id_val": client_id_val, "msg": msg[:120]})
-    remember_client_id(user_id, client_id_val)
-
-    # parse hints for lead/clinic
-    lead_id_req   = parse_lead_id(msg)
-    clinic_id_req = parse_clinic_id(msg)
-    em = EMAIL_RE.search(msg)
-    ph = PHONE_RE.search(msg)
-    email_hint = em.group(0) if em else None
-    phone_hint = ph.group(0) if ph else None
+
+    # parse hints for lead/clinic (only re-parsed when the signal fired)
+    lead_id_req   = parse_lead_id(msg) if signals.has("lead_id") else None
+    clinic_id_req = parse_clinic_id(msg) if signals.has("clinic_id") else None
+    email_hint = signals.text("email")
+    phone_hint = signals.text("phone")
     ai_dbg("parsed.hints", {
         "lead_id_req": lead_id_req, "clinic_id_req": clinic_id_req,
         "email_hint": email_hint, "phone_hint": phone_hint
@@ -436,114 +533,17 @@ async def run_with_agent(user_message: str, chat_id: int, user_id: str) -> str:
     appt_show: Optional[Dict[str, Any]] = None
     # -------------------------------------------------------------------------
 
-    # clinic rename special casing
-    intent_rename = any((
-        UPDATE_CLINIC_NAME_TO.search(msg),
-        UPDATE_CLINIC_NAME_FREEFORM.search(msg),
-        UPDATE_CLINIC_NAME_POSSESSIVE_TO.search(msg),
-        UPDATE_CLINIC_NAME_OF_TO.search(msg),
-        UPDATE_CLINIC_RENAME_FROM_TO.search(msg),
-        UPDATE_CLINIC_CURRENT_NEW.search(msg),
-    ))
-    if client_id_val is None and intent_rename:
-        return ("I can’t update your clinic because this session isn’t linked to a client. "
-                "Please sign in, then try again.")
-    if client_id_val is None and (lead_id_req is not None or clinic_id_req is not None or email_hint or phone_hint):
-        return ("I can’t access lead or clinic data because your account isn’t linked to a client yet. "
-                "Please sign in or ensure your user has a client_id assigned.")
-    if intent_rename:
+    # a rename never refers to a clinic by the id-like number in its new name
+    if signals.has("rename"):
         clinic_id_req = None
 
-    # 1) clinic update fast-path
-    upd = await fastpath_update_clinic(msg, client_id_val)
-    if upd is not None:
-        ai_dbg("clinic.update.return", upd[:300].replace("\n", " | "))
-        return upd
-
-    # 1b) lead update fast-path
-    upd_lead = await fastpath_update_lead(msg, client_id_val)
-    if upd_lead is not None:
-        ai_dbg("lead.update.return", upd_lead[:300].replace("\n", " | "))
-        return upd_lead
-
-    # --- Early deterministic SLOTS check ---
-        # If user asked to book and model didn't produce tools, try deterministic booking (post-LLM we also call this)
-    if appt_intent and any(k in msg.lower() for k in ("book", "create", "schedule", "make an appointment")):
-        # Try booking immediately (best-effort)
-        book = await _deterministic_book_reply(user_message, user_id, client_id_val, clinic_id_req)
-        if book is not None:
-            return book
-
-    if appt_intent and "slot" in (user_message or "").lower():
-        ai_dbg("slots.fastpath.trigger", {"phase": "pre-LLM"})
-        early = await _deterministic_slots_reply(user_message, client_id_val, clinic_id_req)
-        if early is not None:
-            return early
-
-    # ---------- Clinic DETAILS fast-path ----------
-    if clinic_intent:
-        if client_id_val is None:
-            return "I can’t get clinic details because this session isn’t linked to a client. Please sign in."
-        # If clinic id explicitly in message, use it; else attempt single-clinic autopick.
-        clinic_for_details = clinic_id_req
-        if not clinic_for_details:
-            try:
-                args = {"client_id": int(client_id_val), "is_active": 1, "limit": 5}
-                ai_dbg("clinic.search.request", {"url": "http://127.0.0.1:8080/api/clinics", "params": args})
-                raw = await clinic_search_http.ainvoke(args)
-                data = json.loads(raw) if isinstance(raw, str) else raw
-                rows = (data or {}).get("rows") or []
-                if len(rows) == 1:
-                    clinic_for_details = rows[0]["id"]
-            except Exception as e:
-                ai_dbg("clinic.autopick.error", repr(e))
-
-        if clinic_for_details:
-            try:
-                args_c = {"client_id": int(client_id_val), "clinic_id": int(clinic_for_details)}
-                rawc = await clinic_get_http.ainvoke(args_c)
-                dc = json.loads(rawc) if isinstance(rawc, str) else rawc
-                if dc.get("ok") and dc.get("clinic"):
-                    return "Clinic details:\n" + fmt_clinic_details(dc["clinic"])
-                return "Clinic not found for your account."
-            except Exception as e:
-                return _json({"ok": False, "error": f"clinic details fastpath failed: {e}"})
-        # If user has multiple clinics, agent path will ask which one.
-
-    # 2) fetch fast-path for lead/clinic by explicit ids/emails/phones
-    async def _fastpath_fetch() -> Optional[str]:
-        if client_id_val is None:
-            ai_dbg("fastpath.skip", "no client_id")
-            return None
-
-        if lead_id_req is not None:
-            return await fastpath_fetch_lead_by_id(client_id_val, lead_id_req, phone_hint, email_hint)
-
-        if clinic_id_req is not None:
-            try:
-                args_c = {"client_id": client_id_val, "clinic_id": clinic_id_req}
-                ai_dbg("fastpath.clinic_get.args", args_c)
-                rawc = await clinic_get_http.ainvoke(args_c)
-                ai_dbg("fastpath.clinic_get.raw", (rawc[:500] if isinstance(rawc, str) else str(rawc)[:500]))
-                dc = json.loads(rawc) if isinstance(rawc, str) else rawc
-            except Exception as e:
-                ai_dbg("fastpath.clinic_get.error", repr(e))
-                dc = {"ok": False}
-
-            if dc.get("ok") and dc.get("clinic"):
-                clinic = dc["clinic"]
-                return f"Clinic #{clinic_id_req} details:\n" + fmt_clinic_details(clinic)
-            return f"Clinic #{clinic_id_req} not found for your account."
-
-        if email_hint or phone_hint:
-            return await fastpath_search_leads(client_id_val, phone_hint, email_hint, lead_id_req)
-
-        ai_dbg("fastpath.skip", "no id/email/phone hints")
-        return None
-
-    fast = await _fastpath_fetch()
+    ctx = FastPathContext(
+        msg=msg, signals=signals, user_id=user_id, client_id=client_id_val, is_super_admin=sa,
+        lead_id=lead_id_req, clinic_id=clinic_id_req, email=email_hint, phone=phone_hint,
+    )
+    fast, rule = await fastpath_engine.dispatch(ctx)
     if fast is not None:
-        ai_dbg("fastpath.return", fast[:300].replace("\n", " | "))
+        ai_dbg("fastpath.return", {"rule": rule, "reply": fast[:300].replace("\n", " | ")})
         return fast
 
     # 3) choose agent
@@ -579,28 +579,27 @@ async def run_with_agent(user_message: str, chat_id: int, user_id: str) -> str:
             return APP_ONLY_HINT
 
     ai_dbg("agent.selected", {"agent": spec.name})
+    emit("agent", agent=spec.name)
 
     # Restrict service_update tool for non-SA
     tools_to_bind = list(spec.tools or [])
     if spec.name == "ServiceAgent" and not sa:
         tools_to_bind = [t for t in tools_to_bind if getattr(t, "name", "") != "service_update"]
 
-    model = init_chat_model("gpt-4o-mini", model_provider="openai")
+    # model, tool binding and prompt are built once per process (agents/runtime.py)
     if getattr(spec, "allow_tool_calls", True) and tools_to_bind:
-        model = model.bind_tools(tools_to_bind)
+        model = agent_runtime.bound(spec.name, tools_to_bind)
+    else:
+        model = agent_runtime.model()
     ai_dbg("agent.tools", {"tools": [t.name for t in (tools_to_bind or [])]})
 
     history = await get_chat_history(chat_id)
-    sys_prompt = spec.system_prompt
+    security_note = ""
     if client_id_val is not None and spec.name in ("SQLReader", "LeadAgent", "ClinicAgent", "AppointmentAgent"):
-        sys_prompt = f"{sys_prompt}\n[SECURITY NOTE] Current client_id={client_id_val}. All operations must include client_id={client_id_val}."
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", sys_prompt),
-        MessagesPlaceholder("history"),
-        ("user", "{prompt}"),
-    ])
-    rendered = await prompt.ainvoke({"history": history, "prompt": user_message})
+        security_note = f"\n[SECURITY NOTE] Current client_id={client_id_val}. All operations must include client_id={client_id_val}."
+
+    prompt = agent_runtime.agent_prompt(spec)
+    rendered = await prompt.ainvoke({"history": history, "prompt": user_message, "security_note": security_note})
     messages = rendered.to_messages()
 
     ai_msg = await model.ainvoke(messages)
@@ -627,19 +626,22 @@ async def run_with_agent(user_message: str, chat_id: int, user_id: str) -> str:
     followups: List[Any] = [ai_msg]
     name_to_fn = {t.name: t for t in (tools_to_bind or [])}
 
-    for tc in tool_calls:
-        name = tc.get("name")
-        args = tc.get("args", {}) or {}
-        try:
-            safe_args = enforce_client_id(name, args, client_id_val)
-            ai_dbg("tool.call", {"name": name, "args": safe_args})
+    def _lead_update_done(o) -> bool:
+        return o.ok and o.name in ("lead_update_http", "update_lead") and isinstance(o.data, dict) and bool(o.data.get("ok"))
 
-            if name not in name_to_fn:
-                raise RuntimeError(f"Tool '{name}' is not available on agent '{spec.name}'")
+    # independent reads run concurrently; writes keep their order (agents/tool_executor.py)
+    outcomes = await execute_tool_calls(
+        tool_calls,
+        name_to_fn,
+        prepare=lambda n, a: enforce_client_id(n, a, client_id_val),
+        stop=_lead_update_done,
+    )
 
-            result = await name_to_fn[name].ainvoke(safe_args)
-            ai_dbg("tool.result", (result[:500] if isinstance(result, str) else str(result)[:500]))
-            data = json.loads(result) if isinstance(result, str) else result
+    for o in outcomes:
+        name, safe_args, data = o.name, o.args, o.data
+        try:
+            if o.error is not None:
+                raise o.error
 
             # lead/clinic captures
             if name in ("lead_get", "lead_get_http"):
@@ -690,7 +692,7 @@ async def run_with_agent(user_message: str, chat_id: int, user_id: str) -> str:
         except Exception as e:
             ai_dbg("tool.error", {name: repr(e)})
             result_str = _json({"ok": False, "tool": name, "error": f"{e.__class__.__name__}: {e}"})
-        followups.append(ToolMessage(content=result_str, tool_call_id=tc["id"]))
+        followups.append(ToolMessage(content=result_str, tool_call_id=o.call_id))
 
     # Deterministic returns
 
@@ -19,6 +19,8 @@ class AgentSpec(BaseModel):
     system_prompt: str
     tools: List  # LangChain tool callables
     allow_tool_calls: bool = True
+    # labeled utterances for the local intent router (agents/intent_router.py)
+    examples: List[str] = []
 
 REGISTRY: Dict[AgentName, AgentSpec] = {}
 
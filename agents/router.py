@@ -1,11 +1,15 @@
 # agents/router.py
-from typing import TypedDict
+from typing import Optional, TypedDict
 import json
 import re
 
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate, FewShotChatMessagePromptTemplate
 
+from agents.intent_router import get_router
+from agents.runtime import agent_runtime
+from helper.metrics import counter
+
+ROUTER_DECISIONS = counter("intent_router_decisions_total", "Agent routing decisions by path (local/llm/error)")
 
 
 
@@ -15,7 +19,7 @@ class Route(TypedDict):
     confidence: float
 
 # Tool-agnostic router model
-_router_model = init_chat_model("gpt-4o-mini", model_provider="openai")
+_router_model = agent_runtime.model("gpt-4o-mini")
 
 _examples = [
     # Lead by ID
@@ -54,7 +58,33 @@ _router_prompt = ChatPromptTemplate.from_messages([
 
 _json_pattern = re.compile(r"\{.*\}", re.DOTALL)
 
+def pick_agent_local(user_msg: str) -> Optional[Route]:
+    """Nearest-centroid route over the registry examples; None when the margin is too small to trust."""
+    try:
+        r = get_router().route(user_msg)
+    except Exception as e:
+        ROUTER_DECISIONS.inc(labels={"path": "error"})
+        print(f"[router] local router failed: {e}")
+        return None
+    if not r["confident"]:
+        return None
+    ROUTER_DECISIONS.inc(labels={"path": "local"})
+    return {
+        "agent": r["agent"],
+        "rationale": f"local: score={r['score']} margin={r['margin']} over {r['runner_up']}",
+        "confidence": float(min(0.99, 0.5 + r["margin"] * 2)),
+    }
+
+
 async def pick_agent(user_msg: str) -> Route:
+    local = pick_agent_local(user_msg)
+    if local is not None:
+        return local
+    return await pick_agent_llm(user_msg)
+
+
+async def pick_agent_llm(user_msg: str) -> Route:
+    ROUTER_DECISIONS.inc(labels={"path": "llm"})
     # Ask for a JSON-only response
     try:
         # ⬇️ supply a dummy "input" to satisfy the few-shot template signature
@@ -0,0 +1,115 @@
+# agents/runtime.py
+"""
+Per-process cache of the LangChain objects used on the chat path.
+
+Chat models, their tool-bound variants and agent prompt templates are built once
+and reused across requests:
+
+    model(name)                        init_chat_model(name)             key: model name
+    bound(agent, tools, model_name)    model.bind_tools(tools)           key: model, agent, tool names
+    agent_prompt(spec)                 system + history + user template  key: agent, system prompt
+
+Build times are recorded in agent_runtime_build_seconds (kind=model/bind/prompt)
+and the LangChain import time in agent_runtime_import_seconds, so a turn only pays
+for the network call. `warm()` prebuilds every registered agent at startup.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from helper.metrics import counter, gauge, histogram
+
+_t0 = time.perf_counter()
+from langchain.chat_models import init_chat_model  # noqa: E402
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder  # noqa: E402
+_IMPORT_SECONDS = time.perf_counter() - _t0
+
+AGENT_MODEL = os.getenv("AGENT_MODEL", "gpt-4o-mini")
+AGENT_RUNTIME_WARM = os.getenv("AGENT_RUNTIME_WARM", "1") == "1"
+
+IMPORT_GAUGE = gauge("agent_runtime_import_seconds", "Time spent importing LangChain chat/prompt modules")
+BUILD_SECONDS = histogram(
+    "agent_runtime_build_seconds", "Construction time of cached chat objects, by kind",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0),
+)
+CACHE_LOOKUPS = counter("agent_runtime_cache_total", "Agent runtime cache lookups, by kind and result (hit/miss)")
+CACHE_SIZE = gauge("agent_runtime_cached_objects", "Chat models, tool bindings and prompts held by the agent runtime")
+IMPORT_GAUGE.set(_IMPORT_SECONDS)
+
+
+def _escape(text: str) -> str:
+    # system prompts are literal text, not template variables
+    return (text or "").replace("{", "{{").replace("}", "}}")
+
+
+class AgentRuntime:
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._bound: Dict[Tuple[str, str, Tuple[str, ...]], Any] = {}
+        self._prompts: Dict[Tuple[str, str], Any] = {}
+        self._lock = threading.Lock()
+        CACHE_SIZE.set(0)
+
+    def _get(self, cache: Dict, key, kind: str, build):
+        obj = cache.get(key)
+        if obj is not None:
+            CACHE_LOOKUPS.inc(labels={"kind": kind, "result": "hit"})
+            return obj
+        with self._lock:
+            obj = cache.get(key)
+            if obj is None:
+                started = time.perf_counter()
+                obj = build()
+                BUILD_SECONDS.observe(time.perf_counter() - started, labels={"kind": kind})
+                cache[key] = obj
+                CACHE_SIZE.set(len(self._models) + len(self._bound) + len(self._prompts))
+        CACHE_LOOKUPS.inc(labels={"kind": kind, "result": "miss"})
+        return obj
+
+    def model(self, name: str = AGENT_MODEL, provider: str = "openai"):
+        return self._get(self._models, f"{provider}:{name}", "model",
+                         lambda: init_chat_model(name, model_provider=provider))
+
+    def bound(self, agent: str, tools: Iterable[Any], model_name: str = AGENT_MODEL):
+        """`model(model_name)` with `tools` bound; the plain model when there are no tools."""
+        tools = list(tools or [])
+        if not tools:
+            return self.model(model_name)
+        key = (model_name, agent, tuple(sorted(getattr(t, "name", repr(t)) for t in tools)))
+        return self._get(self._bound, key, "bind", lambda: self.model(model_name).bind_tools(tools))
+
+    def agent_prompt(self, spec):
+        """
+        system (spec.system_prompt + {security_note}) / {history} / user {prompt}.
+        Render with security_note="" when there is no client context.
+        """
+        key = (spec.name, spec.system_prompt)
+        return self._get(self._prompts, key, "prompt", lambda: ChatPromptTemplate.from_messages([
+            ("system", _escape(spec.system_prompt) + "{security_note}"),
+            MessagesPlaceholder("history"),
+            ("user", "{prompt}"),
+        ]))
+
+    def warm(self, registry: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Build the model, prompt and full tool binding for every registered agent."""
+        if registry is None:
+            from agents.registry import REGISTRY as registry
+        started = time.perf_counter()
+        self.model()
+        for spec in registry.values():
+            self.agent_prompt(spec)
+            if getattr(spec, "allow_tool_calls", True) and spec.tools:
+                self.bound(spec.name, spec.tools)
+        return {"agents": len(registry), "ms": round((time.perf_counter() - started) * 1000, 1), **self.report()}
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "models": len(self._models),
+            "bound": len(self._bound),
+            "prompts": len(self._prompts),
+            "import_ms": round(_IMPORT_SECONDS * 1000, 1),
+        }
+
+
+agent_runtime = AgentRuntime()
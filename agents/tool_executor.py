@@ -0,0 +1,166 @@
+# agents/tool_executor.py
+"""
+Executes the tool calls of one model turn.
+
+Read-only tools in a turn run concurrently (at most TOOL_MAX_CONCURRENCY at once).
+Tools with side effects act as barriers: everything requested before them finishes
+first, they run alone, and later calls start only after they return. So
+"create appointment, then show slots" keeps its order, while "clinic details +
+slots + lead" costs one round trip instead of three.
+
+Every call gets a timeout (per tool, see TOOL_POLICIES) and a span:
+`ai_dbg("tool.span", ...)` plus the agent_tool_seconds histogram, and emits
+tool_start/tool_end events for streaming clients (agents/events.py).
+Tools without a policy are treated as having side effects.
+"""
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from agents.events import emit
+from agents.tools.helpers.logging import ai_dbg
+from helper.metrics import counter, histogram
+
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+TOOL_WRITE_TIMEOUT_SECONDS = float(os.getenv("TOOL_WRITE_TIMEOUT_SECONDS", "30"))
+
+TOOL_SECONDS = histogram("agent_tool_seconds", "Agent tool call latency, by tool and outcome")
+TOOL_BATCHES = counter("agent_tool_batches_total", "Tool call groups executed per turn, by mode (parallel/serial)")
+
+
+@dataclass(frozen=True)
+class ToolPolicy:
+    side_effects: bool = False
+    timeout: float = TOOL_TIMEOUT_SECONDS
+
+
+_READ = ToolPolicy()
+_WRITE = ToolPolicy(side_effects=True, timeout=TOOL_WRITE_TIMEOUT_SECONDS)
+
+TOOL_POLICIES: Dict[str, ToolPolicy] = {
+    # leads
+    "lead_get": _READ,
+    "lead_get_http": _READ,
+    "lead_search": _READ,
+    "lead_lookup_http": _READ,
+    "sql_select": _READ,
+    "update_lead": _WRITE,
+    "lead_update_http": _WRITE,
+    "sql_update": _WRITE,
+    # clinics
+    "clinic_get": _READ,
+    "clinic_get_http": _READ,
+    "clinic_search_http": _READ,
+    "clinic_update": _WRITE,
+    # services
+    "service_list": _READ,
+    "service_get": _READ,
+    "service_search": _READ,
+    "service_update": _WRITE,
+    # appointments
+    "appointment_slots": _READ,
+    "appointment_get": _READ,
+    "appointment_create": _WRITE,
+    "appointment_update": _WRITE,
+    "appointment_cancel": _WRITE,
+}
+
+
+def policy_for(name: Optional[str]) -> ToolPolicy:
+    return TOOL_POLICIES.get(name or "", _WRITE)
+
+
+@dataclass
+class ToolOutcome:
+    call: Dict[str, Any]
+    name: Optional[str]
+    args: Dict[str, Any] = field(default_factory=dict)  # args actually sent (after `prepare`)
+    data: Any = None                                     # decoded result
+    error: Optional[BaseException] = None
+    ms: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def call_id(self) -> Optional[str]:
+        return self.call.get("id")
+
+
+async def _run_one(
+    tc: Dict[str, Any],
+    tools: Dict[str, Any],
+    prepare: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+    sem: asyncio.Semaphore,
+) -> ToolOutcome:
+    name = tc.get("name")
+    out = ToolOutcome(call=tc, name=name)
+    policy = policy_for(name)
+    async with sem:
+        started = time.perf_counter()
+        try:
+            emit("tool_start", tool=name, id=out.call_id)
+            out.args = prepare(name, tc.get("args", {}) or {})
+            ai_dbg("tool.call", {"name": name, "args": out.args})
+            if name not in tools:
+                raise RuntimeError(f"Tool '{name}' is not available")
+            try:
+                result = await asyncio.wait_for(tools[name].ainvoke(out.args), timeout=policy.timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"tool '{name}' timed out after {policy.timeout:.0f}s")
+            ai_dbg("tool.result", (result[:500] if isinstance(result, str) else str(result)[:500]))
+            out.data = json.loads(result) if isinstance(result, str) else result
+        except Exception as e:
+            out.error = e
+        out.ms = (time.perf_counter() - started) * 1000.0
+
+    status = "ok" if out.ok else ("timeout" if isinstance(out.error, TimeoutError) else "error")
+    TOOL_SECONDS.observe(out.ms / 1000.0, labels={"tool": name or "?", "outcome": status})
+    ai_dbg("tool.span", {"name": name, "ms": round(out.ms, 2), "outcome": status,
+                         "side_effects": policy.side_effects})
+    emit("tool_end", tool=name, id=out.call_id, ok=out.ok, ms=round(out.ms, 1))
+    return out
+
+
+async def execute_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    tools: Dict[str, Any],
+    prepare: Callable[[str, Dict[str, Any]], Dict[str, Any]] = lambda name, args: args,
+    stop: Optional[Callable[[ToolOutcome], bool]] = None,
+) -> List[ToolOutcome]:
+    """
+    Run `tool_calls` (LangChain dicts: name/args/id) against `tools` (name -> tool).
+
+    `prepare(name, args)` returns the args to send (e.g. client_id enforcement); if it
+    raises, that call fails without running. `stop(outcome)` is checked after each
+    side-effect call; when it returns True the remaining calls are not started.
+    Outcomes come back in request order, for the calls that ran.
+    """
+    sem = asyncio.Semaphore(max(1, TOOL_MAX_CONCURRENCY))
+    outcomes: List[ToolOutcome] = []
+    pending: List[Dict[str, Any]] = []
+
+    async def _flush() -> None:
+        if not pending:
+            return
+        TOOL_BATCHES.inc(labels={"mode": "parallel" if len(pending) > 1 else "serial"})
+        outcomes.extend(await asyncio.gather(*(_run_one(tc, tools, prepare, sem) for tc in pending)))
+        pending.clear()
+
+    for tc in tool_calls:
+        if not policy_for(tc.get("name")).side_effects:
+            pending.append(tc)
+            continue
+        await _flush()
+        TOOL_BATCHES.inc(labels={"mode": "serial"})
+        out = await _run_one(tc, tools, prepare, sem)
+        outcomes.append(out)
+        if stop is not None and stop(out):
+            return outcomes
+    await _flush()
+    return outcomes
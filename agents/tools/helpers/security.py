@@ -1,58 +1,95 @@
 # agents/tools/helpers/security.py
 import json
+import os
 from typing import Any, Dict, Optional
-from helper.get_data import get_client_data
-
-# Sticky caches
-_CLIENT_ID_CACHE: Dict[str, int] = {}
-_ROLE_CACHE: Dict[str, Dict[str, Any]] = {}
+from helper.catalog_cache import ReadThroughCache
+from helper.get_data import client_context_cache, get_client_data, invalidate_client_context
+from helper.metrics import gauge
+
+# Identity lookups per user_id, derived from get_client_data. Bounded LRUs with a TTL,
+# so role changes take effect without a restart; unknown users (no client_id / no role)
+# are remembered for a shorter time. Concurrent misses for a user share one lookup.
+# An identity entry is loaded from the cached get_client_data context, which can itself
+# be up to CLIENT_CONTEXT_TTL (600 s) old: without invalidate_identity(), a role or
+# client change takes up to SECURITY_CACHE_TTL + CLIENT_CONTEXT_TTL (15 min by default).
+SECURITY_CACHE_TTL = float(os.getenv("SECURITY_CACHE_TTL", "300"))
+SECURITY_NEGATIVE_TTL = float(os.getenv("SECURITY_NEGATIVE_TTL", "30"))
+SECURITY_CACHE_MAXSIZE = int(os.getenv("SECURITY_CACHE_MAXSIZE", "5000"))
+
+_CLIENT_ID_CACHE = ReadThroughCache(
+    "security-client-id", ttl=SECURITY_CACHE_TTL, stale_ttl=0, maxsize=SECURITY_CACHE_MAXSIZE,
+    negative_ttl=SECURITY_NEGATIVE_TTL,
+)
+_ROLE_CACHE = ReadThroughCache(
+    "security-role", ttl=SECURITY_CACHE_TTL, stale_ttl=0, maxsize=SECURITY_CACHE_MAXSIZE,
+    negative_ttl=SECURITY_NEGATIVE_TTL, is_negative=lambda info: info.get("role") is None and not info.get("is_super_admin"),
+)
+
+gauge("security_client_id_cache_entries", "user_id -> client_id entries cached", fn=lambda: len(_CLIENT_ID_CACHE))
+gauge("security_role_cache_entries", "user_id -> role entries cached", fn=lambda: len(_ROLE_CACHE))
 
 
 def json_dumps(o: Any) -> str:
     return json.dumps(o, ensure_ascii=False, default=str)
 
 
-def remember_client_id(user_id: str, client_id: Optional[int]) -> None:
-    """Allow callers to seed/override the cache for this user."""
-    if client_id is not None:
-        _CLIENT_ID_CACHE[str(user_id)] = int(client_id)
+def invalidate_identity(user_id: Optional[str] = None) -> int:
+    """
+    Drop cached client_id/role for one user, or for everyone. Returns identity entries dropped.
+    The get_client_data context they are derived from is dropped too; otherwise the next
+    lookup would just re-derive the old identity from the cached context.
+    """
+    if user_id is None:
+        dropped = len(_CLIENT_ID_CACHE) + len(_ROLE_CACHE)
+        _CLIENT_ID_CACHE.clear()
+        _ROLE_CACHE.clear()
+        client_context_cache.clear()
+        return dropped
+    uid = str(user_id)
+    invalidate_client_context(user_id=uid)
+    return sum(cache.invalidate_where(lambda k: k == uid) for cache in (_CLIENT_ID_CACHE, _ROLE_CACHE))
+
+
+def identity_cache_report() -> Dict[str, Any]:
+    return {"client_id": _CLIENT_ID_CACHE.report(), "role": _ROLE_CACHE.report()}
+
+
+# helper to walk dict/list by path
+def _deep_get(d: Any, path: tuple) -> Optional[Any]:
+    cur = d
+    for k in path:
+        if isinstance(k, int):
+            if isinstance(cur, list) and 0 <= k < len(cur):
+                cur = cur[k]
+            else:
+                return None
+        else:
+            if not isinstance(cur, dict):
+                return None
+            cur = cur.get(k)
+        if cur is None:
+            return None
+    return cur
 
 
 async def get_client_id(user_id: str) -> Optional[int]:
     """
     Resolve client_id for the given user:
-    1) Return from in-memory cache if present.
+    1) Return from the identity cache if present (None for a recently unknown user).
     2) Ask get_client_data(user_id) and probe common paths.
     NOTE: get_client_data() returns clinics['data'] (already the inner data),
     so we probe both non-prefixed and 'data'-prefixed paths.
     """
-    # 1) cache
-    if str(user_id) in _CLIENT_ID_CACHE:
-        print(f"[AI-DBG] client_id.source :: {json.dumps({'user_id': user_id, 'from': 'cache', 'client_id': _CLIENT_ID_CACHE[str(user_id)]})}")
-        return _CLIENT_ID_CACHE[str(user_id)]
+    uid = str(user_id)
+    return await _CLIENT_ID_CACHE.get(uid, lambda: _load_client_id(uid))
+
 
+async def _load_client_id(user_id: str) -> Optional[int]:
     try:
         raw = await get_client_data(int(user_id))
         data = raw if isinstance(raw, dict) else {}
         print(f"[AI-DBG] client_id.source :: {json.dumps({'user_id': user_id, 'from': 'get_client_data', 'type': type(raw).__name__})}")
 
-        # helper to walk dict/list by path
-        def deep_get(d: Any, path: tuple) -> Optional[Any]:
-            cur = d
-            for k in path:
-                if isinstance(k, int):
-                    if isinstance(cur, list) and 0 <= k < len(cur):
-                        cur = cur[k]
-                    else:
-                        return None
-                else:
-                    if not isinstance(cur, dict):
-                        return None
-                    cur = cur.get(k)
-                if cur is None:
-                    return None
-            return cur
-
         # Because get_client_data returns clinics['data'], FIRST check non-prefixed paths.
         candidate_paths = [
             # primary (your real structure)
@@ -84,10 +121,9 @@ async def get_client_id(user_id: str) -> Optional[int]:
         ]
 
         for p in candidate_paths:
-            v = deep_get(data, p)
+            v = _deep_get(data, p)
             if isinstance(v, int) and v > 0:
                 print(f"[AI-DBG] client_id.found :: {json.dumps({'user_id': user_id, 'path': '→'.join(map(str, p)), 'client_id': v})}")
-                _CLIENT_ID_CACHE[str(user_id)] = int(v)
                 return int(v)
 
         print(f"[AI-DBG] client_id.missing :: {json.dumps({'user_id': user_id, 'reason': 'no known path contained client_id'})}")
@@ -118,32 +154,17 @@ def _normalize_role(val: Any) -> Optional[str]:
 async def get_user_role_info(user_id: str) -> Dict[str, Any]:
     """
     Returns a dict like {"role": <normalized string or None>, "is_super_admin": <bool or None>, "raw": <original dict>}.
-    Cached per user_id.
+    Cached per user_id for SECURITY_CACHE_TTL seconds.
     """
     uid = str(user_id)
-    if uid in _ROLE_CACHE:
-        return _ROLE_CACHE[uid]
+    return await _ROLE_CACHE.get(uid, lambda: _load_role_info(uid))
+
 
+async def _load_role_info(user_id: str) -> Dict[str, Any]:
     try:
         raw = await get_client_data(int(user_id))
         data = raw if isinstance(raw, dict) else {}
 
-        def deep_get(d: Any, path: tuple) -> Optional[Any]:
-            cur = d
-            for k in path:
-                if isinstance(k, int):
-                    if isinstance(cur, list) and 0 <= k < len(cur):
-                        cur = cur[k]
-                    else:
-                        return None
-                else:
-                    if not isinstance(cur, dict):
-                        return None
-                    cur = cur.get(k)
-                if cur is None:
-                    return None
-            return cur
-
         # likely locations for role/is_super_admin
         role_paths = [
             ("logged_in_user_whose_asked_questions_or_chat", "role"),
@@ -165,14 +186,14 @@ async def get_user_role_info(user_id: str) -> Dict[str, Any]:
 
         role_val = None
         for p in role_paths:
-            v = deep_get(data, p)
+            v = _deep_get(data, p)
             if v is not None:
                 role_val = v
                 break
 
         flag_val = None
         for p in flag_paths:
-            v = deep_get(data, p)
+            v = _deep_get(data, p)
             if v is not None:
                 flag_val = v
                 break
@@ -189,15 +210,12 @@ async def get_user_role_info(user_id: str) -> Dict[str, Any]:
         if is_sa is None:
             is_sa = (norm_role == "super_admin")
 
-        info = {"role": norm_role, "is_super_admin": bool(is_sa), "raw": {"role": role_val, "flag": flag_val}}
-        _ROLE_CACHE[uid] = info
-        return info
+        return {"role": norm_role, "is_super_admin": bool(is_sa), "raw": {"role": role_val, "flag": flag_val}}
 
     except Exception as e:
         print(f"[AI-DBG] role.error :: {json.dumps({'user_id': user_id, 'error': repr(e)})}")
-        info = {"role": None, "is_super_admin": False, "raw": {}}
-        _ROLE_CACHE[uid] = info
-        return info
+        # cached for SECURITY_NEGATIVE_TTL only, like an unknown user
+        return {"role": None, "is_super_admin": False, "raw": {}}
 
 
 async def is_super_admin(user_id: str) -> bool:
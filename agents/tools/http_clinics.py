@@ -6,6 +6,8 @@ import httpx
 from pydantic import BaseModel, Field
 from langchain_core.tools import tool
 
+from helper.catalog_cache import CLINIC_CACHE, clinic_key, invalidate_clinics
+
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8080")
 LARAVEL_API_BASE = os.getenv("LARAVEL_API_BASE", f"{API_URL.rstrip('/')}/api")
 AI_DEBUG = os.getenv("AI_DEBUG", "0") == "1"
@@ -17,6 +19,13 @@ def dlog(tag: str, payload: Dict[str, Any]):
         except Exception:
             print(f"[AI-DBG] {tag} :: {payload}")
 
+def _is_ok(result: str) -> bool:
+    # only successful lookups are cached; errors and 404s always go back to Laravel
+    try:
+        return bool(json.loads(result).get("ok"))
+    except Exception:
+        return False
+
 # -------------------- Args Schemas (define FIRST) --------------------
 class ClinicGetArgs(BaseModel):
     client_id: int
@@ -55,6 +64,13 @@ async def clinic_get_http(client_id: int, clinic_id: int) -> str:
     Fetch a single clinic by id for a given client_id via Laravel API.
     Returns JSON {ok, clinic} or {ok:false,error}.
     """
+    return await CLINIC_CACHE.get(
+        clinic_key(client_id, "get", int(clinic_id)),
+        lambda: _fetch_clinic(client_id, clinic_id),
+        should_cache=_is_ok,
+    )
+
+async def _fetch_clinic(client_id: int, clinic_id: int) -> str:
     url = f"{LARAVEL_API_BASE}/clinics/{clinic_id}"
     dlog("clinic.get.request", {"url": url, "params": {"client_id": client_id}})
     async with httpx.AsyncClient(timeout=30.0) as client:
@@ -87,13 +103,17 @@ async def clinic_search_http(client_id: int,
     """
     Search clinics for a client_id (by optional name/city/state/is_active). Returns {ok, rows}.
     """
-    url = f"{LARAVEL_API_BASE}/clinics"
     params: Dict[str, Any] = {"client_id": client_id, "limit": limit}
     if name: params["name"] = name
     if city_id is not None: params["city_id"] = city_id
     if state_id is not None: params["state_id"] = state_id
     if is_active is not None: params["is_active"] = int(bool(is_active))
 
+    key = clinic_key(client_id, "search", tuple(sorted((k, v) for k, v in params.items() if k != "client_id")))
+    return await CLINIC_CACHE.get(key, lambda: _search_clinics(params), should_cache=_is_ok)
+
+async def _search_clinics(params: Dict[str, Any]) -> str:
+    url = f"{LARAVEL_API_BASE}/clinics"
     dlog("clinic.search.request", {"url": url, "params": params})
     async with httpx.AsyncClient(timeout=30.0) as client:
         try:
@@ -186,6 +206,8 @@ async def clinic_update(client_id: int, clinic_id: int, **updates) -> str:
     try:
         r = await _patch_or_spoof(url, payload)
         ok = 200 <= r.status_code < 300
+        if ok:
+            invalidate_clinics(args.client_id)
         try:
             data = r.json()
         except Exception:
@@ -0,0 +1,69 @@
+# controller/cache_controller.py
+import os
+import socket
+from typing import Optional
+
+from fastapi import APIRouter
+from pydantic import BaseModel
+
+from helper.catalog_cache import cache_report, invalidate_clinics, invalidate_services
+from helper.get_data import client_context_cache, invalidate_client_context
+from agents.tools.helpers.security import identity_cache_report, invalidate_identity
+
+router = APIRouter()
+
+
+class CacheInvalidateRequest(BaseModel):
+    # "services", "clinics", "context" (chat prompt context from get_client_data),
+    # "identity" (agent client_id/role lookups, e.g. after a role change) or "all"
+    scope: str = "all"
+    # clinics/context: drop just this client's entries
+    client_id: Optional[int] = None
+    # context/identity only: drop just this user's entries
+    user_id: Optional[int] = None
+
+
+@router.post("/cache/invalidate")
+async def cache_invalidate(request: CacheInvalidateRequest):
+    """
+    Hook for the Laravel side to call after editing services/clinics outside this app.
+    The caches live in each worker's memory and this clears only the worker that handled
+    the request: with several uvicorn workers, the others serve their entries until the
+    TTLs run out. The response names the worker and says so.
+    """
+    scope = request.scope.lower()
+    if scope not in ("services", "clinics", "context", "identity", "all"):
+        return {"success": False, "message": "scope must be one of services, clinics, context, identity, all"}
+    dropped = 0
+    context_dropped = 0
+    identity_dropped = 0
+    if scope in ("services", "all"):
+        invalidate_services()
+    if scope in ("clinics", "all"):
+        dropped = invalidate_clinics(request.client_id)
+    if scope in ("context", "all"):
+        if request.client_id is None and request.user_id is None:
+            context_dropped = len(client_context_cache)
+            client_context_cache.clear()
+        else:
+            context_dropped = invalidate_client_context(user_id=request.user_id, client_id=request.client_id)
+    if scope in ("identity", "all"):
+        # also drops the get_client_data context the identity is derived from
+        identity_dropped = invalidate_identity(request.user_id)
+    return {
+        "success": True, "scope": scope, "client_id": request.client_id,
+        "clinic_entries_dropped": dropped, "context_entries_dropped": context_dropped,
+        "identity_entries_dropped": identity_dropped,
+        "worker": f"{socket.gethostname()}:{os.getpid()}",
+        "note": "Only this worker's in-memory caches were cleared; other workers keep theirs until their TTLs expire.",
+    }
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Hit ratio and backend calls avoided per catalog cache (this worker only)."""
+    return {"success": True, "data": {
+        **cache_report(),
+        "client_context": client_context_cache.report(),
+        "identity": identity_cache_report(),
+    }}
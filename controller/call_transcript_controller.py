@@ -1053,12 +1053,19 @@ from typing import List, Optional, Dict, Any
 
 import httpx
 from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, BackgroundTasks, Request, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 
 from helper.call_processor import CallProcessor
 from helper.database import Database
+from helper.job_queue import JOB_QUEUE_ENABLED, get_job_queue, worker_id
+from helper.progress_bus import ProgressSessions
+from helper.scheduler import scheduler as job_scheduler
+from helper.work_lanes import USER_BATCH, run_in_lane
+from helper.admission import AdmissionRejected, batch_admission, rejection_response
+from helper.adaptive_limit import LARAVEL_LIMIT
+from helper.get_data import invalidate_client_context
 from models.lead_score import LeadScore
 from models.system_prompt import SystemPrompts
 
@@ -1088,8 +1095,8 @@ CALLRAIL_API_BASE = "https://api.callrail.com/v3"
 if not CALLRAIL_BEARER_TOKEN:
     raise ValueError("CALLRAIL_BEARER_TOKEN not found in environment variables")
 
-# Store active progress sessions
-active_sessions: Dict[str, Dict[str, Any]] = {}
+# Store active progress sessions (mutations push to /progress-stream subscribers)
+active_sessions: ProgressSessions = ProgressSessions()
 
 logger = logging.getLogger("uvicorn.error")
 FIXED_ACCOUNT_ID = "562206937"  # moved out so it's always in scope
@@ -1210,8 +1217,10 @@ async def send_data_to_laravel(data, user_id: int):
         payload = normalize_lead_for_laravel(data)
         payload["user_id"] = user_id
 
-    async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
-        response = await client.post(laravel_api_url, json=payload, headers=merged_headers)
+    async with LARAVEL_LIMIT.slot() as call:
+        async with httpx.AsyncClient(follow_redirects=True, timeout=30.0) as client:
+            response = await client.post(laravel_api_url, json=payload, headers=merged_headers)
+        call.status(response.status_code)
 
     logger.info("Laravel response: %s %s", response.status_code, response.text[:1000])
     if response.status_code in (200, 201, 202, 207):
@@ -1238,10 +1247,11 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
 
     try:
         # 1) Fetch processed call records from Laravel (Laravel decides filtering)
-        async with httpx.AsyncClient(timeout=30.0) as http:
+        async with LARAVEL_LIMIT.slot() as call, httpx.AsyncClient(timeout=30.0) as http:
             url = f"{apiurl}/api/transcript/{user_id}"
             logger.info(f"Fetching processed call records from {url}")
             resp = await http.get(url, headers=headers)
+            call.status(resp.status_code)
             resp.raise_for_status()
             call_data = resp.json()
 
@@ -1268,7 +1278,9 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
 
         async def check_phone_exists(httpc: httpx.AsyncClient, phone: str) -> bool:
             try:
-                r = await httpc.get(f"{apiurl}/api/check-phone-number/{phone}")
+                async with LARAVEL_LIMIT.slot() as call:
+                    r = await httpc.get(f"{apiurl}/api/check-phone-number/{phone}")
+                    call.status(r.status_code)
                 if r.status_code != 200:
                     return False
                 data = r.json()
@@ -1324,23 +1336,49 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
 
         print(f" we have total Phone group = {len(phone_groups)} and phone_group_number is = {json.dumps(phone_groups, indent=4)} of user_id = {user_id}")
 
+        # Durable queue: each call/phone group resumes from its last finished stage
+        # (downloaded / transcribed / scored / saved) if an earlier run died midway.
+        queue = get_job_queue() if JOB_QUEUE_ENABLED else None
+        owner = worker_id(session_id)
+        if queue is not None:
+            try:
+                await queue.purge_finished()
+            except Exception as e:
+                logger.warning("Job queue purge failed: %s", e)
+
         # 3) Helper: transcribe one call (robust recording URL extraction)
-        async def transcribe_call(recording_url: Optional[str]) -> Optional[str]:
+        async def transcribe_call(call: Dict[str, Any]) -> Optional[str]:
+            recording_url = call.get("call_recording") or call.get("recording_url")
             if not recording_url:
                 return None
             try:
                 call_id = extract_call_id_from_url(recording_url)
                 if not call_id:
                     return None
-                result = await processor.process_call(account_id=FIXED_ACCOUNT_ID, call_id=call_id)
-                tx = result.get("transcription") if isinstance(result, dict) else None
-                return tx.strip() if isinstance(tx, str) and tx.strip() else None
+                if queue is None:
+                    result = await processor.process_call(account_id=FIXED_ACCOUNT_ID, call_id=call_id)
+                    tx = result.get("transcription") if isinstance(result, dict) else None
+                    return tx.strip() if isinstance(tx, str) and tx.strip() else None
+
+                # shared per-call index: reuses a transcript any entry point already produced
+                return await queue.transcribe_once(
+                    call_id, owner,
+                    fetch=lambda: processor.fetch_audio(account_id=FIXED_ACCOUNT_ID, call_id=call_id),
+                    transcribe=processor.transcribe_file,
+                    user_id=user_id, phone=_pick_phone(call),
+                    source="process-user-clients",
+                )
             except Exception as e:
                 logger.exception("Transcription failed for %s: %s", recording_url, e)
                 return None
 
+        async def mark_scored(phone: str, lead: Dict[str, Any]) -> None:
+            if queue is not None:
+                await queue.advance_group(user_id, phone, "scored", lead=lead)
+
         processed_count = 0
         data_to_send: List[Dict[str, Any]] = []
+        queued_phones: List[str] = []
 
         # 4) Process each phone group
         for phone_number, group_data in phone_groups.items():
@@ -1350,8 +1388,34 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                     "status": "processing",
                 })
 
+                if queue is not None:
+                    call_ids = [
+                        cid for cid in (
+                            extract_call_id_from_url(c.get("call_recording") or c.get("recording_url") or "")
+                            for c in group_data["calls"]
+                        ) if cid
+                    ]
+                    await queue.enqueue_group(user_id, phone_number, call_ids)
+                    if not await queue.claim_group(user_id, phone_number, owner):
+                        active_sessions[session_id]["details"].append({
+                            "message": f"Skipped {phone_number}: already saved, failed too often, or being processed by another worker",
+                            "status": "skipped",
+                        })
+                        continue
+                    job = await queue.get_group(user_id, phone_number)
+                    if job and job.get("state") == "scored" and job.get("lead"):
+                        data_to_send.append(job["lead"])
+                        queued_phones.append(phone_number)
+                        processed_count += 1
+                        active_sessions[session_id]["processed"] = processed_count
+                        active_sessions[session_id]["details"].append({
+                            "message": f"Resumed already-scored lead for {phone_number}",
+                            "status": "completed",
+                        })
+                        continue
+
                 transcription_tasks = [
-                    transcribe_call(c.get("call_recording") or c.get("recording_url"))
+                    transcribe_call(c)
                     for c in group_data["calls"]
                     if (c.get("call_recording") or c.get("recording_url"))
                 ]
@@ -1376,7 +1440,7 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                     first_name, last_name, _ = _split_name(full_name)
                     logger.info("Derived name for %s → first=%r last=%r", phone_number, first_name, last_name)
 
-                    data_to_send.append({
+                    lead = {
                         "client_id": client_id_int,
                         "contact_number": phone_number,
                         "type": "miss",
@@ -1389,7 +1453,10 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                         "status": cd.get("status"),
                         "is_scored": True,
                         "is_self": False,
-                    })
+                    }
+                    data_to_send.append(lead)
+                    queued_phones.append(phone_number)
+                    await mark_scored(phone_number, lead)
 
                     processed_count += 1
                     active_sessions[session_id]["processed"] = processed_count
@@ -1441,7 +1508,7 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                 except Exception:
                     logger.info("lead_score_event %s", str(payload))
 
-                data_to_send.append({
+                lead = {
                     "client_id": client_id_int,
                     "contact_number": phone_number,
                     "type": "receive",
@@ -1454,7 +1521,10 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                     "status": cd.get("status") or None,
                     "is_scored": True,
                     "is_self": False,
-                })
+                }
+                data_to_send.append(lead)
+                queued_phones.append(phone_number)
+                await mark_scored(phone_number, lead)
 
                 processed_count += 1
                 active_sessions[session_id]["processed"] = processed_count
@@ -1469,6 +1539,11 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                     "message": f"Error processing {phone_number}: {str(e)}",
                     "status": "error",
                 })
+                if queue is not None:
+                    try:
+                        await queue.fail_group(user_id, phone_number, str(e))
+                    except Exception:
+                        pass
 
         # 5) Send all queued leads to Laravel in one batch
         if data_to_send:
@@ -1490,12 +1565,25 @@ async def process_clients_background(client_ids: List[str], session_id: str, use
                     "message": f"Sent batch to Laravel (status={status}, created={created}, updated={updated})",
                     "status": "completed" if status in ("success", "partial") else "error",
                 })
+                if queue is not None:
+                    for phone in queued_phones:
+                        if status in ("success", "partial"):
+                            await queue.advance_group(user_id, phone, "saved")
+                        else:
+                            # stays 'scored'; the next run re-sends without re-scoring
+                            await queue.release_group(user_id, phone, owner)
             except Exception as e:
                 logger.exception("Failed sending data to Laravel: %s", e)
                 active_sessions[session_id]["details"].append({
                     "message": f"Failed sending to Laravel: {str(e)}",
                     "status": "error",
                 })
+                if queue is not None:
+                    for phone in queued_phones:
+                        try:
+                            await queue.release_group(user_id, phone, owner)
+                        except Exception:
+                            pass
         else:
             logger.info("No leads to send to Laravel (data_to_send empty)")
 
@@ -1522,8 +1610,9 @@ async def sendDirectCallRailApi(phone: str):
     try:
         api_url = f"{apiurl}/api/save-callrail-data"
         payload = {"phone_number": phone}
-        async with httpx.AsyncClient(timeout=15.0) as client:
+        async with LARAVEL_LIMIT.slot() as call, httpx.AsyncClient(timeout=15.0) as client:
             response = await client.post(api_url, json=payload, headers=headers)
+            call.status(response.status_code)
             if response.status_code == 200:
                 logger.info(f"Successfully sent phone {phone} to external API.")
                 return response.json()
@@ -1536,7 +1625,7 @@ async def sendDirectCallRailApi(phone: str):
 
 
 @router.post("/process-user-clients")
-async def process_user_clients(request: Request, background_tasks: BackgroundTasks):
+async def process_user_clients(request: Request):
     """Process client scoring in background and return session ID for progress tracking"""
     try:
         body = await request.json()
@@ -1553,7 +1642,46 @@ async def process_user_clients(request: Request, background_tasks: BackgroundTas
 
         print(f"Processing request: client_ids={client_ids}, session_id={session_id}, user_id={user_id}")
 
-        background_tasks.add_task(process_clients_background, client_ids, session_id, user_id)
+        # batch lane: its transcription/LLM work yields to chat and other interactive requests
+        try:
+            ticket, joined = batch_admission.submit(
+                "process-user-clients", user_id, sorted(str(c) for c in client_ids),
+                lambda: run_in_lane(USER_BATCH, process_clients_background, client_ids, session_id, user_id),
+                session_id=session_id,
+            )
+        except AdmissionRejected as e:
+            return rejection_response(e)
+
+        if joined:
+            # same user, same clients: follow the run already in progress
+            return {
+                "status": "success",
+                "message": f"Already processing these {len(client_ids)} clients; joined the existing run",
+                "session_id": ticket.session_id,
+                "total_clients": len(client_ids),
+                "joined": True,
+                **ticket.describe(),
+            }
+
+        if ticket.state == "queued":
+            active_sessions[session_id] = {
+                "total": 0,
+                "processed": 0,
+                "details": [{"message": "Waiting for a free processing slot", "status": "queued"}],
+                "status": "queued",
+            }
+            info = ticket.describe()
+            return JSONResponse(
+                status_code=202,
+                content={
+                    "status": "queued",
+                    "message": f"Queued processing of {len(client_ids)} clients",
+                    "session_id": session_id,
+                    "total_clients": len(client_ids),
+                    **info,
+                },
+                headers={"Retry-After": str(info.get("retry_after", 1))},
+            )
 
         return {
             "status": "success",
@@ -1574,8 +1702,13 @@ async def progress_stream(session_id: str):
     """Server-Sent Events endpoint for real-time progress updates"""
     async def event_stream():
         try:
-            while session_id in active_sessions:
-                session_data = active_sessions[session_id]
+            seen = False
+            async for session_data in active_sessions.updates(session_id):
+                if session_data is None:
+                    # idle: SSE comment keeps proxies from closing the connection
+                    yield ": heartbeat\n\n"
+                    continue
+                seen = True
                 progress_data = {
                     "type": "progress",
                     "processed": session_data['processed'],
@@ -1594,18 +1727,15 @@ async def progress_stream(session_id: str):
                         "percentage": 100
                     }
                     yield f"data: {json.dumps(completion_data)}\n\n"
-                    del active_sessions[session_id]
-                    break
                 elif session_data['status'] == 'error':
                     error_data = {
                         "type": "error",
                         "message": session_data.get('error', 'Unknown error occurred')
                     }
                     yield f"data: {json.dumps(error_data)}\n\n"
-                    del active_sessions[session_id]
-                    break
 
-                await asyncio.sleep(2)
+            if not seen:
+                yield f"data: {json.dumps({'type': 'error', 'message': 'Unknown or expired session'})}\n\n"
 
         except Exception as e:
             error_data = {
@@ -1720,6 +1850,7 @@ async def get_call_data():
                     overall_score=scores.overall_score,
                     updated_at=datetime.now()
                 )
+                invalidate_client_context(client_id=existing_lead_score.client_id)
                 message = f"Updated existing lead score for phone {phone_number}"
             else:
                 await LeadScore.create(
@@ -1821,6 +1952,7 @@ async def re_score_lead(leadId: str):
             potential_score=updated_scores.potential_score,
             updated_at=datetime.now()
         )
+        invalidate_client_context(client_id=lead_score.client_id)
 
         return {
             "status": "success",
@@ -1867,10 +1999,13 @@ async def system_prompt_create_or_update(prompt: SystemPrompt):
             # Ensure the message_prompt is included in the update
             await obj.update_from_dict(prompt.dict(exclude_unset=True))
             await obj.save()
+            # the job interval may have changed: recompute due times now
+            job_scheduler.wake()
             return {"message": "Prompt updated successfully", "id": obj.id}
 
         # If no existing prompt, create a new one
         obj = await SystemPrompts.create(**prompt.dict())
+        job_scheduler.wake()
         return {"message": "Prompt created successfully", "id": obj.id}
 
     except Exception as e:
@@ -7,7 +7,10 @@ from models.chat import ChatModel as Chat
 from models.message import Message
 from fastapi import HTTPException, status
 from datetime import datetime
-from helper.get_chat_response import generate_ai_response
+from helper.get_chat_response import generate_ai_response, stream_ai_response, _looks_like_agent_task
+from helper.message_writer import create_message_row, finish_turn
+from helper.metrics import histogram
+from agents.events import stream_with_agent
 from dotenv import load_dotenv
 import os, json
 from fastapi import HTTPException, status
@@ -19,8 +22,12 @@ from datetime import datetime
 from services.intent import parse_actions
 from services.notify import push_notification, create_reminder
 from sse_starlette.sse import EventSourceResponse
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict
 from openai import AsyncOpenAI
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+import asyncio
+import time
 
 load_dotenv()
 
@@ -31,6 +38,9 @@ if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY is not set")
 client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
+MESSAGE_TTFB = histogram("chat_message_ttfb_seconds", "POST /messages time to first reply byte, by mode (buffered/stream)")
+MESSAGE_SECONDS = histogram("chat_message_seconds", "POST /messages total latency, by mode (buffered/stream)")
+
 
 class ChatCreate(BaseModel):
     user_id: str
@@ -39,6 +49,7 @@ class MessageCreate(BaseModel):
     user_id: str
     chat_id: int
     user_message: str
+    stream: bool = False  # opt-in: NDJSON chunks instead of one JSON body
 
 class ChatResponse(BaseModel):
     id: int
@@ -82,6 +93,9 @@ async def stream_message(data: StreamMessageCreate):
         "rename clinic","update clinic","change clinic",
         "client id","lead id","lead#","clinic id","clinic#",
     ))
+    # lead/clinic/service/appointment tasks go through the agent orchestrator
+    agent_task = _looks_like_agent_task(data.user_message)
+    houmanity_intent = houmanity_intent or agent_task
 
     # Update title on first real message (do this before any early returns)
     if chat.title == "New Chat" and data.user_message.strip():
@@ -118,6 +132,40 @@ async def stream_message(data: StreamMessageCreate):
             },
         )
 
+    async def classic_tokens() -> AsyncGenerator[str, None]:
+        stream = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are the Houmanity in-app assistant. Only assist with Houmanity-related "
+                        "questions (leads, clinics, account)."
+                    ),
+                },
+                {"role": "user", "content": data.user_message},
+            ],
+            stream=True,
+            temperature=0.2,
+        )
+
+        async for ev in stream:
+            delta = ev.choices[0].delta.content or ""
+            if delta:
+                yield delta
+
+    chunks: List[str] = []
+
+    async def agent_events() -> AsyncGenerator[str, None]:
+        # tool progress as named events, the answer as the same token frames as classic chat
+        async for ev in stream_with_agent(data.user_message, data.chat_id, data.user_id):
+            kind = ev.pop("type")
+            if kind == "token":
+                chunks.append(ev["text"])
+                yield f"data: {json.dumps({'token': ev['text']})}\n\n"
+            elif kind != "final":
+                yield f"event: {kind}\ndata: {json.dumps(ev, default=str)}\n\n"
+
     async def event_gen() -> AsyncGenerator[str, None]:
         # create blank assistant row (so final save just updates it)
         msg_row = await Message.create(
@@ -125,27 +173,19 @@ async def stream_message(data: StreamMessageCreate):
             user_message=data.user_message, bot_response=""
         )
         yield "event: start\ndata: {}\n\n"
-        chunks = []
         try:
-            stream = await client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": (
-                            "You are the Houmanity in-app assistant. Only assist with Houmanity-related "
-                            "questions (leads, clinics, account)."
-                        ),
-                    },
-                    {"role": "user", "content": data.user_message},
-                ],
-                stream=True,
-                temperature=0.2,
-            )
-
-            async for ev in stream:
-                delta = ev.choices[0].delta.content or ""
-                if delta:
+            agent_ok = False
+            if agent_task:
+                try:
+                    async for frame in agent_events():
+                        yield frame
+                    agent_ok = True
+                except Exception as e:
+                    # same fallback as generate_ai_response: answer from the classic chain instead
+                    print(f"[stream] orchestrator failed, falling back to classic chat: {e}")
+                    chunks.clear()
+            if not agent_ok:
+                async for delta in classic_tokens():
                     chunks.append(delta)
                     yield f"data: {json.dumps({'token': delta})}\n\n"
 
@@ -287,44 +327,95 @@ async def get_chat_messages(chat_id: int, user_id: str):
 #     except Exception as e:
 #         print(f"Error occurred: {e}")
 #         raise HTTPException(status_code=500, detail="An error occurred while sending the message. Please try again later.")
+def _message_response(message: Message) -> MessageResponse:
+    return MessageResponse(
+        id=message.id,
+        user_id=message.user_id,
+        chat_id=message.chat_id,
+        user_message=message.user_message,
+        bot_response=message.bot_response,
+        created_at=message.created_at
+    )
+
+
+def _record_latency(mode: str, started: float, first_byte: Optional[float]) -> Dict[str, float]:
+    now = time.perf_counter()
+    ttfb = (first_byte or now) - started
+    MESSAGE_TTFB.observe(ttfb, labels={"mode": mode})
+    MESSAGE_SECONDS.observe(now - started, labels={"mode": mode})
+    return {"ttfb_ms": round(ttfb * 1000, 1), "total_ms": round((now - started) * 1000, 1)}
+
+
+def _start_turn(message_data: MessageCreate) -> "asyncio.Task[Message]":
+    # the insert runs while the model is answering; history ignores the row until it has a reply
+    row_task = asyncio.create_task(
+        create_message_row(message_data.user_id, message_data.chat_id, message_data.user_message)
+    )
+    # a turn that ends before finish_turn (error, disconnect) must not leave its failure unretrieved
+    row_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return row_task
+
+
+async def _stream_message_ndjson(message_data: MessageCreate, started: float) -> AsyncGenerator[str, None]:
+    row_task = _start_turn(message_data)
+    first_byte: Optional[float] = None
+    parts: List[str] = []
+    tail: Optional[asyncio.Task] = None
+    try:
+        async for ev in stream_ai_response(message_data.user_message, message_data.chat_id, message_data.user_id):
+            if ev["type"] == "final":
+                continue
+            if ev["type"] == "token":
+                first_byte = first_byte or time.perf_counter()
+                parts.append(ev["text"])
+            yield json.dumps(ev, default=str) + "\n"
+
+        tail = finish_turn(row_task, message_data.user_id, message_data.chat_id,
+                           message_data.user_message, "".join(parts) or "OK")
+        message = await asyncio.shield(tail)
+        timing = _record_latency("stream", started, first_byte)
+        yield json.dumps({"type": "done", "message": _message_response(message).model_dump(mode="json"), **timing}) + "\n"
+    except Exception as e:
+        print(f"Error occurred: {e}")
+        yield json.dumps({"type": "error", "error": "An error occurred while sending the message. Please try again later."}) + "\n"
+    finally:
+        if tail is None and parts:
+            # the client went away (GeneratorExit/cancel) or the stream failed mid-reply:
+            # keep what was already sent so history shows the same answer
+            finish_turn(row_task, message_data.user_id, message_data.chat_id,
+                        message_data.user_message, "".join(parts))
+
+
 @router.post("/messages", response_model=MessageResponse)
-async def send_message(message_data: MessageCreate):
-    """Send a message and get AI response"""
+async def send_message(message_data: MessageCreate, response: Response):
+    """
+    Send a message and get AI response.
+
+    With "stream": true the reply comes back as NDJSON lines while it is produced
+    ({"type": "token", "text": ...}, agent tool events, then {"type": "done", "message": {...},
+    "ttfb_ms", "total_ms"}). Either way the reply text and chat title/updated_at are
+    written behind the response (helper/message_writer.py); a reply is stored even if
+    the client disconnects first, but one still queued when the process crashes is
+    lost (see MESSAGE_WRITE_FLUSH_SECONDS there).
+    """
+    started = time.perf_counter()
+    if message_data.stream:
+        return StreamingResponse(
+            _stream_message_ndjson(message_data, started),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
     try:
-        # Generate AI response (replace with your AI service)
+        row_task = _start_turn(message_data)
         ai_response = await generate_ai_response(message_data.user_message,message_data.chat_id,message_data.user_id)
-        
-        # Save message to database
-        message = await Message.create(
-            user_id=message_data.user_id,
-            chat_id=message_data.chat_id,
-            user_message=message_data.user_message,
-            bot_response=ai_response
-        )
-        
-        # Update chat title if it's the first real message
-        chat = await Chat.get(id=message_data.chat_id)
-        if chat.title == "New Chat" and message_data.user_message.strip():
-            # Use first few words of the message as title
-            title_words = message_data.user_message.split()[:5]
-            new_title = " ".join(title_words)
-            if len(new_title) > 50:
-                new_title = new_title[:47] + "..."
-            chat.title = new_title
-            await chat.save()     
-        
-        # Update chat's updated_at timestamp
-        chat.updated_at = datetime.now()
-        await chat.save()
-        
-        return MessageResponse(
-            id=message.id,
-            user_id=message.user_id,
-            chat_id=message.chat_id,
-            user_message=message.user_message,
-            bot_response=message.bot_response,
-            created_at=message.created_at
-        )
+        # shielded: a disconnect from here on no longer drops the generated reply
+        message = await asyncio.shield(finish_turn(
+            row_task, message_data.user_id, message_data.chat_id, message_data.user_message, ai_response
+        ))
+
+        timing = _record_latency("buffered", started, None)
+        response.headers["Server-Timing"] = f"total;dur={timing['total_ms']}"
+        return _message_response(message)
     
     except Exception as e:
         # Log the error or print the details if needed
@@ -4,6 +4,8 @@ import asyncio
 
 # Import only the new "no store" helper
 from helper.transcription_helper import process_unprocessed_callrails_no_store
+from helper.admission import AdmissionRejected, batch_admission, fingerprint, rejection_response
+from helper.work_lanes import USER_BATCH, run_in_lane
 
 router = APIRouter()
 
@@ -23,6 +25,8 @@ async def fetch_client_leads_and_callrail(request: Request):
         "message": "...",
         "data": [ { per-phone aggregated result incl. `recordings` } ]
       }
+    Calls another worker is transcribing at that moment are not waited for: their
+    group comes back with transcription_status="in_progress" and `calls_in_progress`.
     """
     try:
         payload = await request.json()
@@ -36,7 +40,17 @@ async def fetch_client_leads_and_callrail(request: Request):
         if not call_records:
             return {"status": "error", "message": "No call records provided", "data": []}
 
-        result = await process_unprocessed_callrails_no_store(call_records)
+        # identical payloads (double submits) share one run; too much queued work gets a 429.
+        # Without a user id the key is the payload itself, so unrelated anonymous
+        # requests don't share (and queue behind) one per-user cap.
+        user_key = payload.get("user_id") or payload.get("phone_number") or f"payload:{fingerprint(call_records)}"
+        try:
+            result = await batch_admission.run(
+                "fetch-data", user_key, call_records,
+                lambda: run_in_lane(USER_BATCH, process_unprocessed_callrails_no_store, call_records),
+            )
+        except AdmissionRejected as e:
+            return rejection_response(e)
 
         return {
             "status": "success",
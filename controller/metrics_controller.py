@@ -0,0 +1,54 @@
+# controller/metrics_controller.py
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from helper.metrics import render_prometheus, snapshot
+from helper.work_lanes import lanes_report
+from helper.admission import batch_admission
+from helper.adaptive_limit import limits_report
+
+router = APIRouter()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    """Per-worker metrics in Prometheus text exposition format."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@router.get("/metrics/json")
+async def metrics_json():
+    """Same metrics as JSON (with p50/p95 estimates for histograms)."""
+    return {"success": True, "data": snapshot()}
+
+
+@router.get("/metrics/lanes")
+async def metrics_lanes():
+    """Live per-lane slot usage and queue depth for each work resource."""
+    return {"success": True, "data": lanes_report()}
+
+
+@router.get("/metrics/admission")
+async def metrics_admission():
+    """Batch jobs running and queued, with estimated start times."""
+    return {"success": True, "data": batch_admission.report()}
+
+
+@router.get("/metrics/upstreams")
+async def metrics_upstreams():
+    """Current adaptive concurrency limit and load for each upstream (CallRail, Laravel, OpenAI)."""
+    return {"success": True, "data": limits_report()}
+
+
+@router.get("/metrics/agent-runtime")
+async def metrics_agent_runtime():
+    """Cached chat models, tool bindings and prompts, plus the LangChain import time."""
+    from agents.runtime import agent_runtime
+    return {"success": True, "data": agent_runtime.report()}
+
+
+@router.get("/metrics/fastpaths")
+async def metrics_fastpaths():
+    """Agent-path messages answered by a deterministic fast path (no LLM call), per rule."""
+    from agents.fastpaths.engine import fastpath_engine
+    return {"success": True, "data": fastpath_engine.report()}
@@ -16,6 +16,8 @@ from models.post_draft import PostDraft  # noqa: F401
 
 from cron_job import process_single_user
 from controller.job_calldata_controller import get_users_by_client
+from helper.work_lanes import USER_BATCH, lane
+from helper.admission import AdmissionRejected, batch_admission, rejection_response
 
 
 # --------------------- Robust logger setup ---------------------
@@ -84,35 +86,41 @@ async def run_manual(score_payload: ScorePayload):
         users = users_data.get("data", [])
         logger.info(f"Successfully received data for {len(users)} users")
 
-        results = []
-        # Process sequentially (keeps logs tidy). If needed, you can run concurrently with asyncio.gather.
-        for u in users:
-            try:
-                res = await process_single_user(u)
-                results.append(res or {})
-            except Exception as e:
-                logger.exception(f"Error processing user entry {u}: {e}")
-                results.append({"status": "error", "error": str(e)})
-
-        completed = sum(1 for r in results if (r or {}).get("status") == "completed")
-        total_processed = sum((r or {}).get("processed_count", 0) for r in results)
-
-        summary = {
-            "status": "ok",
-            "user_id": score_payload.user_id,
-            "users_received": len(users),
-            "users_completed": completed,
-            "total_records_processed": total_processed,
-            "results": results,
-        }
-
-        logger.info("=== Cron job completed ===")
-        logger.info(
-            f"Processed {len(results)} users ({completed} successfully). "
-            f"Total records processed: {total_processed}"
-        )
-
-        return summary
+        async def _process_all() -> Dict:
+            results = []
+            # Process sequentially (keeps logs tidy). If needed, you can run concurrently with asyncio.gather.
+            for u in users:
+                try:
+                    with lane(USER_BATCH):
+                        res = await process_single_user(u)
+                    results.append(res or {})
+                except Exception as e:
+                    logger.exception(f"Error processing user entry {u}: {e}")
+                    results.append({"status": "error", "error": str(e)})
+
+            completed = sum(1 for r in results if (r or {}).get("status") == "completed")
+            total_processed = sum((r or {}).get("processed_count", 0) for r in results)
+
+            logger.info("=== Cron job completed ===")
+            logger.info(
+                f"Processed {len(results)} users ({completed} successfully). "
+                f"Total records processed: {total_processed}"
+            )
+            return {
+                "status": "ok",
+                "user_id": score_payload.user_id,
+                "users_received": len(users),
+                "users_completed": completed,
+                "total_records_processed": total_processed,
+                "results": results,
+            }
+
+        # one run per user_id at a time; a repeated click joins the run in progress
+        try:
+            return await batch_admission.run("manually", score_payload.user_id, score_payload.user_id, _process_all)
+        except AdmissionRejected as e:
+            logger.warning(f"Rejected manual run for {score_payload.user_id}: {e}")
+            return rejection_response(e)
 
     except Exception as e:
         logger.exception(f"Fatal error in run_manual: {e}")
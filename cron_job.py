@@ -5,11 +5,17 @@ from tortoise import Tortoise
 from helper.tortoise_config import TORTOISE_CONFIG
 import uuid
 import os
+import time
 from dotenv import load_dotenv
 
 from controller.job_calldata_controller import get_users_by_client
 # ✅ import the transcription+scoring background function
-from controller.call_transcript_controller import process_clients_background
+from controller.call_transcript_controller import process_clients_background, active_sessions
+from helper.work_lanes import NIGHTLY, lane
+
+# Users processed at the same time, and the wall-clock cap for one user's run
+CRON_USER_CONCURRENCY = int(os.getenv("CRON_USER_CONCURRENCY", "4"))
+CRON_USER_TIMEOUT_SECONDS = float(os.getenv("CRON_USER_TIMEOUT_SECONDS", "1800"))
 
 # -----------------------------------------------------------------------------
 # Logging: make module import-safe (no file I/O at import time)
@@ -72,26 +78,93 @@ async def shutdown_orm():
 # -----------------------------------------------------------------------------
 # Worker
 # -----------------------------------------------------------------------------
-async def process_single_user(user):
+async def process_single_user(user, timeout: float = CRON_USER_TIMEOUT_SECONDS):
     user_id = user.get('id')
     logger.info(f"=== Processing user ID: {user_id} === {user}")
+    started = time.perf_counter()
 
     # Your current payload seems to carry top-level client_id:
     clients = [{"client_id": user['client_id']}]
 
     total_processed = 0
+    errors = []
+    status = "completed"
     for c in clients:
+        session_id = str(uuid.uuid4())
         try:
-            session_id = str(uuid.uuid4())
             logger.info(f"Processing client {c['client_id']} (user {user_id}) session={session_id}")
             # signature: (client_ids: List[str], session_id: str, user_id: int)
-            result = await process_clients_background([c['client_id']], session_id, user_id)
+            result = await asyncio.wait_for(
+                process_clients_background([c['client_id']], session_id, user_id),
+                timeout=timeout,
+            )
             processed_phones = int((result or {}).get("processed_phone_numbers", 0))
             total_processed += processed_phones
+            if (result or {}).get("status") == "error":
+                status = "failed"
+                errors.append(str(result.get("detail")))
+        except asyncio.TimeoutError:
+            status = "timeout"
+            errors.append(f"client {c['client_id']} timed out after {timeout:.0f}s")
+            logger.error(f"Timed out processing client {c['client_id']} (user {user_id}) after {timeout:.0f}s")
         except Exception as e:
+            status = "failed"
+            errors.append(f"client {c['client_id']}: {e}")
             logger.exception(f"Error processing client {c['client_id']}: {e}")
-
-    return {"user_id": user_id, "status": "completed", "processed_count": total_processed, "client_count": len(clients)}
+        finally:
+            # per-phone failures are recorded in the progress session rather than raised
+            session = active_sessions.pop(session_id, None) or {}
+            errors.extend(d.get("message", "") for d in session.get("details", []) if d.get("status") == "error")
+
+    return {
+        "user_id": user_id,
+        "status": status,
+        "processed_count": total_processed,
+        "client_count": len(clients),
+        "duration_s": round(time.perf_counter() - started, 2),
+        "errors": errors,
+    }
+
+async def process_users(users, concurrency: int = CRON_USER_CONCURRENCY, timeout: float = CRON_USER_TIMEOUT_SECONDS):
+    """Run process_single_user for every user, at most `concurrency` at a time; one user's failure never stops the rest."""
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def _guarded(u):
+        async with sem:
+            started = time.perf_counter()
+            try:
+                return await process_single_user(u, timeout=timeout)
+            except Exception as e:
+                # e.g. a malformed user row (missing client_id)
+                logger.exception(f"Error processing user {u.get('id')}: {e}")
+                return {
+                    "user_id": u.get('id'), "status": "failed", "processed_count": 0, "client_count": 0,
+                    "duration_s": round(time.perf_counter() - started, 2), "errors": [str(e)],
+                }
+
+    return await asyncio.gather(*(_guarded(u) for u in users))
+
+def log_summary(results, wall_s: float) -> None:
+    logger.info("=== Per-user summary ===")
+    for r in sorted(results, key=lambda r: r.get('duration_s', 0), reverse=True):
+        logger.info(
+            f"user {r.get('user_id')}: {r.get('status')} in {r.get('duration_s', 0):.1f}s, "
+            f"phone numbers processed={r.get('processed_count', 0)}, errors={len(r.get('errors') or [])}"
+        )
+        for err in (r.get('errors') or [])[:5]:
+            logger.info(f"    - {err}")
+
+    completed = sum(1 for r in results if r.get('status') == 'completed')
+    total_processed = sum(r.get('processed_count', 0) for r in results)
+    total_errors = sum(len(r.get('errors') or []) for r in results)
+    longest = max((r.get('duration_s', 0) for r in results), default=0)
+    sequential = sum(r.get('duration_s', 0) for r in results)
+    logger.info(f"Processed {len(results)} users ({completed} successfully), {total_errors} error(s)")
+    logger.info(f"Total phone numbers processed: {total_processed}")
+    logger.info(
+        f"Wall time {wall_s:.1f}s (longest user {longest:.1f}s, sum of user times {sequential:.1f}s, "
+        f"concurrency {CRON_USER_CONCURRENCY})"
+    )
 
 # -----------------------------------------------------------------------------
 # Entrypoint
@@ -110,16 +183,12 @@ async def main():
         users = users_data.get('data', [])
         logger.info(f"Successfully received data for {len(users)} users")
 
-        results = []
-        for u in users:
-            results.append(await process_single_user(u))
-
-        completed = sum(1 for r in results if r.get('status') == 'completed')
-        total_processed = sum(r.get('processed_count', 0) for r in results)
+        started = time.perf_counter()
+        with lane(NIGHTLY):
+            results = await process_users(users)
 
         logger.info("=== Cron job completed ===")
-        logger.info(f"Processed {len(results)} users ({completed} successfully)")
-        logger.info(f"Total records processed: {total_processed}")
+        log_summary(results, time.perf_counter() - started)
 
     except Exception as e:
         logger.exception(f"Fatal error in main: {e}")
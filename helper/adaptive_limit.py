@@ -0,0 +1,220 @@
+# helper/adaptive_limit.py
+"""
+AIMD concurrency limits per upstream (CallRail, Laravel, OpenAI).
+
+Each upstream has a limiter whose limit moves between a min and a max:
+
+    additive increase        +1 per `limit` healthy completions, and only while the
+                             limit is actually what holds callers back (in flight
+                             close to the limit)
+    multiplicative decrease  limit * ADAPTIVE_BACKOFF on 429 / 5xx / timeouts, or when the
+                             recent p95 latency rises above ADAPTIVE_LATENCY_TOLERANCE x
+                             the best p95 seen lately; at most once per round trip
+
+Usage:
+
+    async with CALLRAIL_LIMIT.slot() as call:
+        resp = await session.get(...)
+        call.status(resp.status)      # lets a 429/5xx count as overload
+
+Exceptions raised inside the block are classified too (timeouts and errors that
+carry a 429/5xx status count as overload, anything else is neutral).
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Optional
+
+from helper.metrics import counter, gauge, histogram
+
+ADAPTIVE_BACKOFF = float(os.getenv("ADAPTIVE_BACKOFF", "0.7"))
+ADAPTIVE_LATENCY_TOLERANCE = float(os.getenv("ADAPTIVE_LATENCY_TOLERANCE", "2.0"))
+# latency samples per p95 evaluation
+ADAPTIVE_WINDOW = int(os.getenv("ADAPTIVE_WINDOW", "20"))
+
+LIMIT_GAUGE = gauge("adaptive_concurrency_limit", "Current adaptive concurrency limit, by upstream")
+IN_FLIGHT_GAUGE = gauge("adaptive_concurrency_in_flight", "Requests in flight, by upstream")
+LIMIT_EVENTS = counter("adaptive_concurrency_events_total", "Limit changes and overload signals, by upstream and event")
+UPSTREAM_LATENCY = histogram("adaptive_upstream_latency_seconds", "Upstream call latency, by upstream")
+
+
+def _status_of(exc: BaseException) -> Optional[int]:
+    for obj in (exc, getattr(exc, "response", None)):
+        code = getattr(obj, "status_code", None) or getattr(obj, "status", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_overload_status(code: Optional[int]) -> bool:
+    return code is not None and (code == 429 or code >= 500)
+
+
+class _Call:
+    def __init__(self):
+        self.code: Optional[int] = None
+        self.overloaded = False
+
+    def status(self, code: Optional[int]) -> None:
+        self.code = code
+        if is_overload_status(code):
+            self.overloaded = True
+
+    def overload(self) -> None:
+        self.overloaded = True
+
+
+class AdaptiveLimiter:
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int):
+        self.name = name
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._window: Deque[float] = deque(maxlen=max(5, ADAPTIVE_WINDOW))
+        self._since_eval = 0
+        self._best_p95: Optional[float] = None
+        self._last_decrease = 0.0
+        self._labels = {"upstream": name}
+        self._publish()
+
+    # ---------- slots ----------
+    def _capacity(self) -> int:
+        return max(self.min_limit, int(math.floor(self.limit)))
+
+    async def _acquire(self) -> None:
+        if not self._waiters and self.in_flight < self._capacity():
+            self.in_flight += 1
+            self._publish()
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                self._release_slot()
+            else:
+                try:
+                    self._waiters.remove(fut)
+                except ValueError:
+                    pass
+            raise
+
+    def _release_slot(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._waiters and self.in_flight < self._capacity():
+            fut = self._waiters.popleft()
+            if fut.done():
+                continue
+            self.in_flight += 1
+            fut.set_result(None)
+        self._publish()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._acquire()
+        call = _Call()
+        started = time.perf_counter()
+        busy = self.in_flight  # how hard the limit was being used when we started
+        try:
+            yield call
+        except asyncio.TimeoutError:
+            call.overload()
+            raise
+        except Exception as e:
+            code = _status_of(e)
+            if code is not None:
+                call.status(code)
+            elif "timeout" in type(e).__name__.lower():
+                call.overload()
+            raise
+        finally:
+            self._on_complete(time.perf_counter() - started, call, busy)
+            self._release_slot()
+
+    # ---------- AIMD ----------
+    def _on_complete(self, latency: float, call: _Call, busy: int) -> None:
+        UPSTREAM_LATENCY.observe(latency, labels=self._labels)
+        if call.overloaded:
+            LIMIT_EVENTS.inc(labels={**self._labels, "event": "overload"})
+            self._decrease(latency)
+            return
+        if call.code is not None and call.code >= 400:
+            return  # client error: says nothing about upstream capacity
+
+        self._window.append(latency)
+        self._since_eval += 1
+        if self._since_eval >= self._window.maxlen:
+            self._since_eval = 0
+            p95 = sorted(self._window)[int(0.95 * (len(self._window) - 1))]
+            if self._best_p95 is None or p95 < self._best_p95:
+                self._best_p95 = p95
+            else:
+                # let the baseline drift up slowly so one lucky window doesn't pin it forever
+                self._best_p95 = self._best_p95 * 0.95 + p95 * 0.05
+            if p95 > self._best_p95 * ADAPTIVE_LATENCY_TOLERANCE:
+                LIMIT_EVENTS.inc(labels={**self._labels, "event": "latency"})
+                self._decrease(latency)
+                return
+
+        if busy >= self._capacity() - 1 and self.limit < self.max_limit:
+            before = self._capacity()
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            if self._capacity() > before:
+                LIMIT_EVENTS.inc(labels={**self._labels, "event": "increase"})
+            self._dispatch()
+
+    def _decrease(self, latency: float) -> None:
+        # one cut per round trip: the calls already in flight were admitted under the old limit
+        now = time.monotonic()
+        cooldown = self._best_p95 or latency
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * ADAPTIVE_BACKOFF)
+        LIMIT_EVENTS.inc(labels={**self._labels, "event": "decrease"})
+        self._publish()
+
+    def _publish(self) -> None:
+        LIMIT_GAUGE.set(self._capacity(), labels=self._labels)
+        IN_FLIGHT_GAUGE.set(self.in_flight, labels=self._labels)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "limit": self._capacity(),
+            "limit_exact": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "best_p95_s": round(self._best_p95, 3) if self._best_p95 is not None else None,
+            "min": self.min_limit,
+            "max": self.max_limit,
+        }
+
+
+def _limiter(name: str, initial: int, min_limit: int, max_limit: int) -> AdaptiveLimiter:
+    env = f"ADAPTIVE_{name.upper()}"
+    return AdaptiveLimiter(
+        name,
+        initial=int(os.getenv(f"{env}_INITIAL", str(initial))),
+        min_limit=int(os.getenv(f"{env}_MIN", str(min_limit))),
+        max_limit=int(os.getenv(f"{env}_MAX", str(max_limit))),
+    )
+
+
+CALLRAIL_LIMIT = _limiter("callrail", initial=4, min_limit=1, max_limit=16)
+LARAVEL_LIMIT = _limiter("laravel", initial=8, min_limit=2, max_limit=32)
+OPENAI_LIMIT = _limiter("openai", initial=8, min_limit=1, max_limit=32)
+
+LIMITERS: Dict[str, AdaptiveLimiter] = {l.name: l for l in (CALLRAIL_LIMIT, LARAVEL_LIMIT, OPENAI_LIMIT)}
+
+
+def limits_report() -> Dict[str, Any]:
+    return {name: l.report() for name, l in LIMITERS.items()}
@@ -0,0 +1,241 @@
+# helper/admission.py
+"""
+Admission control for the heavy batch endpoints (/process-user-clients, /manually, /fetch-data).
+
+Each accepted request becomes a Ticket. At most BATCH_MAX_GLOBAL tickets run at once,
+and at most BATCH_MAX_PER_USER of them for the same user. The rest wait in a FIFO
+queue; a user who is already at their limit doesn't hold up other users behind them.
+When BATCH_MAX_QUEUE tickets are waiting, new ones are rejected with a Retry-After
+estimate.
+
+A request identical to one that is queued or running for the same user (same kind,
+same parameters) joins that ticket instead of starting a second run.
+
+Start estimates come from a moving average of recent run durations for each kind.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+from helper.metrics import counter, gauge
+
+logger = logging.getLogger("uvicorn.error")
+
+BATCH_MAX_GLOBAL = int(os.getenv("BATCH_MAX_GLOBAL", "2"))
+BATCH_MAX_PER_USER = int(os.getenv("BATCH_MAX_PER_USER", "1"))
+BATCH_MAX_QUEUE = int(os.getenv("BATCH_MAX_QUEUE", "20"))
+# synchronous endpoints wait in the queue only if their estimated start is this close
+BATCH_MAX_SYNC_WAIT = float(os.getenv("BATCH_MAX_SYNC_WAIT", "120"))
+# assumed run time before any run of that kind has finished
+BATCH_DEFAULT_DURATION = float(os.getenv("BATCH_DEFAULT_DURATION", "120"))
+
+ADMISSIONS = counter("batch_admission_total", "Batch requests by kind and outcome (started/queued/joined/rejected)")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+
+
+def fingerprint(params: Any) -> str:
+    raw = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Ticket:
+    def __init__(self, kind: str, user_key: str, fp: str, session_id: Optional[str] = None):
+        self.kind = kind
+        self.user_key = user_key
+        self.fp = fp
+        self.session_id = session_id
+        self.state = "queued"
+        self.enqueued_at = time.time()
+        self.started_at: Optional[float] = None
+        self.joiners = 0
+        self.estimated_start: Optional[float] = None
+        self.result: asyncio.Future = asyncio.get_running_loop().create_future()
+        # background tickets may never be awaited; mark their errors as retrieved
+        self.result.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._go: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        return self.kind, self.user_key, self.fp
+
+    def describe(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"state": self.state, "kind": self.kind}
+        if self.session_id:
+            out["session_id"] = self.session_id
+        if self.state == "queued" and self.estimated_start is not None:
+            out["estimated_start"] = datetime.fromtimestamp(self.estimated_start).isoformat(timespec="seconds")
+            out["retry_after"] = max(1, int(math.ceil(self.estimated_start - time.time())))
+        return out
+
+
+class BatchAdmission:
+    def __init__(self, max_global: int = BATCH_MAX_GLOBAL, max_per_user: int = BATCH_MAX_PER_USER,
+                 max_queue: int = BATCH_MAX_QUEUE):
+        self.max_global = max(1, max_global)
+        self.max_per_user = max(1, max_per_user)
+        self.max_queue = max(0, max_queue)
+        self._queue: Deque[Ticket] = deque()
+        self._running: Set[Ticket] = set()
+        self._by_key: Dict[Tuple[str, str, str], Ticket] = {}
+        self._avg_duration: Dict[str, float] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    # ---------- estimates ----------
+    def _duration(self, kind: str) -> float:
+        return self._avg_duration.get(kind, BATCH_DEFAULT_DURATION)
+
+    def _record(self, kind: str, seconds: float) -> None:
+        prev = self._avg_duration.get(kind)
+        self._avg_duration[kind] = seconds if prev is None else 0.7 * prev + 0.3 * seconds
+
+    def _estimate_start(self, position: int, kind: str) -> float:
+        """Epoch seconds when the ticket at queue `position` (0-based) should start."""
+        now = time.time()
+        # earliest a running slot frees up
+        remaining = [max(0.0, self._duration(t.kind) - (now - (t.started_at or now))) for t in self._running]
+        remaining.sort()
+        if len(remaining) < self.max_global:
+            first_free = 0.0
+        else:
+            first_free = remaining[0] if remaining else 0.0
+        waves = position // self.max_global
+        return now + first_free + waves * self._duration(kind)
+
+    def _refresh_estimates(self) -> None:
+        for pos, t in enumerate(self._queue):
+            t.estimated_start = self._estimate_start(pos, t.kind)
+
+    # ---------- dispatch ----------
+    def _user_running(self, user_key: str) -> int:
+        return sum(1 for t in self._running if t.user_key == user_key)
+
+    def _dispatch(self) -> None:
+        for ticket in list(self._queue):
+            if len(self._running) >= self.max_global:
+                break
+            if self._user_running(ticket.user_key) >= self.max_per_user:
+                continue
+            self._queue.remove(ticket)
+            self._running.add(ticket)
+            ticket.state = "running"
+            ticket.started_at = time.time()
+            ticket.estimated_start = None
+            if not ticket._go.done():
+                ticket._go.set_result(None)
+        self._refresh_estimates()
+
+    async def _run(self, ticket: Ticket, runner: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            await ticket._go
+            result = await runner()
+            if not ticket.result.done():
+                ticket.result.set_result(result)
+        except BaseException as e:
+            if not ticket.result.done():
+                if isinstance(e, asyncio.CancelledError):
+                    ticket.result.cancel()
+                else:
+                    ticket.result.set_exception(e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            logger.exception("[admission] %s run for %s failed: %s", ticket.kind, ticket.user_key, e)
+        finally:
+            if ticket.started_at is not None:
+                self._record(ticket.kind, time.time() - ticket.started_at)
+            ticket.state = "finished"
+            self._running.discard(ticket)
+            try:
+                self._queue.remove(ticket)
+            except ValueError:
+                pass
+            if self._by_key.get(ticket.key) is ticket:
+                del self._by_key[ticket.key]
+            self._dispatch()
+
+    # ---------- public ----------
+    def submit(self, kind: str, user_key: Any, params: Any, runner: Callable[[], Awaitable[Any]],
+               session_id: Optional[str] = None, max_wait: Optional[float] = None) -> Tuple[Ticket, bool]:
+        """
+        Admit one batch request. Returns (ticket, joined); `joined` means an identical
+        request was already queued/running and the caller shares its ticket.
+        Raises AdmissionRejected when the queue is full or the estimated start is
+        further away than `max_wait`.
+        """
+        user_key = str(user_key)
+        key = (kind, user_key, fingerprint(params))
+        existing = self._by_key.get(key)
+        if existing is not None:
+            existing.joiners += 1
+            ADMISSIONS.inc(labels={"kind": kind, "outcome": "joined"})
+            return existing, True
+
+        can_start_now = len(self._running) < self.max_global and self._user_running(user_key) < self.max_per_user
+        if not can_start_now:
+            estimate = self._estimate_start(len(self._queue), kind) - time.time()
+            if len(self._queue) >= self.max_queue:
+                ADMISSIONS.inc(labels={"kind": kind, "outcome": "rejected"})
+                raise AdmissionRejected(f"Too many batch jobs queued ({len(self._queue)})", estimate)
+            if max_wait is not None and estimate > max_wait:
+                ADMISSIONS.inc(labels={"kind": kind, "outcome": "rejected"})
+                raise AdmissionRejected(f"Batch capacity busy; estimated start in {estimate:.0f}s", estimate)
+
+        ticket = Ticket(kind, user_key, key[2], session_id=session_id)
+        self._by_key[key] = ticket
+        self._queue.append(ticket)
+        task = asyncio.create_task(self._run(ticket, runner))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        self._dispatch()
+        ADMISSIONS.inc(labels={"kind": kind, "outcome": "started" if ticket.state == "running" else "queued"})
+        return ticket, False
+
+    async def run(self, kind: str, user_key: Any, params: Any, runner: Callable[[], Awaitable[Any]],
+                  max_wait: float = BATCH_MAX_SYNC_WAIT) -> Any:
+        """Submit and wait for the result (for endpoints that answer synchronously)."""
+        ticket, _joined = self.submit(kind, user_key, params, runner, max_wait=max_wait)
+        # shield: a client disconnecting must not cancel a run other requests joined
+        return await asyncio.shield(ticket.result)
+
+    def queued(self) -> int:
+        return len(self._queue)
+
+    def running(self) -> int:
+        return len(self._running)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "max_global": self.max_global,
+            "max_per_user": self.max_per_user,
+            "max_queue": self.max_queue,
+            "running": [{"user": t.user_key, **t.describe()} for t in self._running],
+            "queued": [{"user": t.user_key, **t.describe()} for t in self._queue],
+            "avg_duration_s": {k: round(v, 1) for k, v in self._avg_duration.items()},
+        }
+
+
+batch_admission = BatchAdmission()
+
+gauge("batch_admission_running", "Batch jobs currently running", fn=lambda: batch_admission.running())
+gauge("batch_admission_queued", "Batch jobs waiting for a slot", fn=lambda: batch_admission.queued())
+
+
+def rejection_response(e: AdmissionRejected):
+    """429 with Retry-After, in the shape the batch endpoints return."""
+    from fastapi.responses import JSONResponse
+    return JSONResponse(
+        status_code=429,
+        content={"status": "busy", "message": str(e), "retry_after": e.retry_after},
+        headers={"Retry-After": str(e.retry_after)},
+    )
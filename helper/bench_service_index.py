@@ -0,0 +1,86 @@
+# helper/bench_service_index.py
+"""
+Microbenchmark for helper/service_index.py over a synthetic catalog.
+
+    python helper/bench_service_index.py [n_services]
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+# run from the project root's view: with helper/ itself on sys.path, "helper"
+# would resolve to helper/helper.py instead of the helper/ package
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from helper.service_index import ServiceIndex
+
+_AREAS = ["dental", "teeth", "skin", "laser", "hair", "facial", "body", "orthodontic", "implant", "vein"]
+_KINDS = ["cleaning", "whitening", "consultation", "removal", "filler", "treatment", "therapy",
+          "extraction", "exam", "crown", "peel", "botox", "aligner", "xray", "contouring"]
+_EXTRA = ["deluxe", "express", "premium", "pediatric", "senior", "follow-up", "package", "single", "session"]
+
+
+def synthetic_catalog(n: int, seed: int = 7):
+    rnd = random.Random(seed)
+    # filler vocabulary so descriptions look like prose rather than repeating 30 words
+    letters = "abcdefghiklmnoprstuvy"
+    filler = ["".join(rnd.choice(letters) for _ in range(rnd.randint(4, 10))) for _ in range(3000)]
+    domain = _AREAS + _KINDS + _EXTRA
+    rows = []
+    for i in range(1, n + 1):
+        name = f"{rnd.choice(_AREAS).title()} {rnd.choice(_KINDS).title()} {rnd.choice(_EXTRA).title()} {i}"
+        desc = " ".join(rnd.choice(domain) if rnd.random() < 0.2 else rnd.choice(filler) for _ in range(20))
+        rows.append({"id": i, "name": name, "description": desc, "for_report": i % 2})
+    return rows
+
+
+def _timeit(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return statistics.mean(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main(n: int = 10_000):
+    rows = synthetic_catalog(n)
+    idx = ServiceIndex("bench")
+
+    t0 = time.perf_counter()
+    idx.sync(rows)
+    print(f"build  {n} services: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+    changed = [dict(r, name=r["name"] + " v2") for r in rows[:100]] + rows[100:]
+    t0 = time.perf_counter()
+    stats = idx.sync(changed)
+    print(f"resync 100 changed:   {(time.perf_counter() - t0) * 1000:.1f} ms  {stats}")
+
+    queries = {
+        "exact": "teeth whitening",
+        "synonym": "tooth bleaching",
+        "prefix": "whit",
+        "typo": "whitenning",
+        "multi": "premium laser hair removal",
+        "miss": "acupuncture",
+    }
+    for q in queries.values():
+        idx.search(q)  # warm lazily built structures
+    for label, q in queries.items():
+        mean, p95 = _timeit(lambda: idx.search(q, limit=25), repeat=200)
+        hits = len(idx.search(q, limit=25))
+        print(f"search {label:<8} {q!r:<30} mean {mean:.3f} ms  p95 {p95:.3f} ms  hits {hits}")
+
+    # the scan it replaces: substring match over every row, like LIKE '%q%'
+    def scan():
+        ql = "whitening"
+        return [r for r in rows if ql in r["name"].lower() or ql in r["description"].lower()][:25]
+    mean, p95 = _timeit(scan, repeat=50)
+    print(f"linear scan baseline             mean {mean:.3f} ms  p95 {p95:.3f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
@@ -212,7 +213,9 @@ class BusinessPostHelper:
         #     handler.write(img_data)
         # return image_id  # Save this as the image_id in your DB/draft
         print(f"\n\n here are \n\n\n")
-        response = self.client.images.generate(
+        # the OpenAI client here is the sync one; keep its (slow) request off the event loop
+        response = await asyncio.to_thread(
+            self.client.images.generate,
             model="gpt-image-1",
             prompt=prompt,
             # size="1024x1024",
@@ -243,7 +246,7 @@ class BusinessPostHelper:
                 temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'temp_images')
                 os.makedirs(temp_dir, exist_ok=True)
                 temp_path = os.path.join(temp_dir, image_id)
-                img_data = requests.get(image_url).content
+                img_data = (await asyncio.to_thread(requests.get, image_url)).content
                 with open(temp_path, "wb") as handler:
                     handler.write(img_data)
                 return image_id
@@ -1,87 +1,205 @@
+import asyncio
+import os
+import random
+import time
 from datetime import datetime, timedelta
-from helper.tortoise_config import TORTOISE_CONFIG
+from typing import Dict, List, Optional
+from helper.tortoise_config import TORTOISE_CONFIG, prepare_schema
 from tortoise import Tortoise
 from helper.business_post_helper import BusinessPostHelper
 from models.post_settings import PostSettings
 from models.business_post import BusinessPost
+from helper.work_lanes import NIGHTLY, lane, work_slot
+from helper.adaptive_limit import OPENAI_LIMIT
+
+# Clinics run concurrently; text and image generation are capped separately
+# because the image API is the slower and more rate-limited of the two.
+TEXT_CONCURRENCY = int(os.getenv("BUSINESS_POST_TEXT_CONCURRENCY", "4"))
+IMAGE_CONCURRENCY = int(os.getenv("BUSINESS_POST_IMAGE_CONCURRENCY", "2"))
+CLINIC_TIMEOUT_SECONDS = float(os.getenv("BUSINESS_POST_CLINIC_TIMEOUT", "600"))
+# random delay before each image request so clinics don't hit the image API in lockstep
+IMAGE_JITTER_SECONDS = float(os.getenv("BUSINESS_POST_IMAGE_JITTER", "3"))
+
+
+class _ClinicTrace:
+    """Timeline of one clinic's run: (stage, start, end) relative to the job start."""
+
+    def __init__(self, user_id, t0: float):
+        self.user_id = user_id
+        self.t0 = t0
+        self.spans: List[tuple] = []
+        self.status = "pending"
+        self.posts = 0
+        self.error: Optional[str] = None
+        self.finished: Optional[float] = None
+
+    def span(self, stage: str, start: float, end: float) -> None:
+        self.spans.append((stage, start - self.t0, end - self.t0))
+
+    def total(self, stage: str) -> float:
+        return sum(e - s for st, s, e in self.spans if st == stage)
+
+
+def _period(settings, current_time: datetime):
+    """(period_start, should_generate) for a PostSettings row."""
+    freq = (settings.frequency or 'daily').lower()
+    if freq == 'daily':
+        period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        should_generate = True
+    elif freq == 'weekly':
+        period_start = current_time - timedelta(days=current_time.weekday())
+        period_start = period_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        today = current_time.strftime('%A')
+        should_generate = settings.weekly_days and today in settings.weekly_days
+    elif freq == 'monthly':
+        period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        today_str = current_time.strftime('%Y-%m-%d')
+        should_generate = settings.monthly_dates and today_str in settings.monthly_dates
+    else:
+        period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+        should_generate = True
+    return period_start, should_generate
+
+
+async def _generate_for_settings(settings, helper: BusinessPostHelper, period_start: datetime,
+                                 text_sem: asyncio.Semaphore, image_sem: asyncio.Semaphore,
+                                 trace: _ClinicTrace) -> None:
+    user_id = settings.user_id
+    num_posts = settings.posts_per_period or 1
+
+    # Count all posts for this user in this period
+    already_created = await BusinessPost.filter(
+        user_id=user_id,
+        created_at__gte=period_start
+    ).count()
+
+    if already_created >= num_posts:
+        print(f"[Post Generation] {num_posts} posts already created for user {user_id} for this period. No new posts generated.")
+        trace.status = "skipped"
+        return
+
+    extracted = getattr(settings, 'extracted_file_text', None)
+    for i in range(num_posts - already_created):
+        # Generate post text
+        queued = time.perf_counter()
+        async with text_sem, work_slot("llm"), OPENAI_LIMIT.slot():
+            started = time.perf_counter()
+            trace.span("text_wait", queued, started)
+            post_text = await helper.generate_post(
+                settings.business_idea,
+                settings.brand_guidelines,
+                extracted
+            )
+            trace.span("text", started, time.perf_counter())
+
+        # Generate image if brand guidelines or extracted file text are provided
+        image_id = None
+        if settings.brand_guidelines or extracted:
+            try:
+                queued = time.perf_counter()
+                if IMAGE_JITTER_SECONDS > 0:
+                    await asyncio.sleep(random.uniform(0, IMAGE_JITTER_SECONDS))
+                async with image_sem:
+                    started = time.perf_counter()
+                    trace.span("image_wait", queued, started)
+                    # no prompt_override: generate_image raises and the post is saved
+                    # without an image, as before. Paid images for cron posts are a
+                    # product decision of their own, not part of running clinics concurrently.
+                    image_id = await helper.generate_image(
+                        settings.business_idea,
+                        settings.brand_guidelines,
+                        extracted
+                    )
+                    trace.span("image", started, time.perf_counter())
+                if image_id:
+                    print(f"[Image Generation] Generated image for user {user_id}")
+                    # BusinessPostHelper.display_image_helper(image_id)
+                else:
+                    print(f"[Image Generation] No image generated for user {user_id}")
+            except Exception as e:
+                print(f"[Image Generation] Error generating image for user {user_id}: {str(e)}")
+
+        # Create the post with image_id if available
+        started = time.perf_counter()
+        await BusinessPost.create(
+            user_id=user_id,
+            post=post_text,
+            status='posted',
+            image_id=image_id
+        )
+        trace.span("save", started, time.perf_counter())
+        trace.posts += 1
+        print(f"[Post Generation] Created new post for user {user_id} for period starting {period_start}.")
+    trace.status = "completed"
+
+
+def _print_report(traces: List[_ClinicTrace], wall: float) -> None:
+    print(f"[Post Generation] Run finished in {wall:.1f}s for {len(traces)} clinic(s) "
+          f"(text cap {TEXT_CONCURRENCY}, image cap {IMAGE_CONCURRENCY})")
+    for t in sorted(traces, key=lambda t: t.finished or 0, reverse=True):
+        print(f"  user {t.user_id}: {t.status}, posts={t.posts}, done at {t.finished or 0:.1f}s "
+              f"(text {t.total('text'):.1f}s + wait {t.total('text_wait'):.1f}s, "
+              f"image {t.total('image'):.1f}s + wait {t.total('image_wait'):.1f}s)"
+              + (f" error={t.error}" if t.error else ""))
+
+    # the clinic that finished last bounds the whole run
+    critical = max(traces, key=lambda t: t.finished or 0, default=None)
+    if critical is None or not critical.spans:
+        return
+    print(f"[Post Generation] Critical path: user {critical.user_id} ({critical.finished or 0:.1f}s)")
+    for stage, start, end in critical.spans:
+        print(f"    {start:7.1f}s -> {end:7.1f}s  {stage:<10} {end - start:6.1f}s")
+    waited = critical.total("text_wait") + critical.total("image_wait")
+    if critical.finished and waited > 0.5 * critical.finished:
+        print("    (mostly queueing: raising the text/image caps would shorten the run)")
+
 
 async def run_business_post_job():
     await Tortoise.init(config=TORTOISE_CONFIG)
-    await Tortoise.generate_schemas()
+    await prepare_schema()
     try:
         current_time = datetime.now()
         all_settings = await PostSettings.all()
         helper = BusinessPostHelper()
-        for settings in all_settings:
-            user_id = settings.user_id
-            freq = (settings.frequency or 'daily').lower()
-            num_posts = settings.posts_per_period or 1
+        # PostSettings.user_id isn't unique: rows of one user share that user's
+        # per-period post count, so they run one after another (count, then create)
+        user_locks: Dict[str, asyncio.Lock] = {}
 
-            # Determine period start for uniqueness
-            if freq == 'daily':
-                period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                should_generate = True
-            elif freq == 'weekly':
-                period_start = current_time - timedelta(days=current_time.weekday())
-                period_start = period_start.replace(hour=0, minute=0, second=0, microsecond=0)
-                today = current_time.strftime('%A')
-                should_generate = settings.weekly_days and today in settings.weekly_days
-            elif freq == 'monthly':
-                period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                today_str = current_time.strftime('%Y-%m-%d')
-                should_generate = settings.monthly_dates and today_str in settings.monthly_dates
-            else:
-                period_start = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
-                should_generate = True
+        text_sem = asyncio.Semaphore(max(1, TEXT_CONCURRENCY))
+        image_sem = asyncio.Semaphore(max(1, IMAGE_CONCURRENCY))
+        t0 = time.perf_counter()
+        traces: List[_ClinicTrace] = []
 
+        async def run_clinic(settings) -> None:
+            # Determine period start for uniqueness
+            period_start, should_generate = _period(settings, current_time)
             if not should_generate:
-                continue
-
-            # Count all posts for this user in this period
-            already_created = await BusinessPost.filter(
-                user_id=user_id,
-                created_at__gte=period_start
-            ).count()
-
-            if already_created >= num_posts:
-                print(f"[Post Generation] {num_posts} posts already created for user {user_id} for this period. No new posts generated.")
-            else:
-                for i in range(num_posts - already_created):
-                    # Generate post text
-                    post_text = await helper.generate_post(
-                        settings.business_idea,
-                        settings.brand_guidelines,
-                        getattr(settings, 'extracted_file_text', None)
-                    )
-                    
-                    # Generate image if brand guidelines or extracted file text are provided
-                    image_id = None
-                    if settings.brand_guidelines or getattr(settings, 'extracted_file_text', None):
-                        try:
-                            image_id = await helper.generate_image(
-                                settings.business_idea,
-                                settings.brand_guidelines,
-                                getattr(settings, 'extracted_file_text', None)
-                            )
-                            if image_id:
-                                print(f"[Image Generation] Generated image for user {user_id}")
-                                # BusinessPostHelper.display_image_helper(image_id)
-                            else:
-                                print(f"[Image Generation] No image generated for user {user_id}")
-                        except Exception as e:
-                            print(f"[Image Generation] Error generating image for user {user_id}: {str(e)}")
-                    
-                    # Create the post with image_id if available
-                    await BusinessPost.create(
-                        user_id=user_id,
-                        post=post_text,
-                        status='posted',
-                        image_id=image_id
+                return
+            trace = _ClinicTrace(settings.user_id, t0)
+            traces.append(trace)
+            user_lock = user_locks.setdefault(str(settings.user_id), asyncio.Lock())
+            try:
+                async with user_lock:
+                    await asyncio.wait_for(
+                        _generate_for_settings(settings, helper, period_start, text_sem, image_sem, trace),
+                        timeout=CLINIC_TIMEOUT_SECONDS,
                     )
-                    print(f"[Post Generation] Created new post for user {user_id} for period starting {period_start}.")
+            except asyncio.TimeoutError:
+                trace.status = "timeout"
+                trace.error = f"timed out after {CLINIC_TIMEOUT_SECONDS:.0f}s"
+                print(f"[Post Generation] Timed out for user {settings.user_id} after {CLINIC_TIMEOUT_SECONDS:.0f}s")
+            except Exception as e:
+                trace.status = "failed"
+                trace.error = str(e)
+                print(f"[Post Generation] Error for user {settings.user_id}: {str(e)}")
+            finally:
+                trace.finished = time.perf_counter() - t0
+
+        with lane(NIGHTLY):
+            await asyncio.gather(*(run_clinic(s) for s in all_settings))
+        _print_report(traces, time.perf_counter() - t0)
     finally:
         await Tortoise.close_connections()
 
 if __name__ == "__main__":
-    import asyncio
-    asyncio.run(run_business_post_job()) 
\ No newline at end of file
+    asyncio.run(run_business_post_job())
@@ -1,3 +1,4 @@
+import asyncio
 import os
 from typing import Optional, Dict, Any
 import tempfile
@@ -7,6 +8,8 @@ import traceback
 from dotenv import load_dotenv
 import subprocess
 from helper.format_transcription import format_transcription_ai
+from helper.work_lanes import work_slot
+from helper.adaptive_limit import CALLRAIL_LIMIT
 
 
 # --- ASR engine: faster-whisper ---
@@ -100,8 +103,9 @@ class CallProcessor:
     async def get_recording_url(self, account_id: str, call_id: str) -> Optional[str]:
         url = f"{CALLRAIL_API_BASE}/a/{account_id}/calls/{call_id}.json"
         headers = {"Authorization": f"Bearer {self.bearer_token}"}
-        async with aiohttp.ClientSession() as session:
+        async with CALLRAIL_LIMIT.slot() as call, aiohttp.ClientSession() as session:
             async with session.get(url, headers=headers) as response:
+                call.status(response.status)
                 if response.status != 200:
                     print(f"Failed to fetch call details: {response.status}")
                     return None
@@ -116,9 +120,10 @@ class CallProcessor:
             temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
             temp_path = temp_file.name
             temp_file.close()
-            async with aiohttp.ClientSession() as session:
+            async with CALLRAIL_LIMIT.slot() as call, aiohttp.ClientSession() as session:
                 # First request may return JSON pointing to the real audio URL
                 async with session.get(audio_url, headers=headers) as response:
+                    call.status(response.status)
                     content_type = response.headers.get('Content-Type', '')
 
                     if content_type.startswith('application/json'):
@@ -128,6 +133,7 @@ class CallProcessor:
                             print("No audio URL found in JSON response.")
                             return None
                         async with session.get(real_audio_url) as audio_response:
+                            call.status(audio_response.status)
                             audio_content_type = audio_response.headers.get('Content-Type', '')
                             print(f"Audio file content-type: {audio_content_type}")
                             if not audio_content_type.startswith('audio/'):
@@ -190,19 +196,26 @@ class CallProcessor:
             except Exception:
                 pass
 
-    async def process_call(self, account_id: str, call_id: str) -> Dict[str, Any]:
+    async def fetch_audio(self, account_id: str, call_id: str) -> Dict[str, Any]:
+        """Download stage: {'audio_path': ...} or {'error': ...}."""
         recording_url = await self.get_recording_url(account_id, call_id)
         if not recording_url:
             return {'error': 'Could not get recording URL'}
         audio_path = await self.download_audio(recording_url)
         if not audio_path:
             return {'error': 'Failed to download audio or file is not audio format'}
-        transcription_result = self.transcribe_audio(audio_path)
+        return {'audio_path': audio_path}
+
+    async def transcribe_file(self, audio_path: str) -> Dict[str, Any]:
+        """Transcribe stage (deletes the audio file when done)."""
+        # whisper is CPU-bound: run it off the event loop, one lane-budgeted slot at a time
+        async with work_slot("cpu"):
+            transcription_result = await asyncio.to_thread(self.transcribe_audio, audio_path)
         if not transcription_result:
             return {'error': 'Failed to transcribe audio'}
-        
 
-        formatted_text = await format_transcription_ai(transcription_result['transcription'],output="markdown",)
+        async with work_slot("llm"):
+            formatted_text = await format_transcription_ai(transcription_result['transcription'],output="markdown",)
         # or output="html" if your frontend does not render Markdown
 
         return {
@@ -212,3 +225,8 @@ class CallProcessor:
             'processed_at': datetime.now().isoformat()
         }
 
+    async def process_call(self, account_id: str, call_id: str) -> Dict[str, Any]:
+        fetched = await self.fetch_audio(account_id, call_id)
+        if 'error' in fetched:
+            return fetched
+        return await self.transcribe_file(fetched['audio_path'])
@@ -0,0 +1,244 @@
+# helper/catalog_cache.py
+"""
+Read-through caches for rarely-changing catalog data (Laravel services, clinics).
+
+Entries are fresh for `ttl` seconds. For a further `stale_ttl` seconds the
+stale value is served immediately while one background refresh reloads it
+(stale-while-revalidate). Concurrent misses for the same key share a single
+backend call. Memory is bounded by a cachetools LRU.
+
+With `negative_ttl`, values for which `is_negative(value)` holds (by default
+None, e.g. an unknown user) are kept for that shorter time instead, and are
+never served stale.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from cachetools import LRUCache
+
+from helper.metrics import counter
+
+logger = logging.getLogger("uvicorn.error")
+
+CACHE_EVENTS = counter("catalog_cache_events_total", "Catalog cache lookups by cache and outcome")
+BACKEND_CALLS = counter("catalog_cache_backend_calls_total", "Backend loads performed by catalog caches")
+
+Loader = Callable[[], Awaitable[Any]]
+
+
+class _EvictingLRU(LRUCache):
+    """LRUCache that reports the keys it evicts to make room."""
+
+    def __init__(self, maxsize: int, on_evict: Callable[[Hashable], None]):
+        super().__init__(maxsize=maxsize)
+        self._on_evict = on_evict
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key)
+        return key, value
+
+
+class ReadThroughCache:
+    def __init__(self, name: str, ttl: float, stale_ttl: float, maxsize: int,
+                 negative_ttl: Optional[float] = None,
+                 is_negative: Callable[[Any], bool] = lambda value: value is None):
+        self.name = name
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.negative_ttl = None if negative_ttl is None else float(negative_ttl)
+        self.is_negative = is_negative
+        # key -> (value, fetched_at)
+        self._data: LRUCache = _EvictingLRU(int(maxsize), self._dropped)
+        # key -> the running load; every caller (the first one too) awaits it through
+        # shield(), so one caller going away never cancels the load for the others.
+        # This dict also holds the reference that keeps background refreshes alive.
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # keys invalidated while their load was in flight: that load must not be cached
+        self._dirty: set = set()
+        self._listeners: List[Callable[[Hashable, Any], None]] = []
+        self._drop_listeners: List[Callable[[Hashable], None]] = []
+        self.stats: Dict[str, int] = {
+            "hits": 0, "stale_hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0,
+            "backend_calls": 0, "refresh_errors": 0, "invalidations": 0,
+        }
+
+    # ---------- lookups ----------
+    async def get(self, key: Hashable, loader: Loader,
+                  should_cache: Optional[Callable[[Any], bool]] = None) -> Any:
+        """Return the cached value for `key`, loading it through `loader` when needed."""
+        now = time.monotonic()
+        entry = self._data.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = now - fetched_at
+            if self.negative_ttl is not None and self.is_negative(value):
+                if age < self.negative_ttl:
+                    self._count("negative_hits")
+                    return value
+            elif age < self.ttl:
+                self._count("hits")
+                return value
+            elif age < self.ttl + self.stale_ttl:
+                self._count("stale_hits")
+                if key not in self._inflight:
+                    self._start_load(key, loader, should_cache).add_done_callback(self._refresh_done)
+                return value
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self._count("coalesced")
+            return await asyncio.shield(pending)
+
+        self._count("misses")
+        return await asyncio.shield(self._start_load(key, loader, should_cache))
+
+    def _start_load(self, key: Hashable, loader: Loader,
+                    should_cache: Optional[Callable[[Any], bool]]) -> asyncio.Task:
+        self._dirty.discard(key)
+        task = asyncio.create_task(self._load(key, loader, should_cache))
+        self._inflight[key] = task
+        # a failed load whose callers all went away must not log "exception never retrieved"
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _load(self, key: Hashable, loader: Loader,
+                    should_cache: Optional[Callable[[Any], bool]]) -> Any:
+        try:
+            self._count("backend_calls")
+            value = await loader()
+            if key not in self._dirty and (should_cache is None or should_cache(value)):
+                self._data[key] = (value, time.monotonic())
+                for listener in self._listeners:
+                    try:
+                        listener(key, value)
+                    except Exception as e:
+                        logger.warning("[cache:%s] listener failed: %s", self.name, e)
+            return value
+        finally:
+            # also on cancellation (shutdown): the next caller starts a fresh load
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+            self._dirty.discard(key)
+
+    def _refresh_done(self, task: asyncio.Task) -> None:
+        if task.cancelled():
+            return
+        e = task.exception()
+        if e is not None:
+            self.stats["refresh_errors"] += 1
+            logger.warning("[cache:%s] background refresh failed: %s", self.name, e)
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Store a value known from elsewhere (e.g. a caller that already resolved it)."""
+        self._mark_dirty(key)
+        self._data[key] = (value, time.monotonic())
+
+    def _mark_dirty(self, key: Hashable) -> None:
+        if key in self._inflight:
+            self._dirty.add(key)
+
+    # ---------- invalidation hooks ----------
+    def invalidate(self, key: Hashable) -> None:
+        self._mark_dirty(key)
+        if self._data.pop(key, None) is not None:
+            self._dropped(key)
+        self.stats["invalidations"] += 1
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every key matching `predicate` (e.g. all entries of one client)."""
+        for k in [k for k in self._inflight if predicate(k)]:
+            self._dirty.add(k)
+        doomed = [k for k in list(self._data.keys()) if predicate(k)]
+        for k in doomed:
+            self._data.pop(k, None)
+            self._dropped(k)
+        self.stats["invalidations"] += 1
+        return len(doomed)
+
+    def clear(self) -> None:
+        self._dirty.update(self._inflight)
+        doomed = list(self._data.keys())
+        self._data.clear()
+        for k in doomed:
+            self._dropped(k)
+        self.stats["invalidations"] += 1
+
+    def on_load(self, listener: Callable[[Hashable, Any], None]) -> None:
+        """Register a callback run after every successful (re)load that gets cached."""
+        self._listeners.append(listener)
+
+    def on_drop(self, listener: Callable[[Hashable], None]) -> None:
+        """Register a callback run when a key leaves the cache (LRU eviction, invalidation, clear)."""
+        self._drop_listeners.append(listener)
+
+    def _dropped(self, key: Hashable) -> None:
+        for listener in self._drop_listeners:
+            try:
+                listener(key)
+            except Exception as e:
+                logger.warning("[cache:%s] drop listener failed: %s", self.name, e)
+
+    def __len__(self) -> int:
+        """Entries held right now (fresh, stale or negative)."""
+        return len(self._data)
+
+    # ---------- reporting ----------
+    def _count(self, outcome: str) -> None:
+        self.stats[outcome] += 1
+        if outcome == "backend_calls":
+            BACKEND_CALLS.inc(labels={"cache": self.name})
+        else:
+            CACHE_EVENTS.inc(labels={"cache": self.name, "outcome": outcome})
+
+    def report(self) -> Dict[str, Any]:
+        served = self.stats["hits"] + self.stats["stale_hits"] + self.stats["negative_hits"] + self.stats["coalesced"]
+        lookups = served + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._data),
+            "maxsize": self._data.maxsize,
+            "hit_ratio": round(served / lookups, 4) if lookups else 0.0,
+            # every lookup answered without its own backend call
+            "backend_calls_avoided": served,
+        }
+
+
+SERVICE_CACHE = ReadThroughCache(
+    "services",
+    ttl=float(os.getenv("SERVICE_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("SERVICE_CACHE_STALE_TTL", "1800")),
+    maxsize=int(os.getenv("SERVICE_CACHE_MAXSIZE", "512")),
+)
+
+CLINIC_CACHE = ReadThroughCache(
+    "clinics",
+    ttl=float(os.getenv("CLINIC_CACHE_TTL", "300")),
+    stale_ttl=float(os.getenv("CLINIC_CACHE_STALE_TTL", "1800")),
+    maxsize=int(os.getenv("CLINIC_CACHE_MAXSIZE", "2048")),
+)
+
+
+def clinic_key(client_id: int, *parts: Any) -> Tuple[Any, ...]:
+    """Clinic cache keys always start with the owning client_id."""
+    return (int(client_id),) + tuple(parts)
+
+
+def invalidate_services() -> None:
+    SERVICE_CACHE.clear()
+
+
+def invalidate_clinics(client_id: Optional[int] = None) -> int:
+    if client_id is None:
+        size = len(CLINIC_CACHE)
+        CLINIC_CACHE.clear()
+        return size
+    cid = int(client_id)
+    return CLINIC_CACHE.invalidate_where(lambda k: isinstance(k, tuple) and k and k[0] == cid)
+
+
+def cache_report() -> Dict[str, Any]:
+    return {"services": SERVICE_CACHE.report(), "clinics": CLINIC_CACHE.report()}
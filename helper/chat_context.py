@@ -2,6 +2,7 @@
 from typing import Any, List
 from langchain_core.messages import HumanMessage, AIMessage
 from models.message import Message
+from helper.message_writer import pending_reply
 
 __all__ = ["get_chat_history"]
 
@@ -11,13 +12,17 @@ async def get_chat_history(chat_id: int) -> List[Any]:
     Shared by orchestrator and get_chat_response to avoid circular imports.
     """
     try:
+        # index idx_message_chat_created (migration 51) serves this as a range scan
         rows = await Message.filter(chat_id=chat_id).order_by("-created_at").limit(10)
         history: List[Any] = []
         for msg in reversed(rows):
+            # replies queued by helper/message_writer.py may not be written yet
+            reply = msg.bot_response or pending_reply(msg.id)
+            if not reply:
+                continue  # a turn still being answered (e.g. the current one) is not history yet
             if msg.user_message:
                 history.append(HumanMessage(content=msg.user_message))
-            if msg.bot_response:
-                history.append(AIMessage(content=msg.bot_response))
+            history.append(AIMessage(content=reply))
         return history
     except Exception as e:
         # Keep log minimal here to avoid extra deps
@@ -0,0 +1,208 @@
+# helper/context_budget.py
+"""
+Prompt assembly for the classic chat chain: fits the get_client_data blob and the
+chat history into token budgets instead of sending everything on every turn.
+
+    CHAT_DATA_TOKEN_BUDGET      tokens for the {data} block (default 2500)
+    CHAT_HISTORY_TOKEN_BUDGET   tokens for history messages (default 2000, newest kept first)
+
+Each top-level key of the blob is a section. Sections are ranked by relevance to
+the message: keywords from the chat keyword list (_AGENT_KEYWORDS) that occur in
+the message and also in the section's name or content, plus plain word overlap.
+The user profile and the *_summary aggregates are always sent. A list section
+that doesn't fit whole is cut to as many leading items as fit (lists arrive
+best-first: top scores, newest posts).
+
+Tokens are counted with tiktoken. Its encoding is loaded in a worker thread, started
+by the app lifespan (the first load may download the BPE file), never on the event
+loop; until it is ready, or if it can't be loaded, a 4-chars-per-token estimate is
+used. Tokens saved per turn go to the log and chat_context_tokens_saved_total.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from helper.metrics import counter, histogram
+
+logger = logging.getLogger("uvicorn.error")
+
+CHAT_DATA_TOKEN_BUDGET = int(os.getenv("CHAT_DATA_TOKEN_BUDGET", "2500"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "2000"))
+CHAT_TOKENIZER_MODEL = os.getenv("CHAT_TOKENIZER_MODEL", "gpt-4.1")
+
+# sent regardless of relevance: who is asking, and the cheap aggregate counts
+PINNED_SECTIONS = ("logged_in_user_whose_asked_questions_or_chat",)
+PINNED_SUFFIX = "_summary"
+
+PROMPT_TOKENS = histogram(
+    "chat_context_tokens", "Tokens of data + history sent with a classic chat turn, by stage (raw/sent)",
+    buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000),
+)
+TOKENS_SAVED = counter("chat_context_tokens_saved_total", "Prompt tokens dropped by the context budgeter")
+
+_WORD = re.compile(r"[a-z][a-z0-9_]{3,}")
+_STOP = frozenset("what when where which with from that this have about your mine there their show tell give please".split())
+
+_encoder = None
+_encoder_failed = False
+_encoder_task: Optional[asyncio.Task] = None
+
+
+def _load_encoder() -> None:
+    # blocking (imports tiktoken, may fetch the BPE file): runs in a worker thread
+    global _encoder, _encoder_failed
+    try:
+        import tiktoken
+        try:
+            _encoder = tiktoken.encoding_for_model(CHAT_TOKENIZER_MODEL)
+        except KeyError:
+            _encoder = tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        _encoder_failed = True
+        logger.warning("[context-budget] tiktoken unavailable (%s); estimating 4 chars/token", e)
+
+
+def warm_encoder() -> Optional[asyncio.Task]:
+    """Start loading the tiktoken encoding off the event loop (once); returns the loading task."""
+    global _encoder_task
+    if _encoder_task is None and _encoder is None and not _encoder_failed:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        _encoder_task = asyncio.create_task(asyncio.to_thread(_load_encoder))
+    return _encoder_task
+
+
+def _get_encoder():
+    if _encoder is None:
+        warm_encoder()
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    enc = _get_encoder()
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+
+def _dump(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str, separators=(",", ":"))
+
+
+def message_keywords(message: str, keywords: Iterable[str]) -> List[str]:
+    m = (message or "").lower()
+    return sorted({k.strip() for k in keywords if k.strip() and k.strip() in m})
+
+
+def section_score(name: str, text_lower: str, msg_keywords: Sequence[str], msg_words: Iterable[str]) -> float:
+    name_l = name.lower()
+    score = 0.0
+    for kw in msg_keywords:
+        # "lead" also names lead_scores, "clinic" the clinic sections, ...
+        if any(part.rstrip("s") in name_l for part in kw.split()):
+            score += 3
+        if kw in text_lower:
+            score += 1
+    score += 0.5 * sum(1 for w in msg_words if w in text_lower)
+    return score
+
+
+def _fit_list(items: List[Any], budget: int) -> Tuple[List[Any], int]:
+    kept, used = [], 2  # brackets
+    for item in items:
+        t = count_tokens(_dump(item)) + 1
+        if used + t > budget:
+            break
+        kept.append(item)
+        used += t
+    return kept, used
+
+
+def budget_data(message: str, data: Optional[Dict[str, Any]], keywords: Iterable[str],
+                budget: int = CHAT_DATA_TOKEN_BUDGET) -> Tuple[Any, Dict[str, Any]]:
+    """Returns (data to send, stats). `data` that isn't a dict is passed through untouched."""
+    if not isinstance(data, dict):
+        text = data if isinstance(data, str) else _dump(data)
+        n = count_tokens(text)
+        return data, {"raw": n, "sent": n, "sections": [], "dropped": [], "trimmed": {}}
+
+    msg_kw = message_keywords(message, keywords)
+    msg_words = {w for w in _WORD.findall((message or "").lower()) if w not in _STOP}
+
+    ranked = []
+    raw_total = 0
+    for name, value in data.items():
+        text = _dump(value)
+        tokens = count_tokens(text)
+        raw_total += tokens
+        pinned = name in PINNED_SECTIONS or name.endswith(PINNED_SUFFIX)
+        score = section_score(name, text.lower(), msg_kw, msg_words)
+        ranked.append((not pinned, -score, name, value, tokens))
+    ranked.sort(key=lambda r: r[:2])  # pinned first, then most relevant; stable for ties
+
+    out: Dict[str, Any] = {}
+    used = 0
+    dropped: List[str] = []
+    trimmed: Dict[str, str] = {}
+    for not_pinned, _neg, name, value, tokens in ranked:
+        key_cost = count_tokens(name) + 2
+        if used + tokens + key_cost <= budget or not not_pinned:
+            out[name] = value
+            used += tokens + key_cost
+            continue
+        room = budget - used - key_cost
+        if isinstance(value, list) and room > 20:
+            kept, cost = _fit_list(value, room)
+            if kept:
+                out[name] = kept
+                used += cost + key_cost
+                trimmed[name] = f"{len(kept)}/{len(value)}"
+                continue
+        dropped.append(name)
+
+    return out, {
+        "raw": raw_total, "sent": used, "keywords": msg_kw,
+        "sections": list(out), "dropped": dropped, "trimmed": trimmed,
+    }
+
+
+def budget_history(history: List[Any], budget: int = CHAT_HISTORY_TOKEN_BUDGET) -> Tuple[List[Any], Dict[str, int]]:
+    """Newest messages that fit in `budget`, in their original order."""
+    kept: List[Any] = []
+    used = raw = 0
+    full = False
+    for msg in reversed(history or []):
+        t = count_tokens(str(getattr(msg, "content", msg))) + 4  # per-message overhead
+        raw += t
+        if not full and used + t <= budget:
+            kept.append(msg)
+            used += t
+        else:
+            full = True
+    kept.reverse()
+    return kept, {"raw": raw, "sent": used, "messages": len(kept), "dropped_messages": len(history or []) - len(kept)}
+
+
+def assemble_context(message: str, data: Any, history: List[Any], keywords: Iterable[str]) -> Tuple[Any, List[Any], Dict[str, Any]]:
+    """Budgeted (data, history) for one classic chat turn, logging what was saved."""
+    data_out, dstats = budget_data(message, data, keywords)
+    hist_out, hstats = budget_history(history)
+    raw = dstats["raw"] + hstats["raw"]
+    sent = dstats["sent"] + hstats["sent"]
+    PROMPT_TOKENS.observe(raw, labels={"stage": "raw"})
+    PROMPT_TOKENS.observe(sent, labels={"stage": "sent"})
+    saved = max(0, raw - sent)
+    if saved:
+        TOKENS_SAVED.inc(saved)
+    stats = {"raw_tokens": raw, "sent_tokens": sent, "saved_tokens": saved, "data": dstats, "history": hstats}
+    logger.info(
+        "[context-budget] sent %d of %d tokens (saved %d); sections=%s dropped=%s trimmed=%s history=%d/%d msgs",
+        sent, raw, saved, dstats["sections"], dstats["dropped"], dstats["trimmed"],
+        hstats["messages"], hstats["messages"] + hstats["dropped_messages"],
+    )
+    return data_out, hist_out, stats
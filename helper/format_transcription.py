@@ -10,6 +10,8 @@ from typing import List, Optional
 import aiohttp
 import logging
 
+from helper.adaptive_limit import OPENAI_LIMIT
+
 __all__ = ["format_transcription", "format_transcription_ai"]
 
 log = logging.getLogger(__name__)
@@ -390,8 +392,10 @@ Format rules:
     }
 
     try:
-        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        async with OPENAI_LIMIT.slot() as call, \
+                aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
             async with session.post(url, headers=headers, data=json.dumps(payload)) as resp:
+                call.status(resp.status)
                 if resp.status != 200:
                     log.warning("format_transcription_ai: non-200 %s", resp.status)
                     return format_transcription(raw_text, output=output)
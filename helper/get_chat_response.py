@@ -2,24 +2,25 @@
 
 import os
 import json
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List
 import re
 # ⬇️ Add this so classic path also ensures registry is loaded (safe either way)
 import agents.defs  # noqa: F401
 from dotenv import load_dotenv
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.messages import HumanMessage, AIMessage
 
-from models.message import Message
 from models.system_prompt import SystemPrompts
+from helper.chat_context import get_chat_history
 from helper.get_data import get_client_data
+from helper.context_budget import assemble_context
+from agents.runtime import agent_runtime
 
 # === if you still want direct tool-binding calls here, you can import tools
 # from helper.tools.lead_tools import update_lead  # not needed in this file now
 
 # use orchestrator only for lead/agent stuff
-from agents.orchestrator import run_with_agent
+import agents.orchestrator  # noqa: F401  (load the agent path at startup, not on the first request)
+from agents.events import stream_with_agent
 
 load_dotenv()
 
@@ -44,27 +45,14 @@ prompt = ChatPromptTemplate.from_messages([
 
 # Keep the non-tool model for normal replies
 BASE_MODEL_NAME = "gpt-4.1"
-model = init_chat_model(BASE_MODEL_NAME, model_provider="openai")
+model = agent_runtime.model(BASE_MODEL_NAME)
+# composed once; each call only renders the prompt and hits the API
+classic_chain = prompt | model
 
 
 # -----------------------------
 # Helpers
 # -----------------------------
-async def get_chat_history(chat_id: int) -> List[Any]:
-    """Last ~10 messages as LC messages (Human/AI)."""
-    try:
-        rows = await Message.filter(chat_id=chat_id).order_by("-created_at").limit(10)
-        history: List[Any] = []
-        for msg in reversed(rows):
-            if msg.user_message:
-                history.append(HumanMessage(content=msg.user_message))
-            if msg.bot_response:
-                history.append(AIMessage(content=msg.bot_response))
-        return history
-    except Exception as e:
-        dlog("history.error", {"error": str(e)})
-        return []
-
 async def get_prompts() -> Dict[str, str]:
     """System prompt row from DB (fallback to default)."""
     try:
@@ -122,13 +110,18 @@ def _looks_like_agent_task(user_msg: str) -> bool:
 # -------------------------------------------------------
 # Main entry used by chat_controller: generate_ai_response
 # -------------------------------------------------------
-async def generate_ai_response(user_message: str, chat_id: int, user_id: str) -> str:
+async def stream_ai_response(user_message: str, chat_id: int, user_id: str) -> AsyncIterator[Dict[str, Any]]:
     """
+    Event stream behind generate_ai_response:
+      {"type": "token", "text": ...} pieces of the answer, and on the agent path also
+      agent / tool_start / tool_end / final events (agents/events.py).
+
     1) If the message looks like a lead/CRM operation → route to the agent orchestrator
        (supports fetching leads by id/email/phone and updating via tools).
     2) Otherwise → use your classic chain with {data} injected so
        profile/company questions like 'what's my name/company' work again.
     """
+    sent_tokens = False
     try:
         history = await get_chat_history(int(chat_id))
         response_data = await get_client_data(int(user_id))  # this contains company/user data
@@ -145,10 +138,13 @@ async def generate_ai_response(user_message: str, chat_id: int, user_id: str) ->
         # 1) Agent path for lead/CRM type requests
         if _looks_like_agent_task(user_message):
             try:
-                reply = await run_with_agent(user_message=user_message, chat_id=int(chat_id), user_id=str(user_id))
-                # Orchestrator already enforces client_id on fetches and can update leads.
-                dlog("chat.reply.agent", {"len": len(reply), "preview": reply[:140]})
-                return reply or "OK"
+                async for ev in stream_with_agent(user_message=user_message, chat_id=int(chat_id), user_id=str(user_id)):
+                    if ev["type"] == "final":
+                        # Orchestrator already enforces client_id on fetches and can update leads.
+                        dlog("chat.reply.agent", {"len": len(ev["text"]), "preview": ev["text"][:140]})
+                    sent_tokens = sent_tokens or ev["type"] == "token"
+                    yield ev
+                return
             except Exception as e:
                 dlog("orchestrator.error", {"error": str(e)})
                 # If agents fail, fall back to classic chain (still respond)
@@ -156,20 +152,44 @@ async def generate_ai_response(user_message: str, chat_id: int, user_id: str) ->
 
         # 2) Classic path (context-injected chat): best for profile/company questions
         #    This is exactly your old behavior.
-        data_for_model = response_data if response_data else "none"
-        rendered = await prompt.ainvoke({
+        # only the sections relevant to this message, within the token budgets (helper/context_budget.py)
+        data_for_model, history_for_model, budget = assemble_context(
+            user_message, response_data, history, _AGENT_KEYWORDS,
+        )
+        dlog("chat.context_budget", {
+            "raw_tokens": budget["raw_tokens"],
+            "sent_tokens": budget["sent_tokens"],
+            "saved_tokens": budget["saved_tokens"],
+            "dropped": budget["data"]["dropped"],
+        })
+        if not data_for_model:
+            data_for_model = "none"
+        length = 0
+        async for chunk in classic_chain.astream({
             "systemprompt": prompts["systemprompt"],
             "data": data_for_model,
-            "history": history,
+            "history": history_for_model,
             "prompt": user_message
-        })
-        messages = rendered.to_messages()
-        ai_msg = await model.ainvoke(messages)
-
-        content = getattr(ai_msg, "content", None) or str(ai_msg) or "OK"
-        dlog("chat.reply", {"len": len(content), "preview": content[:140]})
-        return content
+        }):
+            text = getattr(chunk, "content", None) or ""
+            if text:
+                sent_tokens = True
+                length += len(text)
+                yield {"type": "token", "text": text}
+        if not sent_tokens:
+            yield {"type": "token", "text": "OK"}
+        dlog("chat.reply", {"len": length})
 
     except Exception as e:
         dlog("chat.error", {"error": str(e)})
-        return "Sorry, I encountered an error. Please try again."
+        if not sent_tokens:
+            yield {"type": "token", "text": "Sorry, I encountered an error. Please try again."}
+
+
+async def generate_ai_response(user_message: str, chat_id: int, user_id: str) -> str:
+    """Full reply as one string (see stream_ai_response)."""
+    parts: List[str] = []
+    async for ev in stream_ai_response(user_message, chat_id, user_id):
+        if ev["type"] == "token":
+            parts.append(ev["text"])
+    return "".join(parts) or "OK"
@@ -1,5 +1,4 @@
 # E:\Shoaib\Projects\hHub\hHub-backend\helper\get_chat_widget_response.py
-from langchain.chat_models import init_chat_model
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage, AIMessage
@@ -9,6 +8,7 @@ from dotenv import load_dotenv
 from helper.laravel_client import list_messages_widget
 from helper.get_data import get_client_data
 from models.system_prompt import SystemPrompts
+from agents.runtime import agent_runtime
 
 load_dotenv()
 
@@ -19,7 +19,7 @@ prompt = ChatPromptTemplate.from_messages([
     MessagesPlaceholder("history"),
     ("user", "{prompt}")
 ])
-model = init_chat_model("gpt-4o-mini", model_provider="openai")
+model = agent_runtime.model("gpt-4o-mini")
 output_parser = StrOutputParser()
 chain = prompt | model | output_parser
 
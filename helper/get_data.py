@@ -1,9 +1,15 @@
+import asyncio
+import json
 import time
 import httpx
 from dotenv import load_dotenv
+from tortoise import Tortoise
+from tortoise.signals import post_delete, post_save
 from models.lead_score import LeadScore
 from models.post_draft import PostDraft
 from models.business_post import BusinessPost
+from helper.catalog_cache import ReadThroughCache
+from helper.metrics import gauge, histogram
 import os
 
 load_dotenv()
@@ -22,44 +28,204 @@ headers = {
     "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36"
 }
 
-# Initialize a cache dictionary
-clinic_cache = {}
-CACHE_EXPIRY_TIME = 600  # 10 minutes in seconds
+# Prompt context per user_id: bounded LRU, 10-minute expiry, dropped early when the
+# user's posts/drafts or their client's lead scores change (see invalidate_client_context).
+CACHE_EXPIRY_TIME = int(os.getenv("CLIENT_CONTEXT_TTL", "600"))
+CLIENT_CONTEXT_MAXSIZE = int(os.getenv("CLIENT_CONTEXT_MAXSIZE", "1000"))
+# items of each kind (lead scores, drafts, posts) put in the prompt; totals come from aggregates
+CLIENT_CONTEXT_TOP_N = int(os.getenv("CLIENT_CONTEXT_TOP_N", "20"))
+
+client_context_cache = ReadThroughCache(
+    "client-context", ttl=CACHE_EXPIRY_TIME, stale_ttl=0, maxsize=CLIENT_CONTEXT_MAXSIZE,
+)
+# both maps hold only users whose context is cached: _forget runs whenever an entry
+# leaves the cache (LRU eviction, expiry reload, invalidation)
+_entry_bytes = {}        # user_id -> approx. JSON size of the cached context
+_client_of = {}          # user_id -> client_id (str) of the cached context
+_users_by_client = {}    # client_id (str) -> user_ids whose cached context includes its lead scores
+
+
+def _cached_bytes() -> float:
+    return float(sum(_entry_bytes.values()))
+
+
+CONTEXT_BYTES = gauge("client_context_cache_bytes", "Approximate JSON size of cached client prompt contexts", fn=_cached_bytes)
+CONTEXT_LOAD_SECONDS = histogram("client_context_load_seconds", "get_client_data miss latency, by part (laravel/db/total)")
+
+
+def _remember(user_id, data) -> None:
+    _forget(user_id)  # a reload may belong to another client now
+    _entry_bytes[user_id] = len(json.dumps(data, default=str))
+    client_id = ((data or {}).get("logged_in_user_whose_asked_questions_or_chat") or {}).get("client_id")
+    if client_id is not None:
+        _client_of[user_id] = str(client_id)
+        _users_by_client.setdefault(str(client_id), set()).add(user_id)
+
+
+def _forget(user_id) -> None:
+    _entry_bytes.pop(user_id, None)
+    client_id = _client_of.pop(user_id, None)
+    users = _users_by_client.get(client_id)
+    if users is not None:
+        users.discard(user_id)
+        if not users:
+            del _users_by_client[client_id]
+
+
+client_context_cache.on_load(_remember)
+client_context_cache.on_drop(_forget)
+
+
+def invalidate_client_context(user_id=None, client_id=None) -> int:
+    """Drop cached context for one user, or for every user of a client (lead score changes)."""
+    dropped = 0
+    if user_id is not None:
+        try:
+            client_context_cache.invalidate(int(user_id))
+            dropped += 1
+        except (TypeError, ValueError):
+            pass
+    if client_id is not None:
+        # copied: invalidation prunes _users_by_client through _forget
+        users = set(_users_by_client.get(str(client_id), ()))
+        if users:
+            dropped += client_context_cache.invalidate_where(lambda k: k in users)
+    return dropped
+
+
+@post_save(LeadScore)
+@post_delete(LeadScore)
+async def _lead_score_changed(sender, instance, *args, **kwargs):
+    invalidate_client_context(client_id=instance.client_id)
+
+
+@post_save(PostDraft)
+@post_delete(PostDraft)
+@post_save(BusinessPost)
+@post_delete(BusinessPost)
+async def _post_changed(sender, instance, *args, **kwargs):
+    invalidate_client_context(user_id=instance.user_id)
+
+
+def _lead_score_dict(score):
+    return {
+        "id": score.id,
+        "client_id": score.client_id,
+        "callrail_id": score.callrail_id,
+        # "analysis_summary": score.analysis_summary,
+        "intent_score": score.intent_score,
+        "urgency_score": score.urgency_score,
+        "overall_score": score.overall_score,
+        "name": score.name,
+        "type": score.type,
+        "potential_score": score.potential_score
+    }
+
+
+def _post_draft_dict(draft):
+    return {
+        "id": draft.id,
+        "user_id": draft.user_id,
+        "current_step": draft.current_step,
+        "content": draft.content,
+        "title": draft.title,
+        "description": draft.description,
+        "keywords": draft.keywords,
+        "post_options": draft.post_options,
+        "selected_post_index": draft.selected_post_index,
+        "image_ids": draft.image_ids,
+        "status": draft.status,
+        "selected_image_id": draft.selected_image_id,
+        "is_complete": draft.is_complete,
+        "created_at": draft.created_at,
+        "posted_at": draft.posted_at,
+        "updated_at": draft.updated_at,
+    }
+
+
+def _business_post_dict(post):
+    return {
+        "id": post.id,
+        "user_id": post.user_id,
+        "post": post.post,
+        "scheduled_time": post.scheduled_time,
+        "status": post.status,
+        "image_id": post.image_id,
+        "source": post.source,
+        "created_at": post.created_at,
+        "updated_at": post.updated_at,
+    }
+
+
+# aggregates as plain SQL: LeadScore's default ordering must not leak into GROUP BY queries
+async def _counts_by(model, field, owner_field, owner):
+    table = model._meta.db_table
+    rows = await Tortoise.get_connection("default").execute_query_dict(
+        f"SELECT `{field}` AS k, COUNT(*) AS n FROM `{table}` WHERE `{owner_field}` = %s GROUP BY `{field}`",
+        [owner],
+    )
+    return {str(r["k"]): int(r["n"]) for r in rows}
+
+
+async def _lead_score_context(client_id):
+    if client_id is None:
+        return {"total": 0, "by_type": {}}, []
+    table = LeadScore._meta.db_table
+    totals, by_type, top = await asyncio.gather(
+        Tortoise.get_connection("default").execute_query_dict(
+            f"SELECT COUNT(*) AS total, AVG(overall_score) AS avg_overall, AVG(intent_score) AS avg_intent, "
+            f"AVG(urgency_score) AS avg_urgency, AVG(potential_score) AS avg_potential "
+            f"FROM `{table}` WHERE client_id = %s",
+            [client_id],
+        ),
+        _counts_by(LeadScore, "type", "client_id", client_id),
+        LeadScore.filter(client_id=client_id).order_by("-overall_score").limit(CLIENT_CONTEXT_TOP_N),
+    )
+    summary = {k: (round(float(v), 2) if k.startswith("avg_") and v is not None else v)
+               for k, v in (totals[0] if totals else {}).items()}
+    summary["by_type"] = by_type
+    return summary, [_lead_score_dict(s) for s in top]
+
+
+async def _posts_context(user_id):
+    drafts_by_status, drafts, posts_by_status, posts = await asyncio.gather(
+        _counts_by(PostDraft, "status", "user_id", str(user_id)),
+        PostDraft.filter(user_id=user_id).order_by("-updated_at").limit(CLIENT_CONTEXT_TOP_N),
+        _counts_by(BusinessPost, "status", "user_id", str(user_id)),
+        BusinessPost.filter(user_id=user_id).order_by("-created_at").limit(CLIENT_CONTEXT_TOP_N),
+    )
+    return (
+        {"total": sum(drafts_by_status.values()), "by_status": drafts_by_status},
+        [_post_draft_dict(d) for d in drafts],
+        {"total": sum(posts_by_status.values()), "by_status": posts_by_status},
+        [_business_post_dict(p) for p in posts],
+    )
+
 
 async def get_client_data(user_id: int):
-    current_time = time.time()
-
-    # Check if the data is in the cache and not expired
-    if user_id in clinic_cache:
-        cached_data, cached_time = clinic_cache[user_id]
-        if current_time - cached_time < CACHE_EXPIRY_TIME:
-            print(f"Using cached data for user {user_id}")
-            return cached_data
-        else:
-            print(f"Cache expired for user {user_id}, removing from cache")
-            del clinic_cache[user_id]
-
-    # If not in cache or cache expired, make a fresh API call
+    return await client_context_cache.get(
+        user_id, lambda: _load_client_data(user_id), should_cache=lambda data: data is not None,
+    )
+
+
+async def _load_client_data(user_id: int):
+    started = time.perf_counter()
     async with httpx.AsyncClient(timeout=300.0) as client:
         try:
             url = f"{LARAVEL_API_URL}/api/clinic/{user_id}"
             print(f"Making fresh API call to: {url}")
-            
+
             response = await client.get(url, headers=headers)
             print(f"Response status code: {response.status_code}")
-            
+            CONTEXT_LOAD_SECONDS.observe(time.perf_counter() - started, labels={"part": "laravel"})
+
             if response.status_code == 200:
                 clinics = response.json()
-                # print(f"Response data: {clinics}")
-                
+
                 if clinics.get('success', False):
-                    client_details = clinics['data'].get('clients', [])
-                    print(f"get 1st client_details = {client_details}")
-                    
                     # Ensure 'logged_in_user_whose_asked_questions_or_chat' exists and is not empty
                     user_client_id = clinics['data'].get('logged_in_user_whose_asked_questions_or_chat', {})
-                    print(f"get 2nd client_details = {user_client_id}")
-                    
+
                     # Safely extract the 'client_id' from the 'logged_in_user_whose_asked_questions_or_chat' object
                     if user_client_id:
                         client_id = user_client_id.get('client_id', None)
@@ -68,77 +234,22 @@ async def get_client_data(user_id: int):
                         client_id = None
                         print("No user data available for 'logged_in_user_whose_asked_questions_or_chat'.")
 
-                    # Check if client_details list is empty
-                    if client_details:
-                        client_ids_from_api = [client['id'] for client in client_details if 'id' in client]
-                        print(f"get 3rd client_details = {client_ids_from_api}")
-                    else:
-                        print("No client details found.")
-                        client_ids_from_api = []
-
-                    # Step 4: Fetch the LeadScore data for the extracted client_ids (if any)
-                    lead_scores = await LeadScore.filter(client_id=client_id).all()
-                    print(f"Fetched lead scores: {lead_scores}")
-
-                    # Convert LeadScore objects into dictionaries manually
-                    lead_scores_dict = [
-                        {
-                            "id": score.id,
-                            "client_id": score.client_id,
-                            "callrail_id": score.callrail_id,
-                            # "analysis_summary": score.analysis_summary,
-                            "intent_score": score.intent_score,
-                            "urgency_score": score.urgency_score,
-                            "overall_score": score.overall_score,
-                            "name": score.name,
-                            "type": score.type,
-                            "potential_score": score.potential_score
-                        }
-                        for score in lead_scores
-                    ]
-                    print(f"Lead scores converted to dict: {lead_scores_dict}")
-
-                    # Fetch PostDraft data
-                    post_drafts = await PostDraft.filter(user_id=user_id).all()
-                    print(f"PostDrafts for user {user_id}: {post_drafts}")
-
-                    # Convert PostDraft objects into dictionaries manually
-                    post_drafts_dict = [
-                        {
-                            "id": draft.id,
-                            "user_id": draft.user_id,
-                            "current_step": draft.current_step,
-                            "content": draft.content,
-                            "title": draft.title,
-                            "description": draft.description,
-                            "keywords": draft.keywords,
-                            "post_options": draft.post_options,
-                            "selected_post_index": draft.selected_post_index,
-                            "image_ids": draft.image_ids,
-                            "status": draft.status,
-                            "selected_image_id": draft.selected_image_id,
-                            "is_complete": draft.is_complete,
-                            "created_at": draft.created_at,
-                            "posted_at": draft.posted_at,
-                            "updated_at": draft.updated_at,
-                        }
-                        for draft in post_drafts
-                    ]
-                    print(f"PostDrafts converted to dict: {post_drafts_dict}")
-
-                    # Fetch BusinessPosts by user_id
-                    business_posts = await BusinessPost.filter(user_id=user_id).all()
-                    print(f"BusinessPosts for user {user_id}: {business_posts}")
-
-                    # Add the fetched data to the clinics dictionary
-                    clinics['data']['lead_scores'] = lead_scores_dict
-                    clinics['data']['post_drafts'] = post_drafts_dict
-                    clinics['data']['business_posts'] = [post.to_dict() for post in business_posts]
-                    
-                    # Cache the successful response
-                    clinic_cache[user_id] = (clinics['data'], current_time)
-                    
-                    # Return the updated data
+                    # Aggregates plus the top-N items of each kind, instead of every row
+                    db_started = time.perf_counter()
+                    (lead_summary, lead_scores), (draft_summary, drafts, post_summary, posts) = await asyncio.gather(
+                        _lead_score_context(client_id),
+                        _posts_context(user_id),
+                    )
+                    CONTEXT_LOAD_SECONDS.observe(time.perf_counter() - db_started, labels={"part": "db"})
+
+                    clinics['data']['lead_scores_summary'] = lead_summary
+                    clinics['data']['lead_scores'] = lead_scores
+                    clinics['data']['post_drafts_summary'] = draft_summary
+                    clinics['data']['post_drafts'] = drafts
+                    clinics['data']['business_posts_summary'] = post_summary
+                    clinics['data']['business_posts'] = posts
+
+                    CONTEXT_LOAD_SECONDS.observe(time.perf_counter() - started, labels={"part": "total"})
                     return clinics['data']
                 else:
                     print(f"Laravel API returned success=false: {clinics}")
@@ -146,7 +257,7 @@ async def get_client_data(user_id: int):
             else:
                 print(f"Non-200 status code: {response.status_code}, Response: {response.text}")
                 return None
-    
+
         except httpx.RequestError as e:
             print(f"Request Error: {str(e)}")
             return None
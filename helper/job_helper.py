@@ -1,42 +1,51 @@
-from datetime import datetime, timedelta
+from datetime import timedelta
+from typing import Optional
 from helper.transcription_helper import process_unprocessed_callrails
+from helper.scheduler import DueTimeScheduler, ScheduledJob, scheduler
+from helper.work_lanes import NIGHTLY, lane
 from models.system_prompt import SystemPrompts
-from models.job_tracker import JobTracker
 from tortoise import Tortoise
-from helper.tortoise_config import TORTOISE_CONFIG
+from helper.tortoise_config import TORTOISE_CONFIG, prepare_schema
 
-# Make the run_job function asynchronous
+CALLRAILS_JOB = "callrails_job"
+
+
+async def callrails_interval() -> Optional[timedelta]:
+    """Run interval from SystemPrompts.hour; None (job disabled) if the setting is missing or not positive."""
+    system_settings = await SystemPrompts.filter().first()
+    if not system_settings or system_settings.hour in (None, ""):
+        return None
+    hours = int(system_settings.hour)
+    if hours <= 0:
+        # a zero interval would make the job due again the moment it finishes
+        return None
+    return timedelta(hours=hours)
+
+
+async def _run_callrails() -> None:
+    # inside the app (or after run_job's init) the ORM is already up
+    with lane(NIGHTLY):
+        await process_unprocessed_callrails(manage_orm=False)
+
+
+def callrails_job() -> ScheduledJob:
+    return ScheduledJob(name=CALLRAILS_JOB, run=_run_callrails, interval=callrails_interval)
+
+
+def register_jobs(target: DueTimeScheduler = scheduler) -> DueTimeScheduler:
+    target.add(callrails_job())
+    return target
+
+
+# One-shot run (cron/CLI). Uses the same lease claim as the in-app scheduler, so it
+# never overlaps with a replica that is already running the job.
 async def run_job():
     # Initialize Tortoise ORM
     await Tortoise.init(config=TORTOISE_CONFIG)
-    await Tortoise.generate_schemas()
+    await prepare_schema()
     try:
-        # Fetch the system settings from the SystemPrompts table
-        system_settings = await SystemPrompts.filter().first()
-        job_tracker = await JobTracker.filter(job_name="callrails_job").first()
-        if not system_settings or not job_tracker:
-            print("System settings or job tracker entry not found.")
-            return
-        current_time = datetime.now()
-        last_run_time = job_tracker.last_run_time
-        # Make both datetimes naive (remove timezone info if present)
-        if last_run_time and last_run_time.tzinfo is not None:
-            last_run_time = last_run_time.replace(tzinfo=None)
-        time_difference = current_time - last_run_time
-        # Convert hour to int for timedelta
-        if time_difference >= timedelta(hours=int(system_settings.hour)):
-            # Run the job if enough time has passed
-            await process_unprocessed_callrails()
-
-            # Update the last run time in the job tracker table
-            if job_tracker:
-                job_tracker.last_run_time = current_time
-                await job_tracker.save()
-            else:
-                # If no job entry exists, create one
-                await JobTracker.create(job_name="callrails_job", last_run_time=current_time)
-        else:
-            print(f"Job cannot be run. Time remaining: {int(system_settings.hour) - time_difference.total_seconds() // 3600} hours")
+        outcome = await DueTimeScheduler().run_once(callrails_job())
+        print(f"[{CALLRAILS_JOB}] {outcome}")
     finally:
         await Tortoise.close_connections()
 
@@ -0,0 +1,378 @@
+# helper/job_queue.py
+"""
+Durable SQLite job queue for call processing runs.
+
+One row per CallRail call (pending -> downloaded -> transcribed) and one per
+phone group (pending -> scored -> saved). Work is claimed with a lease, so
+several workers/processes can share the file and a crashed worker's rows
+become claimable again once its lease runs out. A restarted run re-enqueues
+the same calls/groups (idempotent) and picks each one up from its last
+completed stage instead of re-downloading and re-transcribing.
+
+call_jobs is also the per-call dedup index shared by every entry point that
+transcribes CallRail calls (/process-user-clients, cron, /manually, /fetch-data,
+the CallRail job): `transcribe_once` returns the stored transcription when the
+call was already done, waits (up to `wait_seconds`)
+for a concurrent worker that holds the call's lease, and otherwise claims and
+transcribes it. Request paths such as /fetch-data pass wait_seconds=0 and report
+the call as in progress instead of holding the request open for a lease. Each
+transcribed row keeps the sha1 of the audio it was made from (content_hash).
+
+All processes share one file, and each process shares one connection between
+its coroutines. Writes therefore go through `_transaction()`, which takes a
+per-connection lock and runs BEGIN IMMEDIATE, so a multi-statement write
+(enqueue_group, purge_finished) is atomic and never commits another coroutine's
+half-done work.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiosqlite
+
+from helper.metrics import counter
+
+logger = logging.getLogger("uvicorn.error")
+
+JOB_QUEUE_ENABLED = os.getenv("JOB_QUEUE_ENABLED", "1") == "1"
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "job_queue.db")
+JOB_QUEUE_LEASE_SECONDS = float(os.getenv("JOB_QUEUE_LEASE_SECONDS", "900"))
+JOB_QUEUE_MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3"))
+# finished rows are kept this long so a re-run inside the window still skips them
+JOB_QUEUE_RETENTION_SECONDS = float(os.getenv("JOB_QUEUE_RETENTION_SECONDS", str(7 * 24 * 3600)))
+# how long a path waits for a call another worker is transcribing (longer than a lease, so a dead worker's call is taken over)
+JOB_QUEUE_CLAIM_WAIT_SECONDS = float(os.getenv("JOB_QUEUE_CLAIM_WAIT_SECONDS", str(JOB_QUEUE_LEASE_SECONDS + 60)))
+JOB_QUEUE_CLAIM_POLL_SECONDS = float(os.getenv("JOB_QUEUE_CLAIM_POLL_SECONDS", "2"))
+
+CALL_DEDUP = counter("call_dedup_total", "Per-call transcription lookups by source and outcome (hit/miss/waited/busy/failed)")
+
+CALL_STATES = ("pending", "downloaded", "transcribed", "failed")
+GROUP_STATES = ("pending", "scored", "saved", "failed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS call_jobs (
+    call_id      TEXT PRIMARY KEY,
+    user_id      INTEGER,
+    phone        TEXT,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    audio_path   TEXT,
+    transcription TEXT,
+    content_hash TEXT,
+    processed_at REAL,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    lease_owner  TEXT,
+    lease_until  REAL,
+    updated_at   REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_jobs (
+    user_id      INTEGER NOT NULL,
+    phone        TEXT NOT NULL,
+    state        TEXT NOT NULL DEFAULT 'pending',
+    call_ids     TEXT,
+    lead         TEXT,
+    error        TEXT,
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    lease_owner  TEXT,
+    lease_until  REAL,
+    updated_at   REAL NOT NULL,
+    PRIMARY KEY (user_id, phone)
+);
+CREATE INDEX IF NOT EXISTS idx_group_jobs_state ON group_jobs (user_id, state);
+"""
+
+def audio_content_hash(path: str) -> str:
+    """sha1 of a downloaded recording (blocking: run it in a thread)."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def worker_id(tag: str = "") -> str:
+    """Lease owner name: host + pid (+ a run tag such as the session id)."""
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{base}:{tag}" if tag else base
+
+
+class JobQueue:
+    def __init__(self, path: str = JOB_QUEUE_PATH, lease_seconds: float = JOB_QUEUE_LEASE_SECONDS):
+        self.path = path
+        self.lease_seconds = float(lease_seconds)
+        self._db: Optional[aiosqlite.Connection] = None
+        self._open_lock = asyncio.Lock()
+        # one transaction at a time on the shared connection
+        self._write_lock = asyncio.Lock()
+
+    async def _conn(self) -> aiosqlite.Connection:
+        if self._db is None:
+            async with self._open_lock:
+                if self._db is None:
+                    folder = os.path.dirname(os.path.abspath(self.path))
+                    os.makedirs(folder, exist_ok=True)
+                    # autocommit mode: transactions are opened explicitly in _transaction()
+                    db = await aiosqlite.connect(self.path, timeout=30.0, isolation_level=None)
+                    db.row_factory = aiosqlite.Row
+                    # WAL: readers don't block the writer, safe for several processes on one host
+                    await db.execute("PRAGMA journal_mode=WAL")
+                    await db.execute("PRAGMA synchronous=NORMAL")
+                    await db.execute("PRAGMA busy_timeout=30000")
+                    await db.executescript(_SCHEMA)
+                    self._db = db
+        return self._db
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    @contextlib.asynccontextmanager
+    async def _transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK on error), exclusive on this connection."""
+        db = await self._conn()
+        async with self._write_lock:
+            await db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                await db.rollback()
+                raise
+            await db.commit()
+
+    async def _write(self, sql: str, params: tuple) -> int:
+        async with self._transaction() as db:
+            cur = await db.execute(sql, params)
+            return cur.rowcount
+
+    # ---------- enqueue ----------
+    async def enqueue_group(self, user_id: int, phone: str, call_ids: List[str]) -> None:
+        """Idempotent for the same calls; a group whose call ids changed is reset to pending."""
+        now = time.time()
+        call_ids = sorted(call_ids)
+        user_id = int(user_id)
+        async with self._transaction() as db:
+            await db.execute(
+                "INSERT OR IGNORE INTO group_jobs (user_id, phone, state, call_ids, updated_at) VALUES (?, ?, 'pending', ?, ?)",
+                (user_id, phone, json.dumps(call_ids), now),
+            )
+            # a group whose calls changed is new work, whatever state it reached before
+            # (scored, saved, or failed after its attempts): score it again from scratch
+            await db.execute(
+                "UPDATE group_jobs SET call_ids = ?, state = 'pending', lead = NULL, error = NULL, attempts = 0, "
+                "updated_at = ? WHERE user_id = ? AND phone = ? AND call_ids != ?",
+                (json.dumps(call_ids), now, user_id, phone, json.dumps(call_ids)),
+            )
+            await db.executemany(
+                "INSERT OR IGNORE INTO call_jobs (call_id, user_id, phone, state, updated_at) VALUES (?, ?, ?, 'pending', ?)",
+                [(cid, user_id, phone, now) for cid in call_ids],
+            )
+
+    # ---------- leases ----------
+    async def claim_group(self, user_id: int, phone: str, owner: str) -> bool:
+        """Take the lease on one unfinished group. False if saved, failed, or leased by someone else."""
+        now = time.time()
+        n = await self._write(
+            "UPDATE group_jobs SET lease_owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE user_id = ? AND phone = ? AND state IN ('pending', 'scored') "
+            "AND (lease_until IS NULL OR lease_until < ? OR lease_owner = ?)",
+            (owner, now + self.lease_seconds, now, int(user_id), phone, now, owner),
+        )
+        return n == 1
+
+    async def claim_next_groups(self, owner: str, user_id: Optional[int] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Claim up to `limit` unfinished, unleased groups (any user unless `user_id` is given)."""
+        now = time.time()
+        db = await self._conn()
+        where = "state IN ('pending', 'scored') AND (lease_until IS NULL OR lease_until < ?)"
+        params: List[Any] = [now]
+        if user_id is not None:
+            where += " AND user_id = ?"
+            params.append(int(user_id))
+        async with db.execute(f"SELECT user_id, phone FROM group_jobs WHERE {where} LIMIT ?", (*params, int(limit))) as cur:
+            candidates = [(r["user_id"], r["phone"]) for r in await cur.fetchall()]
+        claimed = []
+        for uid, phone in candidates:
+            # the conditional UPDATE is the actual claim; losing a race just skips the row
+            if await self.claim_group(uid, phone, owner):
+                claimed.append(await self.get_group(uid, phone))
+        return claimed
+
+    async def claim_call(self, call_id: str, owner: str) -> bool:
+        now = time.time()
+        n = await self._write(
+            "UPDATE call_jobs SET lease_owner = ?, lease_until = ?, attempts = attempts + 1, updated_at = ? "
+            "WHERE call_id = ? AND state IN ('pending', 'downloaded') "
+            "AND (lease_until IS NULL OR lease_until < ? OR lease_owner = ?)",
+            (owner, now + self.lease_seconds, now, call_id, now, owner),
+        )
+        return n == 1
+
+    async def release_group(self, user_id: int, phone: str, owner: str) -> None:
+        await self._write(
+            "UPDATE group_jobs SET lease_owner = NULL, lease_until = NULL WHERE user_id = ? AND phone = ? AND lease_owner = ?",
+            (int(user_id), phone, owner),
+        )
+
+    # ---------- stage transitions ----------
+    async def advance_call(self, call_id: str, state: str, *, audio_path: Optional[str] = None,
+                           transcription: Optional[str] = None, content_hash: Optional[str] = None) -> None:
+        if state not in CALL_STATES:
+            raise ValueError(f"Unknown call state '{state}'")
+        done = state == "transcribed"
+        now = time.time()
+        await self._write(
+            "UPDATE call_jobs SET state = ?, audio_path = COALESCE(?, audio_path), "
+            "transcription = COALESCE(?, transcription), content_hash = COALESCE(?, content_hash), "
+            "error = NULL, updated_at = ?, "
+            "processed_at = CASE WHEN ? THEN ? ELSE processed_at END, "
+            "lease_owner = CASE WHEN ? THEN NULL ELSE lease_owner END, "
+            "lease_until = CASE WHEN ? THEN NULL ELSE lease_until END "
+            "WHERE call_id = ?",
+            (state, audio_path, transcription, content_hash, now, done, now, done, done, call_id),
+        )
+
+    async def ensure_call(self, call_id: str, user_id: Optional[int] = None, phone: Optional[str] = None) -> None:
+        """Register a call (no-op if it is already in the index)."""
+        await self._write(
+            "INSERT OR IGNORE INTO call_jobs (call_id, user_id, phone, state, updated_at) VALUES (?, ?, ?, 'pending', ?)",
+            (call_id, int(user_id) if user_id is not None else None, phone, time.time()),
+        )
+
+    async def transcribe_once(self, call_id: str, owner: str,
+                              fetch: Callable[[], Awaitable[Dict[str, Any]]],
+                              transcribe: Callable[[str], Awaitable[Dict[str, Any]]], *,
+                              user_id: Optional[int] = None, phone: Optional[str] = None,
+                              source: str = "unknown",
+                              wait_seconds: float = JOB_QUEUE_CLAIM_WAIT_SECONDS) -> Optional[str]:
+        """
+        Transcription for `call_id`, doing the work at most once across entry points.
+        `fetch()` -> {'audio_path'} | {'error'}; `transcribe(path)` -> {'transcription'} | {'error'}.
+        Returns None when the call failed or is still held by another worker after `wait_seconds`
+        (0: don't wait; `call_in_progress` tells the two apart).
+        """
+        await self.ensure_call(call_id, user_id, phone)
+        deadline = time.monotonic() + wait_seconds
+        waited = False
+        while True:
+            job = await self.get_call(call_id) or {}
+            if job.get("state") == "transcribed":
+                CALL_DEDUP.inc(labels={"source": source, "outcome": "waited" if waited else "hit"})
+                return job.get("transcription") or None
+            if job.get("state") == "failed":
+                CALL_DEDUP.inc(labels={"source": source, "outcome": "failed"})
+                return None
+            if await self.claim_call(call_id, owner):
+                break
+            # another path is on this call right now: wait for its result instead of redoing it
+            if time.monotonic() >= deadline:
+                CALL_DEDUP.inc(labels={"source": source, "outcome": "busy"})
+                return None
+            waited = True
+            await asyncio.sleep(JOB_QUEUE_CLAIM_POLL_SECONDS)
+
+        CALL_DEDUP.inc(labels={"source": source, "outcome": "miss"})
+        try:
+            audio_path = job.get("audio_path") if job.get("state") == "downloaded" else None
+            if not audio_path or not os.path.exists(audio_path):
+                fetched = await fetch()
+                if "error" in fetched:
+                    await self.fail_call(call_id, fetched["error"])
+                    return None
+                audio_path = fetched["audio_path"]
+                digest = await asyncio.to_thread(audio_content_hash, audio_path)
+                await self.advance_call(call_id, "downloaded", audio_path=audio_path, content_hash=digest)
+
+            result = await transcribe(audio_path)
+            if "error" in result:
+                await self.fail_call(call_id, result["error"])
+                return None
+            tx = result.get("transcription")
+            tx = tx.strip() if isinstance(tx, str) else ""
+            await self.advance_call(call_id, "transcribed", transcription=tx)
+            return tx or None
+        except Exception as e:
+            await self.fail_call(call_id, str(e))
+            raise
+
+    async def fail_call(self, call_id: str, error: str) -> None:
+        """Record an error; the call becomes 'failed' once it has used up its attempts."""
+        await self._write(
+            "UPDATE call_jobs SET error = ?, lease_owner = NULL, lease_until = NULL, updated_at = ?, "
+            "state = CASE WHEN attempts >= ? THEN 'failed' ELSE state END WHERE call_id = ?",
+            (error[:1000], time.time(), JOB_QUEUE_MAX_ATTEMPTS, call_id),
+        )
+
+    async def advance_group(self, user_id: int, phone: str, state: str, *, lead: Optional[Dict[str, Any]] = None) -> None:
+        if state not in GROUP_STATES:
+            raise ValueError(f"Unknown group state '{state}'")
+        done = state == "saved"
+        await self._write(
+            "UPDATE group_jobs SET state = ?, lead = COALESCE(?, lead), error = NULL, updated_at = ?, "
+            "lease_owner = CASE WHEN ? THEN NULL ELSE lease_owner END, "
+            "lease_until = CASE WHEN ? THEN NULL ELSE lease_until END "
+            "WHERE user_id = ? AND phone = ?",
+            (state, json.dumps(lead, default=str) if lead is not None else None, time.time(), done, done, int(user_id), phone),
+        )
+
+    async def fail_group(self, user_id: int, phone: str, error: str) -> None:
+        await self._write(
+            "UPDATE group_jobs SET error = ?, lease_owner = NULL, lease_until = NULL, updated_at = ?, "
+            "state = CASE WHEN attempts >= ? THEN 'failed' ELSE state END WHERE user_id = ? AND phone = ?",
+            (error[:1000], time.time(), JOB_QUEUE_MAX_ATTEMPTS, int(user_id), phone),
+        )
+
+    # ---------- reads ----------
+    async def get_call(self, call_id: str) -> Optional[Dict[str, Any]]:
+        db = await self._conn()
+        async with db.execute("SELECT * FROM call_jobs WHERE call_id = ?", (call_id,)) as cur:
+            row = await cur.fetchone()
+        return dict(row) if row else None
+
+    async def call_in_progress(self, call_id: str) -> bool:
+        """True while another worker holds an unexpired lease on an unfinished call."""
+        job = await self.get_call(call_id) or {}
+        return job.get("state") in ("pending", "downloaded") and (job.get("lease_until") or 0) > time.time()
+
+    async def get_group(self, user_id: int, phone: str) -> Optional[Dict[str, Any]]:
+        db = await self._conn()
+        async with db.execute("SELECT * FROM group_jobs WHERE user_id = ? AND phone = ?", (int(user_id), phone)) as cur:
+            row = await cur.fetchone()
+        if not row:
+            return None
+        out = dict(row)
+        out["call_ids"] = json.loads(out["call_ids"]) if out.get("call_ids") else []
+        out["lead"] = json.loads(out["lead"]) if out.get("lead") else None
+        return out
+
+    async def stats(self) -> Dict[str, Dict[str, int]]:
+        db = await self._conn()
+        out: Dict[str, Dict[str, int]] = {"calls": {}, "groups": {}}
+        async with db.execute("SELECT state, COUNT(*) AS n FROM call_jobs GROUP BY state") as cur:
+            out["calls"] = {r["state"]: r["n"] for r in await cur.fetchall()}
+        async with db.execute("SELECT state, COUNT(*) AS n FROM group_jobs GROUP BY state") as cur:
+            out["groups"] = {r["state"]: r["n"] for r in await cur.fetchall()}
+        return out
+
+    async def purge_finished(self, older_than_s: float = JOB_QUEUE_RETENTION_SECONDS) -> int:
+        cutoff = time.time() - older_than_s
+        async with self._transaction() as db:
+            c1 = await db.execute("DELETE FROM call_jobs WHERE state IN ('transcribed', 'failed') AND updated_at < ?", (cutoff,))
+            c2 = await db.execute("DELETE FROM group_jobs WHERE state IN ('saved', 'failed') AND updated_at < ?", (cutoff,))
+        return (c1.rowcount or 0) + (c2.rowcount or 0)
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
@@ -3,6 +3,8 @@ import os
 import httpx
 from typing import Any, Dict, List, Optional
 
+from helper.adaptive_limit import LARAVEL_LIMIT
+
 LARAVEL_API_URL = os.getenv("API_URL", "http://127.0.0.1:8080").rstrip("/")
 WIDGET_BASE = f"{LARAVEL_API_URL}/api/widget"
 
@@ -13,41 +15,36 @@ API_HEADERS = {
     "Content-Type": "application/json",
 }
 
+
+async def _request(method: str, url: str, timeout: float = 30.0, **kwargs) -> Any:
+    """One Laravel call under the adaptive Laravel concurrency limit; raises on HTTP errors."""
+    async with LARAVEL_LIMIT.slot() as call:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            r = await client.request(method, url, headers=API_HEADERS, **kwargs)
+        call.status(r.status_code)
+        r.raise_for_status()
+        return r.json()
+
 async def create_chat_widget(user_id: str, title: Optional[str] = None) -> Dict[str, Any]:
     payload: Dict[str, Any] = {"user_id": user_id}
     if title:
         payload["title"] = title
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.post(f"{WIDGET_BASE}/chats", headers=API_HEADERS, json=payload)
-        r.raise_for_status()
-        return r.json()
+    return await _request("POST", f"{WIDGET_BASE}/chats", json=payload)
 
 async def list_chat_widgets(user_id: str) -> List[Dict[str, Any]]:
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.get(f"{WIDGET_BASE}/chats/{user_id}", headers=API_HEADERS)
-        r.raise_for_status()
-        return r.json()
+    return await _request("GET", f"{WIDGET_BASE}/chats/{user_id}")
 
 async def delete_chat_widget(chat_id: int) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.delete(f"{WIDGET_BASE}/chats/{chat_id}", headers=API_HEADERS)
-        r.raise_for_status()
-        return r.json()
+    return await _request("DELETE", f"{WIDGET_BASE}/chats/{chat_id}")
 
 async def delete_all_chats_for_user(user_id: str) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.delete(f"{WIDGET_BASE}/chats/user/{user_id}", headers=API_HEADERS)
-        r.raise_for_status()
-        return r.json()
+    return await _request("DELETE", f"{WIDGET_BASE}/chats/user/{user_id}")
 
 async def list_messages_widget(chat_id: int, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
     params: Dict[str, Any] = {}
     if user_id:
         params["user_id"] = user_id
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.get(f"{WIDGET_BASE}/chats/{chat_id}/messages", headers=API_HEADERS, params=params)
-        r.raise_for_status()
-        return r.json()
+    return await _request("GET", f"{WIDGET_BASE}/chats/{chat_id}/messages", params=params)
 
 async def create_message_widget(user_id: str, chat_id: int, user_message: Optional[str], bot_response: Optional[str]) -> Dict[str, Any]:
     payload = {
@@ -56,13 +53,7 @@ async def create_message_widget(user_id: str, chat_id: int, user_message: Option
         "user_message": user_message,
         "bot_response": bot_response,
     }
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        r = await client.post(f"{WIDGET_BASE}/messages", headers=API_HEADERS, json=payload)
-        r.raise_for_status()
-        return r.json()
+    return await _request("POST", f"{WIDGET_BASE}/messages", timeout=60.0, json=payload)
 
 async def delete_message_widget(message_id: int) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        r = await client.delete(f"{WIDGET_BASE}/message/{message_id}", headers=API_HEADERS)
-        r.raise_for_status()
-        return r.json()
+    return await _request("DELETE", f"{WIDGET_BASE}/message/{message_id}")
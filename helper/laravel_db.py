@@ -1,12 +1,16 @@
 # helper/laravel_db.py
 import os
-from typing import AsyncIterator
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
 from contextlib import asynccontextmanager
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 from dotenv import load_dotenv
 
+from helper.metrics import histogram, counter, gauge
+
 load_dotenv()
 
 _L_HOST = os.getenv("LARAVEL_DB_HOST", "127.0.0.1")
@@ -15,21 +19,49 @@ _L_NAME = os.getenv("LARAVEL_DB_NAME", "")
 _L_USER = os.getenv("LARAVEL_DB_USER", "")
 _L_PASS = os.getenv("LARAVEL_DB_PASSWORD", "")
 
+# Pool tuning (per worker process)
+_POOL_SIZE = int(os.getenv("LARAVEL_DB_POOL_SIZE", "10"))
+_POOL_MAX_OVERFLOW = int(os.getenv("LARAVEL_DB_POOL_MAX_OVERFLOW", "10"))
+_POOL_TIMEOUT = float(os.getenv("LARAVEL_DB_POOL_TIMEOUT", "10"))
+_POOL_RECYCLE = int(os.getenv("LARAVEL_DB_POOL_RECYCLE", "1800"))
+_POOL_PRE_PING = os.getenv("LARAVEL_DB_POOL_PRE_PING", "1") == "1"
+# SQLAlchemy compiled-statement cache (shared by every statement on this engine)
+_QUERY_CACHE_SIZE = int(os.getenv("LARAVEL_DB_QUERY_CACHE_SIZE", "500"))
+
 _DSN = f"mysql+aiomysql://{_L_USER}:{_L_PASS}@{_L_HOST}:{_L_PORT}/{_L_NAME}?charset=utf8mb4"
 
 _engine = create_async_engine(
     _DSN,
-    pool_pre_ping=True,
-    pool_recycle=1800,
+    pool_size=_POOL_SIZE,
+    max_overflow=_POOL_MAX_OVERFLOW,
+    pool_timeout=_POOL_TIMEOUT,
+    pool_pre_ping=_POOL_PRE_PING,
+    pool_recycle=_POOL_RECYCLE,
+    query_cache_size=_QUERY_CACHE_SIZE,
     echo=False,
     isolation_level="AUTOCOMMIT",
 )
 
 _Session = async_sessionmaker(bind=_engine, expire_on_commit=False, class_=AsyncSession)
 
+# ---------------- metrics ----------------
+POOL_WAIT_SECONDS = histogram(
+    "laravel_db_pool_wait_seconds", "Time to check a connection out of the Laravel DB pool"
+)
+QUERY_SECONDS = histogram(
+    "laravel_db_query_seconds", "Laravel DB query latency by named statement"
+)
+QUERY_ERRORS = counter("laravel_db_query_errors_total", "Laravel DB query failures by named statement")
+gauge("laravel_db_pool_checked_out", "Connections currently checked out", fn=lambda: _engine.pool.checkedout())
+gauge("laravel_db_pool_overflow", "Overflow connections currently open", fn=lambda: _engine.pool.overflow())
+
 @asynccontextmanager
 async def laravel_session() -> AsyncIterator[AsyncSession]:
+    start = time.perf_counter()
     async with _Session() as session:
+        # force the pool checkout here so the wait is measured separately from query time
+        await session.connection()
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
         yield session
 
 # --- graceful shutdown to avoid "Event loop is closed" on Windows ---
@@ -39,39 +71,77 @@ async def shutdown():
     except Exception:
         pass
 
-# ---------------- queries ----------------
-async def fetch_services(limit: int = 50, offset: int = 0):
-    q = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE deleted_at IS NULL
-        ORDER BY name ASC
-        LIMIT :limit OFFSET :offset
-    """)
+# ---------------- statement cache ----------------
+# Hot statements are parsed into TextClause objects once per process and reused,
+# so SQLAlchemy's compiled cache hits on every call instead of re-parsing SQL text.
+_STATEMENTS: Dict[str, TextClause] = {}
+
+def statement(name: str, sql: Optional[str] = None) -> TextClause:
+    """Return the cached statement `name`, registering it from `sql` on first use."""
+    stmt = _STATEMENTS.get(name)
+    if stmt is None:
+        if sql is None:
+            raise KeyError(f"Unknown statement '{name}'")
+        stmt = text(sql)
+        _STATEMENTS[name] = stmt
+    return stmt
+
+statement("service.list", """
+    SELECT id, name, description, for_report
+    FROM services
+    WHERE deleted_at IS NULL
+    ORDER BY name ASC
+    LIMIT :limit OFFSET :offset
+""")
+statement("service.all", """
+    SELECT id, name, description, for_report
+    FROM services
+    WHERE deleted_at IS NULL
+    ORDER BY id ASC
+    LIMIT :limit
+""")
+statement("service.get", """
+    SELECT id, name, description, for_report
+    FROM services
+    WHERE id = :sid AND deleted_at IS NULL
+    LIMIT 1
+""")
+statement("service.search", """
+    SELECT id, name, description, for_report
+    FROM services
+    WHERE deleted_at IS NULL
+      AND (name LIKE :q OR description LIKE :q)
+    ORDER BY name ASC
+    LIMIT :limit
+""")
+
+async def execute_named(session: AsyncSession, name: str, params: Dict[str, Any], stmt: Optional[TextClause] = None):
+    """Run a cached statement on an open session, recording its latency under `name`."""
+    start = time.perf_counter()
+    try:
+        return await session.execute(stmt if stmt is not None else statement(name), params)
+    except Exception:
+        QUERY_ERRORS.inc(labels={"query": name})
+        raise
+    finally:
+        QUERY_SECONDS.observe(time.perf_counter() - start, labels={"query": name})
+
+async def fetch_all(name: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
     async with laravel_session() as s:
-        rows = (await s.execute(q, {"limit": int(limit), "offset": int(offset)})).mappings().all()
+        rows = (await execute_named(s, name, params)).mappings().all()
         return [dict(r) for r in rows]
 
-async def fetch_service_by_id(service_id: int):
-    q = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE id = :sid AND deleted_at IS NULL
-        LIMIT 1
-    """)
+async def fetch_one(name: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     async with laravel_session() as s:
-        row = (await s.execute(q, {"sid": int(service_id)})).mappings().first()
+        row = (await execute_named(s, name, params)).mappings().first()
         return dict(row) if row else None
 
+# ---------------- queries ----------------
+async def fetch_services(limit: int = 50, offset: int = 0):
+    return await fetch_all("service.list", {"limit": int(limit), "offset": int(offset)})
+
+async def fetch_service_by_id(service_id: int):
+    return await fetch_one("service.get", {"sid": int(service_id)})
+
 async def search_services(query: str, limit: int = 25):
-    q = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE deleted_at IS NULL
-          AND (name LIKE :q OR description LIKE :q)
-        ORDER BY name ASC
-        LIMIT :limit
-    """)
-    async with laravel_session() as s:
-        rows = (await s.execute(q, {"q": f"%{query.strip()}%", "limit": int(limit)})).mappings().all()
-        return [dict(r) for r in rows]
+    return await fetch_all("service.search", {"q": f"%{query.strip()}%", "limit": int(limit)})
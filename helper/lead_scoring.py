@@ -10,6 +10,8 @@ from langchain.output_parsers import PydanticOutputParser
 
 from models.system_prompt import SystemPrompts
 from helper.post_setting_helper import get_settings
+from helper.work_lanes import work_slot
+from helper.adaptive_limit import OPENAI_LIMIT
 
 load_dotenv()
 
@@ -240,7 +242,8 @@ class LeadScoringService:
 
         _log_messages("ANALYTICS PROMPT (FINAL)", formatted_prompt)
 
-        response = await self.llm.ainvoke(formatted_prompt)
+        async with work_slot("llm"), OPENAI_LIMIT.slot():
+            response = await self.llm.ainvoke(formatted_prompt)
         return {"summary": (response.content or "").strip(), 'client_id': client_id}
 
     async def score_summary(self, analysis_summary: str, client_id: Optional[int] = None) -> LeadAnalysis:
@@ -269,7 +272,8 @@ class LeadScoringService:
 
         _log_messages("SCORE PROMPT (FINAL)", formatted_prompt)
 
-        response = await self.llm.ainvoke(formatted_prompt)
+        async with work_slot("llm"), OPENAI_LIMIT.slot():
+            response = await self.llm.ainvoke(formatted_prompt)
         analysis = self.parser.parse(response.content)
         return analysis
 
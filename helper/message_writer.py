@@ -0,0 +1,146 @@
+# helper/message_writer.py
+"""
+Write-behind persistence for POST /messages.
+
+The Message row is inserted while the reply is still being generated, so the
+response has its id without waiting on the database afterwards. The reply text
+and the chat bookkeeping (title on the first message, updated_at) are queued
+here and written in batches shortly after the response has gone out:
+
+    MESSAGE_WRITE_FLUSH_SECONDS   how long a reply may wait before it is written (default 0.25)
+    MESSAGE_WRITE_BATCH           replies per flush (default 50)
+
+Until its flush, a reply is served from this process by `pending_reply()`, so the
+next turn's history already contains it. Only this process sees it: if another
+worker serves the chat's next turn within the flush window, that turn's history
+lacks the reply. Pending writes are flushed on shutdown
+by the lifespan (flush_all_batchers). A crash or kill (no lifespan shutdown) loses
+the replies still queued: those written in the last MESSAGE_WRITE_FLUSH_SECONDS,
+or longer while flushes are failing. Their rows stay with an empty bot_response,
+which history skips, so the chat only misses that turn's answer.
+
+`finish_turn` attaches a reply to its row in a task of its own, so a client that
+disconnects mid-turn doesn't cancel the write; if the early insert failed, it
+inserts the whole turn instead of losing the reply.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from tortoise.transactions import in_transaction
+
+from helper.write_behind import WriteBehindBatcher
+from models.chat import ChatModel as Chat
+from models.message import Message
+
+logger = logging.getLogger("uvicorn.error")
+
+MESSAGE_WRITE_BATCH = int(os.getenv("MESSAGE_WRITE_BATCH", "50"))
+MESSAGE_WRITE_FLUSH_SECONDS = float(os.getenv("MESSAGE_WRITE_FLUSH_SECONDS", "0.25"))
+
+_replies: Dict[int, str] = {}       # message id -> bot_response not yet written
+_titles: Dict[int, str] = {}        # chat id -> title for chats still named "New Chat"
+_finishing: Set[asyncio.Task] = set()  # finish_turn tasks, referenced until done
+
+
+def chat_title(user_message: str) -> str:
+    """First five words of the message, capped at 50 characters."""
+    t = " ".join((user_message or "").split()[:5])
+    return (t[:47] + "...") if len(t) > 50 else t
+
+
+def pending_reply(message_id: int) -> Optional[str]:
+    return _replies.get(message_id)
+
+
+async def _write_replies(message_ids: List[int]) -> int:
+    rows = [(mid, _replies[mid]) for mid in message_ids if mid in _replies]
+    if not rows:
+        return 0
+    async with in_transaction():
+        for mid, text in rows:
+            await Message.filter(id=mid).update(bot_response=text)
+    # only forget them once they are durable; a failed flush is retried with the same text
+    for mid, text in rows:
+        if _replies.get(mid) == text:
+            del _replies[mid]
+    return 1
+
+
+async def _touch_chats(chat_ids: List[int]) -> int:
+    titles = {cid: _titles[cid] for cid in chat_ids if cid in _titles}
+    async with in_transaction():
+        await Chat.filter(id__in=chat_ids).update(updated_at=datetime.now())
+        for cid, title in titles.items():
+            await Chat.filter(id=cid, title="New Chat").update(title=title)
+    for cid in titles:
+        _titles.pop(cid, None)
+    return 1 + len(titles)
+
+
+reply_writer = WriteBehindBatcher(
+    "chat-replies", _write_replies, max_batch=MESSAGE_WRITE_BATCH, max_delay=MESSAGE_WRITE_FLUSH_SECONDS,
+)
+chat_writer = WriteBehindBatcher(
+    "chat-touch", _touch_chats, max_batch=MESSAGE_WRITE_BATCH, max_delay=MESSAGE_WRITE_FLUSH_SECONDS,
+)
+
+
+async def create_message_row(user_id: str, chat_id: int, user_message: str) -> Message:
+    """Insert the turn with an empty reply; history skips it until the reply exists."""
+    return await Message.create(user_id=user_id, chat_id=chat_id, user_message=user_message, bot_response="")
+
+
+async def queue_reply(message: Message, bot_response: str) -> None:
+    message.bot_response = bot_response
+    _replies[message.id] = bot_response
+    await reply_writer.add(message.id)
+    await _queue_chat_touch(message)
+
+
+async def _queue_chat_touch(message: Message) -> None:
+    if (message.user_message or "").strip():
+        _titles.setdefault(message.chat_id, chat_title(message.user_message))
+    await chat_writer.add(message.chat_id)
+
+
+async def _finish_turn(row_task: "asyncio.Task[Message]", user_id: str, chat_id: int,
+                       user_message: str, bot_response: str) -> Message:
+    try:
+        message = await row_task
+    except Exception as e:
+        logger.warning("[message-writer] early insert for chat %s failed (%s); writing the turn with its reply", chat_id, e)
+        message = await Message.create(user_id=user_id, chat_id=chat_id, user_message=user_message,
+                                       bot_response=bot_response)
+        await _queue_chat_touch(message)
+        return message
+    await queue_reply(message, bot_response)
+    return message
+
+
+def finish_turn(row_task: "asyncio.Task[Message]", user_id: str, chat_id: int,
+                user_message: str, bot_response: str) -> "asyncio.Task[Message]":
+    """
+    Store `bot_response` for the row `row_task` (create_message_row) inserts. Runs as
+    its own task, which outlives the caller's cancellation; await it via asyncio.shield.
+    """
+    task = asyncio.create_task(_finish_turn(row_task, user_id, chat_id, user_message, bot_response))
+    _finishing.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task: asyncio.Task) -> None:
+    _finishing.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("[message-writer] could not store a chat reply: %s", task.exception())
+
+
+def report() -> Dict[str, object]:
+    return {
+        "pending_replies": len(_replies),
+        "replies": reply_writer.report(),
+        "chats": chat_writer.report(),
+    }
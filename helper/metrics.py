@@ -0,0 +1,186 @@
+# helper/metrics.py
+"""
+Tiny in-process metrics registry (counters, gauges, histograms).
+
+Exported in Prometheus text format by controller/metrics_controller.py at
+GET /api/metrics, and as JSON via `snapshot()` for logs/debug endpoints.
+Values are per worker process.
+"""
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# seconds; tuned for DB/HTTP calls in the 1 ms – 30 s range
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+_lock = threading.Lock()
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((str(k), str(v)) for k, v in (labels or {}).items()))
+
+
+def _fmt_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    inner = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str = ""):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, labels: Optional[Dict[str, str]] = None) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, val in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {val}")
+        return lines
+
+    def snapshot(self) -> Dict[str, float]:
+        return {_fmt_labels(k) or "_": v for k, v in self._values.items()}
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str = "", fn: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help = help_text
+        self._fn = fn
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        with _lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def value(self, labels: Optional[Dict[str, str]] = None) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def _collect(self) -> Dict[LabelKey, float]:
+        if self._fn is not None:
+            try:
+                return {(): float(self._fn())}
+            except Exception:
+                return {}
+        return dict(self._values)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, val in sorted(self._collect().items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {val}")
+        return lines
+
+    def snapshot(self) -> Dict[str, float]:
+        return {_fmt_labels(k) or "_": v for k, v in self._collect().items()}
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count], sum, count
+        self._series: Dict[LabelKey, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0, 0.0])
+                self._series[key] = series
+            counts, agg = series
+            counts[idx] += 1
+            agg[0] += value
+            agg[1] += 1
+
+    def quantile(self, q: float, labels: Optional[Dict[str, str]] = None) -> Optional[float]:
+        """Bucket-upper-bound estimate of quantile q (None when empty)."""
+        series = self._series.get(_label_key(labels))
+        if not series or not series[1][1]:
+            return None
+        counts, agg = series
+        target = q * agg[1]
+        running = 0
+        for i, c in enumerate(counts):
+            running += c
+            if running >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, agg) in sorted(self._series.items()):
+            running = 0
+            for bound, c in zip(self.buckets, counts):
+                running += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', repr(bound)))} {running}")
+            running += counts[-1]
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {running}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {agg[0]}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {int(agg[1])}")
+        return lines
+
+    def snapshot(self) -> Dict[str, Dict[str, Optional[float]]]:
+        out = {}
+        for key, (_counts, agg) in self._series.items():
+            labels = dict(key)
+            out[_fmt_labels(key) or "_"] = {
+                "count": int(agg[1]),
+                "avg": (agg[0] / agg[1]) if agg[1] else None,
+                "p50": self.quantile(0.5, labels),
+                "p95": self.quantile(0.95, labels),
+            }
+        return out
+
+
+_REGISTRY: Dict[str, object] = {}
+
+
+def _get_or_create(name: str, factory: Callable[[], object], kind: type):
+    with _lock:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = factory()
+            _REGISTRY[name] = metric
+    if not isinstance(metric, kind):
+        raise TypeError(f"Metric '{name}' already registered as {type(metric).__name__}")
+    return metric
+
+
+def counter(name: str, help_text: str = "") -> Counter:
+    return _get_or_create(name, lambda: Counter(name, help_text), Counter)
+
+
+def gauge(name: str, help_text: str = "", fn: Optional[Callable[[], float]] = None) -> Gauge:
+    return _get_or_create(name, lambda: Gauge(name, help_text, fn), Gauge)
+
+
+def histogram(name: str, help_text: str = "", buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+    return _get_or_create(name, lambda: Histogram(name, help_text, buckets), Histogram)
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for name in sorted(_REGISTRY):
+        lines.extend(_REGISTRY[name].render())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, object]:
+    return {name: metric.snapshot() for name, metric in sorted(_REGISTRY.items())}
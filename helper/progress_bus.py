@@ -0,0 +1,159 @@
+# helper/progress_bus.py
+"""
+Push-based progress sessions for long background runs.
+
+`ProgressSessions` is a drop-in for the old `active_sessions` dict: writers keep
+doing `sessions[sid]["processed"] = n` / `sessions[sid]["details"].append(...)`,
+and every mutation wakes that session's subscribers. Each subscriber owns a
+size-1 queue, so a burst of updates collapses into one wake-up (coalescing).
+Finished sessions stay readable for PROGRESS_SESSION_TTL seconds (so a client
+can reconnect and still see the result) and are then garbage-collected.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
+logger = logging.getLogger("uvicorn.error")
+
+PROGRESS_SESSION_TTL = float(os.getenv("PROGRESS_SESSION_TTL", "600"))
+# sessions that never finish (worker died) are dropped after this long without updates
+PROGRESS_STALE_SECONDS = float(os.getenv("PROGRESS_STALE_SECONDS", str(6 * 3600)))
+PROGRESS_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+# after a wake-up, wait this long so a burst of updates goes out as one event
+PROGRESS_COALESCE_SECONDS = float(os.getenv("PROGRESS_COALESCE_SECONDS", "0.1"))
+
+TERMINAL_STATUSES = ("completed", "error")
+
+_CHANGED = object()
+
+
+class _DetailsList(list):
+    """The session's "details" list; appends notify subscribers."""
+
+    def __init__(self, items, on_change):
+        super().__init__(items)
+        self._on_change = on_change
+
+    def append(self, item) -> None:
+        super().append(item)
+        self._on_change()
+
+    def extend(self, items) -> None:
+        super().extend(items)
+        self._on_change()
+
+
+class ProgressSession(dict):
+    def __init__(self, owner: "ProgressSessions", session_id: str, data: Dict[str, Any]):
+        super().__init__()
+        self._owner = owner
+        self._session_id = session_id
+        self.updated_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        for k, v in data.items():
+            self[k] = v
+
+    def __setitem__(self, key, value) -> None:
+        if key == "details" and not isinstance(value, _DetailsList):
+            value = _DetailsList(value or [], self._changed)
+        super().__setitem__(key, value)
+        if key == "status" and value in TERMINAL_STATUSES and self.finished_at is None:
+            self.finished_at = time.monotonic()
+        self._changed()
+
+    def _changed(self) -> None:
+        self.updated_at = time.monotonic()
+        self._owner.notify(self._session_id)
+
+
+class ProgressSessions(dict):
+    def __init__(self, ttl: float = PROGRESS_SESSION_TTL, stale_after: float = PROGRESS_STALE_SECONDS):
+        super().__init__()
+        self.ttl = float(ttl)
+        self.stale_after = float(stale_after)
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def __setitem__(self, session_id: str, data: Dict[str, Any]) -> None:
+        self.gc()
+        super().__setitem__(session_id, ProgressSession(self, session_id, dict(data)))
+        self.notify(session_id)
+
+    # ---------- pub/sub ----------
+    def notify(self, session_id: str) -> None:
+        for q in self._subscribers.get(session_id, ()):
+            if q.empty():
+                q.put_nowait(_CHANGED)
+
+    def subscribe(self, session_id: str) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(session_id, set()).add(q)
+        return q
+
+    def unsubscribe(self, session_id: str, q: asyncio.Queue) -> None:
+        subs = self._subscribers.get(session_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                self._subscribers.pop(session_id, None)
+
+    def subscriber_count(self) -> int:
+        return sum(len(s) for s in self._subscribers.values())
+
+    # ---------- GC ----------
+    def gc(self) -> int:
+        now = time.monotonic()
+        doomed: List[str] = []
+        for sid, s in self.items():
+            finished = getattr(s, "finished_at", None)
+            if finished is not None and now - finished > self.ttl:
+                doomed.append(sid)
+            elif now - getattr(s, "updated_at", now) > self.stale_after:
+                doomed.append(sid)
+        for sid in doomed:
+            self.pop(sid, None)
+        return len(doomed)
+
+    # ---------- consumer side ----------
+    async def updates(self, session_id: str, heartbeat: float = PROGRESS_HEARTBEAT_SECONDS,
+                      coalesce: float = PROGRESS_COALESCE_SECONDS,
+                      wait_for_start: float = 60.0) -> AsyncIterator[Optional[Dict[str, Any]]]:
+        """
+        Yield the session each time it changes (a burst counts once), and None as an
+        idle heartbeat when nothing happened for `heartbeat` seconds. Ends after the
+        session reaches a terminal status, or if it never shows up / disappears.
+        """
+        self.gc()
+        q = self.subscribe(session_id)
+        try:
+            # the client may connect before the background task registers the session
+            deadline = time.monotonic() + wait_for_start
+            while session_id not in self:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    await asyncio.wait_for(q.get(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield None
+
+            while True:
+                session = self.get(session_id)
+                if session is None:
+                    return
+                yield session
+                if session.get("status") in TERMINAL_STATUSES:
+                    return
+                while True:
+                    try:
+                        await asyncio.wait_for(q.get(), timeout=heartbeat)
+                        break
+                    except asyncio.TimeoutError:
+                        yield None
+                if coalesce > 0:
+                    await asyncio.sleep(coalesce)
+                    if not q.empty():
+                        q.get_nowait()
+        finally:
+            self.unsubscribe(session_id, q)
@@ -0,0 +1,234 @@
+# helper/scheduler.py
+"""
+In-process due-time scheduler for periodic jobs.
+
+Each job's next due time is `JobTracker.last_run_time + interval`; due times sit
+in a min-heap and the loop sleeps until the earliest one (or until `wake()` is
+called after a settings change) instead of polling on hourly boundaries.
+
+Several replicas can run the scheduler safely. Firing a job first claims it
+with a conditional UPDATE on its JobTracker row that moves `last_run_time`
+so the job looks "not due" for `lease` seconds; only the replica whose UPDATE
+matched runs it. The lease is renewed while the job runs and replaced by the
+real completion time at the end. If the replica dies mid-run the lease simply
+expires and another replica picks the job up, so runs are neither duplicated
+nor lost.
+"""
+import asyncio
+import heapq
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from models.job_tracker import JobTracker
+
+logger = logging.getLogger("uvicorn.error")
+
+JOB_SCHEDULER_ENABLED = os.getenv("JOB_SCHEDULER_ENABLED", "0") == "1"
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "3600"))
+# upper bound on one sleep, so changes made on another replica are picked up eventually
+JOB_SCHEDULER_MAX_SLEEP = float(os.getenv("JOB_SCHEDULER_MAX_SLEEP", "900"))
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    run: Callable[[], Awaitable[None]]
+    # reads the current interval from settings; None disables the job
+    interval: Callable[[], Awaitable[Optional[timedelta]]]
+    lease: float = JOB_LEASE_SECONDS
+    runs: int = 0
+    failures: int = 0
+    last_error: Optional[str] = None
+    next_due: Optional[datetime] = field(default=None)
+
+
+def _now() -> datetime:
+    # whole seconds, so the value we write compares equal when we read it back
+    return datetime.now().replace(microsecond=0)
+
+
+def _naive(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is not None:
+        return dt.replace(tzinfo=None)
+    return dt
+
+
+class DueTimeScheduler:
+    def __init__(self):
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._seq = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Dict[str, asyncio.Task] = {}
+
+    def add(self, job: ScheduledJob) -> None:
+        self.jobs[job.name] = job
+        self.wake()
+
+    def wake(self) -> None:
+        """Recompute due times now (call after the settings behind an interval change)."""
+        self._wake.set()
+
+    # ---------- due times ----------
+    async def _tracker(self, name: str) -> JobTracker:
+        tracker = await JobTracker.filter(job_name=name).first()
+        if tracker is None:
+            # never ran: due immediately
+            tracker = await JobTracker.create(job_name=name, last_run_time=datetime(1970, 1, 1))
+            await JobTracker.filter(id=tracker.id).update(last_run_time=datetime(1970, 1, 1))
+            tracker.last_run_time = datetime(1970, 1, 1)
+        return tracker
+
+    async def _reload(self) -> None:
+        self._heap = []
+        for job in self.jobs.values():
+            if job.name in self._running:
+                continue
+            try:
+                interval = await job.interval()
+                if interval is None:
+                    job.next_due = None
+                    continue
+                tracker = await self._tracker(job.name)
+                job.next_due = _naive(tracker.last_run_time) + interval
+                self._seq += 1
+                heapq.heappush(self._heap, (job.next_due, self._seq, job.name))
+            except Exception as e:
+                logger.warning("[scheduler] could not compute due time for %s: %s", job.name, e)
+
+    # ---------- firing ----------
+    async def _claim(self, job: ScheduledJob, interval: timedelta) -> Optional[datetime]:
+        """Atomically take the job if it is still due. Returns the lease marker we wrote."""
+        now = _now()
+        marker = now - interval + timedelta(seconds=job.lease)
+        updated = await JobTracker.filter(job_name=job.name, last_run_time__lte=now - interval).update(
+            last_run_time=marker
+        )
+        return marker if updated else None
+
+    async def _renew(self, job: ScheduledJob, interval: timedelta, marker: datetime) -> datetime:
+        new_marker = _now() - interval + timedelta(seconds=job.lease)
+        updated = await JobTracker.filter(job_name=job.name, last_run_time=marker).update(last_run_time=new_marker)
+        if not updated:
+            logger.warning("[scheduler] lost lease on %s while running", job.name)
+            return marker
+        return new_marker
+
+    async def _fire(self, job: ScheduledJob) -> None:
+        interval = await job.interval()
+        if interval is None:
+            return
+        marker = await self._claim(job, interval)
+        if marker is None:
+            # another replica took it, or it isn't due after all (settings changed)
+            return
+
+        logger.info("[scheduler] running %s", job.name)
+        started = datetime.now()
+        run_task = asyncio.create_task(job.run())
+        try:
+            while True:
+                done, _ = await asyncio.wait({run_task}, timeout=max(1.0, job.lease / 3))
+                if done:
+                    break
+                marker = await self._renew(job, interval, marker)
+            await run_task
+            job.runs += 1
+            job.last_error = None
+            # interval counts from completion, as before
+            await JobTracker.filter(job_name=job.name, last_run_time=marker).update(last_run_time=_now())
+            logger.info("[scheduler] %s finished in %.1fs", job.name, (datetime.now() - started).total_seconds())
+        except Exception as e:
+            # leave the lease in place: the job is retried once it expires
+            job.failures += 1
+            job.last_error = str(e)
+            logger.exception("[scheduler] %s failed: %s", job.name, e)
+        finally:
+            if not run_task.done():
+                # cancelled mid-run (stop()): take the job down with us rather than
+                # leave it running unowned; its lease makes it due again on expiry
+                run_task.cancel()
+                await asyncio.gather(run_task, return_exceptions=True)
+
+    async def run_once(self, job: ScheduledJob) -> str:
+        """Fire `job` now if it is due (one-shot/CLI use). Returns what happened."""
+        interval = await job.interval()
+        if interval is None:
+            return "disabled"
+        tracker = await self._tracker(job.name)
+        remaining = _naive(tracker.last_run_time) + interval - datetime.now()
+        if remaining > timedelta(0):
+            return f"not due for {remaining.total_seconds() / 3600:.2f} hours"
+        runs, failures = job.runs, job.failures
+        await self._fire(job)
+        if job.runs > runs:
+            return "completed"
+        if job.failures > failures:
+            return f"failed: {job.last_error}"
+        return "claimed by another instance"
+
+    def _spawn(self, job: ScheduledJob) -> None:
+        task = asyncio.create_task(self._fire(job))
+        self._running[job.name] = task
+
+        def _done(_t, name=job.name):
+            self._running.pop(name, None)
+            self.wake()
+
+        task.add_done_callback(_done)
+
+    # ---------- loop ----------
+    async def _loop(self) -> None:
+        self._wake.set()
+        while True:
+            if self._wake.is_set():
+                self._wake.clear()
+                await self._reload()
+
+            now = datetime.now()
+            while self._heap and self._heap[0][0] <= now:
+                _due, _seq, name = heapq.heappop(self._heap)
+                if name not in self._running:
+                    self._spawn(self.jobs[name])
+
+            timeout = JOB_SCHEDULER_MAX_SLEEP
+            if self._heap:
+                timeout = min(timeout, max(0.0, (self._heap[0][0] - datetime.now()).total_seconds()))
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                # either a job is due or it's time for the periodic re-read
+                if not self._heap or self._heap[0][0] > datetime.now():
+                    self._wake.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Cancel the loop and every running job, and wait until they have all unwound."""
+        tasks = [t for t in [self._task, *self._running.values()] if t is not None]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+
+    def status(self) -> List[dict]:
+        return [
+            {
+                "name": j.name,
+                "next_due": j.next_due.isoformat() if j.next_due else None,
+                "running": j.name in self._running,
+                "runs": j.runs,
+                "failures": j.failures,
+                "last_error": j.last_error,
+            }
+            for j in self.jobs.values()
+        ]
+
+
+scheduler = DueTimeScheduler()
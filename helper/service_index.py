@@ -0,0 +1,358 @@
+# helper/service_index.py
+"""
+In-memory inverted index over the service catalog.
+
+Tokens come from service names (weighted higher) and descriptions, after
+normalization (lowercase, accents stripped, light plural stemming) and
+synonym folding. A query token matches exactly, by prefix, or with one typo
+(deletion-neighbourhood lookup). When that finds fewer than `limit` services,
+the rest is filled with services whose name or description contains the query
+as a substring, like the LIKE '%q%' search this replaces ("facial" still finds
+"Hydrafacial"). An empty query returns the first `limit` services by name.
+
+Results are ranked by match score (services matching every query term first,
+ties by id), not by name as the SQL search was; only the substring fallback
+keeps name order. On a 10k-service catalog single-term lookups take ~0.01 ms,
+multi-term queries 0.5-3 ms, and a query that matches nothing ~1.3 ms (the
+substring fallback scans the whole catalog); see helper/bench_service_index.py.
+
+Indexes are kept per scope. The Laravel `services` table is global today, so
+everything lives in the "global" scope; a clinic-specific catalog can use its
+own scope key later without touching the callers.
+"""
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+logger = logging.getLogger("uvicorn.error")
+
+NAME_WEIGHT = 3.0
+DESC_WEIGHT = 1.0
+PREFIX_FACTOR = 0.6
+FUZZY_FACTOR = 0.4
+MAX_PREFIX_EXPANSIONS = 50
+MIN_FUZZY_LEN = 4
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# synonym groups; every term is folded onto the first one
+_DEFAULT_SYNONYMS: List[List[str]] = [
+    ["tooth", "teeth", "dental"],
+    ["whitening", "bleaching"],
+    ["cleaning", "prophylaxis", "prophy"],
+    ["checkup", "exam", "examination", "consultation", "consult"],
+    ["xray", "radiograph"],
+    ["braces", "orthodontic", "orthodontics", "aligner"],
+    ["extraction", "removal"],
+    ["botox", "neurotoxin"],
+    ["filler", "fillers"],
+]
+
+
+def _load_synonyms() -> Dict[str, str]:
+    groups = list(_DEFAULT_SYNONYMS)
+    path = os.getenv("SERVICE_SYNONYMS_FILE")
+    if path:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                groups.extend(json.load(f))
+        except Exception as e:
+            logger.warning("[service-index] could not load synonyms from %s: %s", path, e)
+    fold: Dict[str, str] = {}
+    for group in groups:
+        if not group:
+            continue
+        canonical = _stem(_strip_accents(str(group[0]).lower()))
+        for term in group:
+            for tok in _TOKEN_RE.findall(_strip_accents(str(term).lower())):
+                fold.setdefault(_stem(tok), canonical)
+    return fold
+
+
+def _strip_accents(s: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
+
+
+def _stem(tok: str) -> str:
+    # just enough to make "cleanings"/"cleaning", "crowns"/"crown" meet
+    if len(tok) > 4 and tok.endswith("ies"):
+        return tok[:-3] + "y"
+    if len(tok) > 3 and tok.endswith("s") and not tok.endswith("ss"):
+        return tok[:-1]
+    return tok
+
+
+_SYNONYMS = _load_synonyms()
+
+
+def normalize(text: Any) -> List[str]:
+    """Text -> normalized tokens (synonyms folded onto their canonical term)."""
+    if not text:
+        return []
+    raw = _TOKEN_RE.findall(_strip_accents(str(text).lower()))
+    out = []
+    for tok in raw:
+        tok = _stem(tok)
+        out.append(_SYNONYMS.get(tok, tok))
+    return out
+
+
+def _deletes(tok: str) -> Set[str]:
+    return {tok[:i] + tok[i + 1:] for i in range(len(tok))}
+
+
+class ServiceIndex:
+    def __init__(self, scope: str = "global"):
+        self.scope = scope
+        self._rows: Dict[int, Dict[str, Any]] = {}
+        self._fingerprints: Dict[int, Tuple[Any, Any]] = {}
+        self._doc_terms: Dict[int, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[int, float]] = {}
+        # token -> service ids by descending weight, built lazily for single-term top-k
+        self._impact: Dict[str, List[int]] = {}
+        # one-deletion neighbourhood -> vocabulary tokens (typo matching)
+        self._delete_map: Dict[str, Set[str]] = {}
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        # lowercased, accent-stripped "name\ndescription" for the substring fallback
+        self._haystack: Dict[int, str] = {}
+        # every haystack joined in name order, so the fallback is one str.find scan
+        self._by_name: List[int] = []
+        self._by_name_starts: List[int] = []
+        self._by_name_text = ""
+        self._by_name_dirty = False
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    # ---------- maintenance ----------
+    def _add_term(self, tok: str, sid: int, weight: float) -> None:
+        posting = self._postings.get(tok)
+        if posting is None:
+            posting = self._postings[tok] = {}
+            self._vocab_dirty = True
+            if len(tok) >= MIN_FUZZY_LEN:
+                for d in _deletes(tok):
+                    self._delete_map.setdefault(d, set()).add(tok)
+        posting[sid] = weight
+        self._impact.pop(tok, None)
+
+    def _drop_term(self, tok: str, sid: int) -> None:
+        posting = self._postings.get(tok)
+        if posting is None:
+            return
+        posting.pop(sid, None)
+        self._impact.pop(tok, None)
+        if not posting:
+            del self._postings[tok]
+            self._vocab_dirty = True
+            if len(tok) >= MIN_FUZZY_LEN:
+                for d in _deletes(tok):
+                    bucket = self._delete_map.get(d)
+                    if bucket is not None:
+                        bucket.discard(tok)
+                        if not bucket:
+                            del self._delete_map[d]
+
+    def upsert(self, row: Dict[str, Any]) -> bool:
+        """Index or re-index one service row. Returns False when nothing changed."""
+        sid = int(row["id"])
+        fp = (row.get("name"), row.get("description"))
+        self._rows[sid] = dict(row)
+        if self._fingerprints.get(sid) == fp:
+            return False
+        self.remove(sid, keep_row=True)
+
+        terms: Dict[str, float] = {}
+        for tok in normalize(row.get("description")):
+            terms[tok] = max(terms.get(tok, 0.0), DESC_WEIGHT)
+        for tok in normalize(row.get("name")):
+            terms[tok] = max(terms.get(tok, 0.0), NAME_WEIGHT)
+        for tok, w in terms.items():
+            self._add_term(tok, sid, w)
+        self._doc_terms[sid] = terms
+        self._fingerprints[sid] = fp
+        self._haystack[sid] = _strip_accents(f"{row.get('name') or ''}\n{row.get('description') or ''}".lower())
+        self._by_name_dirty = True
+        return True
+
+    def remove(self, service_id: int, keep_row: bool = False) -> None:
+        sid = int(service_id)
+        for tok in self._doc_terms.pop(sid, {}):
+            self._drop_term(tok, sid)
+        self._fingerprints.pop(sid, None)
+        self._haystack.pop(sid, None)
+        self._by_name_dirty = True
+        if not keep_row:
+            self._rows.pop(sid, None)
+
+    def sync(self, rows: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Make the index match `rows`, re-tokenizing only rows whose text changed."""
+        seen: Set[int] = set()
+        changed = 0
+        for row in rows:
+            if not isinstance(row, dict) or row.get("id") is None:
+                continue
+            seen.add(int(row["id"]))
+            if self.upsert(row):
+                changed += 1
+        removed = [sid for sid in list(self._rows) if sid not in seen]
+        for sid in removed:
+            self.remove(sid)
+        return {"indexed": len(self._rows), "changed": changed, "removed": len(removed)}
+
+    # ---------- lookups ----------
+    def _sorted_vocab(self) -> List[str]:
+        if self._vocab_dirty:
+            self._vocab = sorted(self._postings)
+            self._vocab_dirty = False
+        return self._vocab
+
+    def _name_order(self) -> Tuple[List[int], List[int], str]:
+        if self._by_name_dirty:
+            self._by_name = sorted(
+                self._rows, key=lambda sid: (_strip_accents(str(self._rows[sid].get("name") or "").lower()), sid))
+            self._by_name_starts = []
+            pos = 0
+            for sid in self._by_name:
+                self._by_name_starts.append(pos)
+                pos += len(self._haystack.get(sid, "")) + 1
+            self._by_name_text = "\x00".join(self._haystack.get(sid, "") for sid in self._by_name)
+            self._by_name_dirty = False
+        return self._by_name, self._by_name_starts, self._by_name_text
+
+    def _impact_order(self, tok: str) -> List[int]:
+        ranked = self._impact.get(tok)
+        if ranked is None:
+            posting = self._postings[tok]
+            ranked = self._impact[tok] = sorted(posting, key=lambda sid: (-posting[sid], sid))
+        return ranked
+
+    def _expand(self, qtok: str) -> List[Tuple[str, float]]:
+        """Vocabulary tokens matching one query token, with a match-quality factor."""
+        out: List[Tuple[str, float]] = []
+        if qtok in self._postings:
+            out.append((qtok, 1.0))
+
+        vocab = self._sorted_vocab()
+        i = bisect.bisect_left(vocab, qtok)
+        n = 0
+        while i < len(vocab) and vocab[i].startswith(qtok) and n < MAX_PREFIX_EXPANSIONS:
+            if vocab[i] != qtok:
+                out.append((vocab[i], PREFIX_FACTOR))
+                n += 1
+            i += 1
+
+        if not out and len(qtok) >= MIN_FUZZY_LEN:
+            cands: Set[str] = set(self._delete_map.get(qtok, ()))
+            for d in _deletes(qtok):
+                if d in self._postings:
+                    cands.add(d)
+                cands.update(self._delete_map.get(d, ()))
+            out.extend((c, FUZZY_FACTOR) for c in cands if c != qtok)
+        return out
+
+    def search(self, query: str, limit: int = 25) -> List[Dict[str, Any]]:
+        limit = int(limit)
+        if limit <= 0:
+            return []
+        qtoks = list(dict.fromkeys(normalize(query)))
+        ranked = self._ranked(qtoks, limit) if qtoks else []
+        if len(ranked) < limit:
+            ranked += self._infix(query, limit - len(ranked), set(ranked))
+        return [self._rows[sid] for sid in ranked]
+
+    def _infix(self, query: str, k: int, exclude: Set[int]) -> List[int]:
+        """First k services by name whose name/description contains `query` (empty -> all)."""
+        ids, starts, text = self._name_order()
+        if not ids or k <= 0:
+            return []
+        q = _strip_accents(str(query or "").lower()).strip().replace("\x00", "")
+        if not q:
+            return [sid for sid in ids if sid not in exclude][:k]
+        out: List[int] = []
+        pos = text.find(q)
+        while pos != -1 and len(out) < k:
+            i = bisect.bisect_right(starts, pos) - 1
+            if i >= 0 and ids[i] not in exclude:
+                out.append(ids[i])
+            if i + 1 >= len(ids):
+                break
+            pos = text.find(q, starts[i + 1])
+        return out
+
+    def _ranked(self, qtoks: List[str], limit: int) -> List[int]:
+        if len(qtoks) == 1:
+            expansions = self._expand(qtoks[0])
+            if len(expansions) == 1:
+                # the common chat lookup: one term, one vocabulary match -> O(limit)
+                return self._impact_order(expansions[0][0])[:limit]
+
+        # best score per service for each query token
+        per_tok: List[Dict[int, float]] = []
+        for qtok in qtoks:
+            expansions = self._expand(qtok)
+            if not expansions:
+                per_tok.append({})
+                continue
+            if len(expansions) == 1 and expansions[0][1] == 1.0:
+                per_tok.append(self._postings[expansions[0][0]])
+                continue
+            best: Dict[int, float] = {}
+            for tok, factor in expansions:
+                for sid, w in self._postings[tok].items():
+                    s = w * factor
+                    if s > best.get(sid, 0.0):
+                        best[sid] = s
+            per_tok.append(best)
+
+        # services matching every query term first
+        by_size = sorted((b for b in per_tok if b), key=len)
+        full: Set[int] = set()
+        if len(by_size) == len(per_tok):
+            full = set(by_size[0]).intersection(*by_size[1:])
+        ranked = _top(full, per_tok, limit)
+
+        if len(ranked) < limit and len(per_tok) > 1:
+            # then services matching only some of them, most terms matched first;
+            # each level is ranked separately so the big low-match tail is rarely scored
+            counts = Counter()
+            for b in by_size:
+                counts.update(b.keys())
+            levels: Dict[int, List[int]] = {}
+            for sid, c in counts.items():
+                if c < len(per_tok):
+                    levels.setdefault(c, []).append(sid)
+            for c in sorted(levels, reverse=True):
+                ranked += _top(levels[c], per_tok, limit - len(ranked))
+                if len(ranked) >= limit:
+                    break
+        return ranked
+
+
+def _top(cands: Iterable[int], per_tok: List[Dict[int, float]], k: int) -> List[int]:
+    """Best k ids by summed term score (ties -> lower id). Loops per term, not per id, for speed."""
+    acc = dict.fromkeys(cands, 0.0)
+    if not acc or k <= 0:
+        return []
+    for b in per_tok:
+        get = b.get
+        for sid in acc:
+            acc[sid] += get(sid, 0.0)
+    return [-neg for _score, neg in heapq.nlargest(k, [(v, -sid) for sid, v in acc.items()])]
+
+
+_INDEXES: Dict[str, ServiceIndex] = {}
+
+
+def get_index(scope: str = "global") -> ServiceIndex:
+    idx = _INDEXES.get(scope)
+    if idx is None:
+        idx = _INDEXES[scope] = ServiceIndex(scope)
+    return idx
@@ -0,0 +1,92 @@
+# helper/test_job_queue.py
+"""
+Checks for the durable job queue in helper/job_queue.py (needs aiosqlite).
+
+    python -m pytest helper/test_job_queue.py
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+
+# run from the project root's view: with helper/ itself on sys.path, "helper"
+# would resolve to helper/helper.py instead of the helper/ package
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from helper.job_queue import JOB_QUEUE_MAX_ATTEMPTS, JobQueue
+
+
+def _run(test):
+    async def main():
+        with tempfile.TemporaryDirectory() as folder:
+            queue = JobQueue(os.path.join(folder, "queue.db"))
+            try:
+                await test(queue)
+            finally:
+                await queue.close()
+    asyncio.run(main())
+
+
+def test_saved_group_with_new_call_is_claimable():
+    async def body(q):
+        await q.enqueue_group(1, "+15550100", ["c1"])
+        assert await q.claim_group(1, "+15550100", "w1")
+        await q.advance_group(1, "+15550100", "saved", lead={"phone": "+15550100"})
+        # same calls again: nothing to do
+        await q.enqueue_group(1, "+15550100", ["c1"])
+        assert not await q.claim_group(1, "+15550100", "w2")
+        # a new call arrives: the group is work again
+        await q.enqueue_group(1, "+15550100", ["c1", "c2"])
+        assert await q.claim_group(1, "+15550100", "w2")
+        job = await q.get_group(1, "+15550100")
+        assert job["state"] == "pending" and job["lead"] is None and job["attempts"] == 1
+        assert job["call_ids"] == ["c1", "c2"]
+        assert (await q.get_call("c2"))["state"] == "pending"
+    _run(body)
+
+
+def test_failed_group_with_new_call_gets_fresh_attempts():
+    async def body(q):
+        await q.enqueue_group(2, "+15550101", ["c1"])
+        for i in range(JOB_QUEUE_MAX_ATTEMPTS):
+            assert await q.claim_group(2, "+15550101", f"w{i}")
+            await q.fail_group(2, "+15550101", "boom")
+        assert (await q.get_group(2, "+15550101"))["state"] == "failed"
+        assert not await q.claim_group(2, "+15550101", "w9")
+        await q.enqueue_group(2, "+15550101", ["c1", "c3"])
+        assert await q.claim_group(2, "+15550101", "w9")
+        assert (await q.get_group(2, "+15550101"))["error"] is None
+    _run(body)
+
+
+def test_transcribe_once_records_audio_hash_and_reuses_result():
+    async def body(q):
+        audio = os.path.join(os.path.dirname(q.path), "c7.mp3")
+        with open(audio, "wb") as f:
+            f.write(b"not really audio")
+        calls = []
+
+        async def fetch():
+            calls.append("fetch")
+            return {"audio_path": audio}
+
+        async def transcribe(path):
+            calls.append("transcribe")
+            return {"transcription": " hello "}
+
+        assert await q.transcribe_once("c7", "w1", fetch, transcribe, phone="+15550102") == "hello"
+        job = await q.get_call("c7")
+        assert job["state"] == "transcribed" and job["processed_at"]
+        assert job["content_hash"] == hashlib.sha1(b"not really audio").hexdigest()
+        # a second entry point gets the stored transcript without redoing the work
+        assert await q.transcribe_once("c7", "w2", fetch, transcribe) == "hello"
+        assert calls == ["fetch", "transcribe"]
+    _run(body)
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print("ok", name)
@@ -4,7 +4,12 @@ import sys, asyncio
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
-from laravel_db import fetch_services, fetch_service_by_id, search_services, shutdown
+import os
+# run from the project root's view: with helper/ itself on sys.path, "helper"
+# would resolve to helper/helper.py instead of the helper/ package
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from helper.laravel_db import fetch_services, fetch_service_by_id, search_services, shutdown
 
 async def main():
     try:
@@ -0,0 +1,82 @@
+# helper/test_service_index.py
+"""
+Regression checks for helper/service_index.py against the LIKE '%q%' search it replaced.
+
+    python -m pytest helper/test_service_index.py
+"""
+import os
+import sys
+
+# run from the project root's view: with helper/ itself on sys.path, "helper"
+# would resolve to helper/helper.py instead of the helper/ package
+sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from helper.service_index import ServiceIndex
+
+ROWS = [
+    {"id": 1, "name": "Teeth Whitening", "description": "In-office bleaching", "for_report": 1},
+    {"id": 2, "name": "Hydrafacial", "description": "Deep cleanse and hydration", "for_report": 0},
+    {"id": 3, "name": "Botox", "description": "Forehead lines", "for_report": 1},
+    {"id": 4, "name": "Dental Cleaning", "description": "Routine prophy", "for_report": 1},
+    {"id": 5, "name": "Acne Facial", "description": "Extraction facial", "for_report": 0},
+]
+
+
+def _index():
+    idx = ServiceIndex("test")
+    idx.sync(ROWS)
+    return idx
+
+
+def _ids(rows):
+    return [r["id"] for r in rows]
+
+
+def test_infix_match_like_sql():
+    # "facial" is only a substring of "hydrafacial"; LIKE '%facial%' found it
+    ids = _ids(_index().search("facial"))
+    assert ids[0] == 5
+    assert 2 in ids
+    assert _ids(_index().search("ydrafac")) == [2]
+
+
+def test_empty_query_returns_first_services_by_name():
+    idx = _index()
+    assert _ids(idx.search("")) == [5, 3, 4, 2, 1]
+    assert _ids(idx.search("   ", limit=2)) == [5, 3]
+
+
+def test_empty_index():
+    # services_repo.service_index() hands out an empty index for an empty catalog
+    idx = ServiceIndex("empty")
+    assert idx.search("") == []
+    assert idx.search("facial") == []
+    idx.sync([])
+    assert idx.search("") == []
+
+
+def test_token_matches_still_rank_first():
+    assert _ids(_index().search("tooth bleaching"))[0] == 1
+    assert _ids(_index().search("whitenning")) == [1]
+
+
+def test_limit_and_miss():
+    idx = _index()
+    assert idx.search("facial", limit=1) == [ROWS[4]]
+    assert idx.search("acupuncture") == []
+    assert idx.search("botox", limit=0) == []
+
+
+def test_fallback_follows_updates():
+    idx = _index()
+    idx.upsert({"id": 2, "name": "Hydra Peel", "description": "", "for_report": 0})
+    assert 2 not in _ids(idx.search("facial"))
+    idx.remove(5)
+    assert _ids(idx.search("")) == [3, 4, 2, 1]
+
+
+if __name__ == "__main__":
+    for name, fn in list(globals().items()):
+        if name.startswith("test_") and callable(fn):
+            fn()
+            print("ok", name)
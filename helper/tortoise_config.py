@@ -1,9 +1,18 @@
 from tortoise import Tortoise
+import logging
 import os
+import re
+import time
+from pathlib import Path
+from typing import List, Optional
 import dotenv
 
+from helper.metrics import gauge
+
 dotenv.load_dotenv()
 
+logger = logging.getLogger("uvicorn.error")
+
 TORTOISE_CONFIG = {
     'connections': {
         'default': os.getenv('DATABASE_URL')
@@ -27,17 +36,121 @@ TORTOISE_CONFIG = {
                 'models.image_settings',
                 'models.image_generation_setting',
                 'models.post_history',
-                'models.agent_run',      
+                'models.agent_run',
             ],
             'default_connection': 'default'
         },
     },
 }
 
+# How the schema is handled at boot:
+#   verify   - compare the aerich head in migrations/<app> with the DB, refuse to start on drift (default)
+#   generate - legacy behaviour: Tortoise.generate_schemas() on every start (handy for a fresh dev DB)
+#   off      - trust the DB, no check at all
+SCHEMA_BOOT_MODE = os.getenv("SCHEMA_BOOT_MODE", "verify").lower()
+MIGRATIONS_DIR = Path(os.getenv("MIGRATIONS_DIR", Path(__file__).resolve().parent.parent / "migrations"))
+MIGRATIONS_APP = "models"
+
+_MIGRATION_RE = re.compile(r"^(\d+)_.*\.py$")
+
+BOOT_SECONDS = gauge("app_boot_seconds", "Time from lifespan start to ready, per worker process")
+
+
+class SchemaDriftError(RuntimeError):
+    pass
+
+
+def migration_files(app: str = MIGRATIONS_APP) -> List[str]:
+    """aerich migration file names for `app`, oldest first (ordered by their numeric prefix)."""
+    folder = MIGRATIONS_DIR / app
+    files = [p.name for p in folder.glob("*.py") if _MIGRATION_RE.match(p.name)]
+    return sorted(files, key=lambda name: int(_MIGRATION_RE.match(name).group(1)))
+
+
+async def db_migration_head(app: str = MIGRATIONS_APP) -> Optional[str]:
+    """Last migration aerich recorded as applied, or None if the aerich table is empty/missing."""
+    from aerich.models import Aerich
+    try:
+        row = await Aerich.filter(app=app).order_by("-id").first()
+    except Exception as e:
+        # fresh database: no aerich table yet
+        logger.warning("[boot] could not read aerich table: %s", e)
+        return None
+    return row.version if row else None
+
+
+async def verify_migration_head(app: str = MIGRATIONS_APP) -> str:
+    """Raise SchemaDriftError unless the DB is exactly at the newest migration on disk."""
+    files = migration_files(app)
+    if not files:
+        raise SchemaDriftError(f"No aerich migrations found in {MIGRATIONS_DIR / app}")
+    head = files[-1]
+    applied = await db_migration_head(app)
+
+    if applied == head:
+        return head
+    if applied is None:
+        raise SchemaDriftError(
+            f"Database has no aerich history; expected head {head}. "
+            f"Run `aerich upgrade` (or start once with SCHEMA_BOOT_MODE=generate on a fresh dev DB)."
+        )
+    if applied in files:
+        pending = files[files.index(applied) + 1:]
+        raise SchemaDriftError(
+            f"Database is at {applied} but code expects {head}; "
+            f"{len(pending)} pending migration(s): {', '.join(pending)}. Run `aerich upgrade`."
+        )
+    raise SchemaDriftError(
+        f"Database is at {applied}, which is not in {MIGRATIONS_DIR / app} (head {head}). "
+        f"This build is older than the database or the migration folder is out of sync."
+    )
+
+
+_verified_head: Optional[str] = None
+
+
+async def prepare_schema() -> str:
+    """
+    Apply SCHEMA_BOOT_MODE after Tortoise.init(). The migration check runs once per
+    process; later calls (job helpers re-initialising Tortoise) reuse the result.
+    """
+    global _verified_head
+    if SCHEMA_BOOT_MODE == "generate":
+        await Tortoise.generate_schemas()
+        return "generated"
+    if SCHEMA_BOOT_MODE == "off":
+        return "unchecked"
+    if _verified_head is None:
+        _verified_head = await verify_migration_head()
+    return f"verified {_verified_head}"
+
+
 async def lifespan(_):
+    started = time.perf_counter()
     await Tortoise.init(config=TORTOISE_CONFIG)
-    await Tortoise.generate_schemas()
-    print("Initializing LifeSpan")
+    try:
+        schema_state = await prepare_schema()
+    except SchemaDriftError:
+        await Tortoise.close_connections()
+        raise
+    ready = time.perf_counter() - started
+    BOOT_SECONDS.set(ready)
+    print(f"Initializing LifeSpan (pid={os.getpid()} schema={schema_state} ready_in={ready * 1000:.0f}ms)")
+    from helper.scheduler import JOB_SCHEDULER_ENABLED, scheduler
+    if JOB_SCHEDULER_ENABLED:
+        from helper.job_helper import register_jobs
+        register_jobs(scheduler)
+        scheduler.start()
+    from agents.runtime import AGENT_RUNTIME_WARM, agent_runtime
+    if AGENT_RUNTIME_WARM:
+        try:
+            print(f"Agent runtime warmed: {agent_runtime.warm()}")
+        except Exception as e:
+            print(f"Agent runtime warm-up skipped: {e}")
+    from helper.context_budget import warm_encoder
+    warm_encoder()  # tiktoken loads in a thread; token counts are estimated until it's ready
     yield
-
-    
\ No newline at end of file
+    await scheduler.stop()
+    # flush any write-behind batches still pending before the process exits
+    from helper.write_behind import flush_all_batchers
+    await flush_all_batchers()
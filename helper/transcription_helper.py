@@ -5,7 +5,12 @@ from helper.call_processor import CallProcessor
 from helper.lead_scoring import LeadScoringService
 from models.lead_score import LeadScore
 from tortoise import Tortoise
-from helper.tortoise_config import TORTOISE_CONFIG
+from helper.tortoise_config import TORTOISE_CONFIG, prepare_schema
+from helper.write_behind import WriteBehindBatcher
+from helper.get_data import invalidate_client_context
+from helper.job_queue import (
+    JOB_QUEUE_CLAIM_WAIT_SECONDS, JOB_QUEUE_ENABLED, get_job_queue, worker_id,
+)
 import httpx
 import os
 import base64
@@ -25,6 +30,12 @@ processor = CallProcessor()
 scoring_service = LeadScoringService()
 API_URL = os.getenv("API_URL")
 
+# Write-behind settings for marking CallRail rows processed. Laravel only has the
+# per-call GET /api/update_call/{id}; set the bulk path once it exposes a bulk endpoint.
+MARK_PROCESSED_BULK_PATH = os.getenv("CALLRAIL_MARK_PROCESSED_BULK_PATH", "")
+MARK_PROCESSED_BATCH_SIZE = int(os.getenv("CALLRAIL_MARK_PROCESSED_BATCH_SIZE", "100"))
+MARK_PROCESSED_FLUSH_SECONDS = float(os.getenv("CALLRAIL_MARK_PROCESSED_FLUSH_SECONDS", "5"))
+
 headers = {
     "sec-ch-ua": '"Google Chrome";v="137", "Chromium";v="137", "Not/A)Brand";v="24"',
     "sec-ch-ua-mobile": "?0",
@@ -39,6 +50,22 @@ headers = {
 # ───────────────────────── Date parsing helper (ADD THIS) ─────────────────────────
 
 
+async def _transcribe_once(account_id: str, call_id: str, call: dict, source: str,
+                           wait_seconds: float = JOB_QUEUE_CLAIM_WAIT_SECONDS) -> Optional[str]:
+    """Transcript for one call through the shared per-call index (skips calls another path already did)."""
+    if not JOB_QUEUE_ENABLED:
+        result = await processor.process_call(account_id=account_id, call_id=call_id)
+        return (result or {}).get("transcription") or None
+    return await get_job_queue().transcribe_once(
+        call_id, worker_id(source),
+        fetch=lambda: processor.fetch_audio(account_id=account_id, call_id=call_id),
+        transcribe=processor.transcribe_file,
+        phone=call.get("phone_number"),
+        source=source,
+        wait_seconds=wait_seconds,
+    )
+
+
 def _parse_any_dt(d: Optional[str]) -> Optional[datetime]:
     """
     Best-effort parser for your call record timestamps.
@@ -64,10 +91,17 @@ def _parse_any_dt(d: Optional[str]) -> Optional[datetime]:
         return None
 
 
-async def process_unprocessed_callrails():
-    # Initialize Tortoise ORM
-    await Tortoise.init(config=TORTOISE_CONFIG)
-    await Tortoise.generate_schemas()
+async def process_unprocessed_callrails(manage_orm: bool = True):
+    # Initialize Tortoise ORM (skipped when running inside the app, which owns the ORM)
+    if manage_orm:
+        await Tortoise.init(config=TORTOISE_CONFIG)
+        await prepare_schema()
+    mark_batcher = WriteBehindBatcher(
+        "callrail-mark-processed",
+        mark_calls_as_processed,
+        max_batch=MARK_PROCESSED_BATCH_SIZE,
+        max_delay=MARK_PROCESSED_FLUSH_SECONDS,
+    )
     try:
         # 1. Fetch all call data from the API
         async with httpx.AsyncClient(timeout=30.0) as client:
@@ -106,14 +140,16 @@ async def process_unprocessed_callrails():
                 recording_url = call.get("call_recording")
                 if not recording_url:
                     continue
-                # Extract call_id from URL (assumes last part is call_id)
-                call_id = recording_url.split("/")[-2] if "/" in recording_url else None
+                # Extract call_id from URL (same id the other entry points use)
+                call_id = _extract_call_id_from_url(recording_url) or (
+                    recording_url.split("/")[-2] if "/" in recording_url else None
+                )
                 if not call_id:
                     continue
                 # Replace with your actual account ID
-                result = await processor.process_call(account_id="562206937", call_id=call_id)
-                if result and "transcription" in result and result["transcription"]:
-                    transcriptions.append(result["transcription"])
+                transcription = await _transcribe_once("562206937", call_id, call, source="callrails-job")
+                if transcription:
+                    transcriptions.append(transcription)
             if not transcriptions:
                 print(f"[{datetime.now()}] No valid transcriptions for {phone_number}")
                 continue
@@ -146,6 +182,8 @@ async def process_unprocessed_callrails():
                     overall_score=scores.overall_score,
                     updated_at=datetime.now()
                 )
+                # queryset updates bypass the model signals that keep the chat context cache fresh
+                invalidate_client_context(client_id=recent_call.get("client_id"))
        
             else:
                 await LeadScore.create(
@@ -161,30 +199,70 @@ async def process_unprocessed_callrails():
                     updated_at=datetime.now()
                 )
 
-            # 6. Mark all these calls as processed via Laravel API
-            update_tasks = []
-            for call in calls:
-                update_url = f"{API_URL}/api/update_call/{call['id']}"
-                update_tasks.append(mark_call_as_processed(update_url))
-
-            await asyncio.gather(*update_tasks)
+            # 6. Queue these calls to be marked processed (flushed in bulk)
+            await mark_batcher.add_many([call.get("id") for call in calls])
 
     finally:
-        await Tortoise.close_connections()
+        # Guaranteed final flush before the ORM goes away
+        await mark_batcher.close()
+        print(f"[{datetime.now()}] Mark-processed batching: {mark_batcher.report()}")
+        if manage_orm:
+            await Tortoise.close_connections()
 
-async def mark_call_as_processed(update_url):
-    async with httpx.AsyncClient(timeout=10.0) as client:
-        try:
-            response = await client.get(update_url, headers=headers)
-            response.raise_for_status()
-            if response.status_code == 200:
-                print(f"Marked call as processed: {update_url}")
-            else:
-                print(f"Unexpected status for {update_url}: {response.status_code}")
-        except httpx.HTTPStatusError as e:
-            print(f"Failed to mark call: {update_url}, error: {e}")
-        except Exception as e:
-            print(f"Error in marking call: {update_url}, error: {e}")
+
+async def mark_calls_as_processed(call_ids: List[Any]) -> int:
+    """
+    Mark many calls processed with one HTTP client.
+    With CALLRAIL_MARK_PROCESSED_BULK_PATH set, one POST for the whole batch
+    (falling back to per-call GETs on 404/405); otherwise one GET per id.
+    Raises if any id could not be marked, so the batcher keeps the batch and
+    retries it (the update endpoint is idempotent). Returns the requests made.
+    """
+    if not call_ids:
+        return 0
+    requests_made = 0
+    async with httpx.AsyncClient(timeout=30.0) as client:
+        if MARK_PROCESSED_BULK_PATH:
+            bulk_url = f"{API_URL}{MARK_PROCESSED_BULK_PATH}"
+            requests_made += 1
+            try:
+                response = await client.post(bulk_url, json={"ids": call_ids}, headers=headers)
+                if response.status_code not in (404, 405):
+                    response.raise_for_status()
+                    print(f"Marked {len(call_ids)} call(s) as processed via {bulk_url}")
+                    return requests_made
+                print(f"Bulk endpoint unavailable ({response.status_code}); marking {len(call_ids)} call(s) individually")
+            except httpx.HTTPStatusError as e:
+                print(f"Bulk mark failed: {bulk_url}, error: {e}; falling back to per-call updates")
+
+        results = await asyncio.gather(*[
+            mark_call_as_processed(f"{API_URL}/api/update_call/{call_id}", client=client)
+            for call_id in call_ids
+        ], return_exceptions=True)
+        requests_made += len(call_ids)
+        failed = [cid for cid, r in zip(call_ids, results) if isinstance(r, BaseException)]
+        if failed:
+            raise RuntimeError(f"{len(failed)} of {len(call_ids)} call(s) not marked processed: {failed[:10]}")
+        return requests_made
+
+
+async def mark_call_as_processed(update_url, client: Optional[httpx.AsyncClient] = None):
+    if client is None:
+        async with httpx.AsyncClient(timeout=10.0) as own_client:
+            return await mark_call_as_processed(update_url, client=own_client)
+    try:
+        response = await client.get(update_url, headers=headers)
+        response.raise_for_status()
+        if response.status_code == 200:
+            print(f"Marked call as processed: {update_url}")
+        else:
+            print(f"Unexpected status for {update_url}: {response.status_code}")
+    except httpx.HTTPStatusError as e:
+        print(f"Failed to mark call: {update_url}, error: {e}")
+        raise
+    except Exception as e:
+        print(f"Error in marking call: {update_url}, error: {e}")
+        raise
 
 
 # shoaib code start# 
@@ -305,7 +383,7 @@ async def process_unprocessed_callrails_no_store(call_data: List[dict]) -> Dict[
     # Initialize Tortoise only if available in this runtime
     try:
         await Tortoise.init(config=TORTOISE_CONFIG)  # you already import this at top
-        await Tortoise.generate_schemas()
+        await prepare_schema()
         tortoise_inited = True
     except Exception:
         # Safe to continue if your scoring/transcription does not require DB
@@ -340,6 +418,8 @@ async def process_unprocessed_callrails_no_store(call_data: List[dict]) -> Dict[
 
             transcriptions: List[str] = []
             recordings_out: List[dict] = []
+            # calls another worker is transcribing right now; not waited for inside the request
+            in_progress: List[str] = []
 
             for call in calls:
                 recording_url = call.get("call_recording") or call.get("recording")
@@ -349,12 +429,14 @@ async def process_unprocessed_callrails_no_store(call_data: List[dict]) -> Dict[
                 # 1) Transcription via your existing processor (optional)
                 call_id = _extract_call_id_from_url(recording_url) or "call"
                 try:
-                    result = await processor.process_call(
-                        account_id=(CALLRAIL_ACCOUNT_ID or "562206937"),
-                        call_id=call_id
-                    )
-                    if result and result.get("transcription"):
-                        transcriptions.append(result["transcription"])
+                    # no CallRail id → nothing to key the shared index on (or to fetch by)
+                    transcription = await _transcribe_once(
+                        CALLRAIL_ACCOUNT_ID or "562206937", call_id, call, source="fetch-data", wait_seconds=0,
+                    ) if call_id != "call" else None
+                    if transcription:
+                        transcriptions.append(transcription)
+                    elif call_id != "call" and JOB_QUEUE_ENABLED and await get_job_queue().call_in_progress(call_id):
+                        in_progress.append(call_id)
                 except Exception as e:
                     print(f"Transcription error for {phone_number}/{call_id}: {e}")
 
@@ -369,7 +451,7 @@ async def process_unprocessed_callrails_no_store(call_data: List[dict]) -> Dict[
                 except Exception as e:
                     print(f"Audio fetch error for {phone_number}: {e}")
 
-            if not transcriptions and not recordings_out:
+            if not transcriptions and not recordings_out and not in_progress:
                 print(f"[{datetime.now()}] No valid transcriptions/recordings for {phone_number}")
                 continue
 
@@ -434,6 +516,9 @@ async def process_unprocessed_callrails_no_store(call_data: List[dict]) -> Dict[
                 "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                 # ✅ All recordings for this phone group
                 "recordings": recordings_out,  # [{ filename, mime, duration?, data_b64 }]
+                # call ids still being transcribed elsewhere; send the group again later for them
+                "transcription_status": "in_progress" if in_progress else "done",
+                "calls_in_progress": in_progress,
             })
 
         return {"data": results}
@@ -0,0 +1,179 @@
+# helper/work_lanes.py
+"""
+Priority lanes for work that shares this process with chat and SSE.
+
+    interactive  request/response paths (chat, widget, streams) - the default lane
+    user_batch   runs a user started and is watching (/process-user-clients, /manually)
+    nightly      unattended runs (cron_job.py, the in-app job scheduler, business posts)
+
+Expensive steps take a slot on a resource before running:
+
+    cpu  local transcription (faster-whisper already uses every core but one)
+    llm  outbound LLM calls (scoring, transcript formatting)
+
+Every resource has a total capacity and a cap per lane. For llm the batch lanes are
+capped below the total, so interactive work always finds free capacity. cpu has a
+single slot that any lane may hold (a second concurrent transcription would only
+fight the first for cores), so there interactive work is not guaranteed a free slot:
+it waits for the running transcription and is served ahead of every batch waiter.
+When a slot frees up, waiters are served strictly by lane priority and then in
+arrival order.
+
+The lane is carried in a contextvar, so deep helpers only say
+`async with work_slot("llm")` and inherit the lane of whoever started the run.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional
+
+from helper.metrics import counter, gauge, histogram
+
+INTERACTIVE = "interactive"
+USER_BATCH = "user_batch"
+NIGHTLY = "nightly"
+LANES = (INTERACTIVE, USER_BATCH, NIGHTLY)  # highest priority first
+
+# total slots per resource, and each lane's share of them
+_DEFAULT_BUDGETS: Dict[str, Dict[str, int]] = {
+    "cpu": {"total": 1, INTERACTIVE: 1, USER_BATCH: 1, NIGHTLY: 1},
+    "llm": {"total": 16, INTERACTIVE: 16, USER_BATCH: 6, NIGHTLY: 3},
+}
+
+
+def _budget(resource: str, key: str) -> int:
+    # e.g. WORK_LLM_TOTAL=16, WORK_LLM_NIGHTLY=3
+    default = _DEFAULT_BUDGETS[resource][key]
+    return max(1, int(os.getenv(f"WORK_{resource.upper()}_{key.upper()}", str(default))))
+
+
+LANE_QUEUE_DEPTH = gauge("work_lane_queue_depth", "Tasks waiting for a resource slot, by lane and resource")
+LANE_IN_FLIGHT = gauge("work_lane_in_flight", "Resource slots held, by lane and resource")
+LANE_WAIT = histogram(
+    "work_lane_wait_seconds", "Time spent waiting for a resource slot, by lane and resource",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0),
+)
+LANE_GRANTS = counter("work_lane_grants_total", "Resource slots granted, by lane and resource")
+
+_current_lane: ContextVar[str] = ContextVar("work_lane", default=INTERACTIVE)
+
+
+class LaneResource:
+    def __init__(self, name: str, capacity: int, caps: Dict[str, int]):
+        self.name = name
+        self.capacity = capacity
+        self.caps = {lane: min(capacity, caps.get(lane, capacity)) for lane in LANES}
+        self.in_use: Dict[str, int] = {lane: 0 for lane in LANES}
+        self.waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+
+    def _can_run(self, lane: str) -> bool:
+        return sum(self.in_use.values()) < self.capacity and self.in_use[lane] < self.caps[lane]
+
+    def _grant(self, lane: str) -> None:
+        self.in_use[lane] += 1
+        LANE_GRANTS.inc(labels={"lane": lane, "resource": self.name})
+
+    def _publish(self, lane: str) -> None:
+        labels = {"lane": lane, "resource": self.name}
+        LANE_QUEUE_DEPTH.set(len(self.waiters[lane]), labels=labels)
+        LANE_IN_FLIGHT.set(self.in_use[lane], labels=labels)
+
+    async def acquire(self, lane: str) -> float:
+        """Wait for a slot in `lane`; returns the seconds spent waiting."""
+        started = time.perf_counter()
+        if not self.waiters[lane] and self._can_run(lane):
+            self._grant(lane)
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self.waiters[lane].append(fut)
+            self._publish(lane)
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    # granted in the same tick we were cancelled: hand the slot on
+                    self.release(lane)
+                else:
+                    try:
+                        self.waiters[lane].remove(fut)
+                    except ValueError:
+                        pass
+                    self._publish(lane)
+                raise
+        waited = time.perf_counter() - started
+        LANE_WAIT.observe(waited, labels={"lane": lane, "resource": self.name})
+        self._publish(lane)
+        return waited
+
+    def release(self, lane: str) -> None:
+        self.in_use[lane] = max(0, self.in_use[lane] - 1)
+        self._dispatch()
+        self._publish(lane)
+
+    def _dispatch(self) -> None:
+        for lane in LANES:
+            queue = self.waiters[lane]
+            while queue and self._can_run(lane):
+                fut = queue.popleft()
+                if fut.done():
+                    continue
+                self._grant(lane)
+                fut.set_result(None)
+            self._publish(lane)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "lanes": {
+                lane: {"cap": self.caps[lane], "in_use": self.in_use[lane], "waiting": len(self.waiters[lane])}
+                for lane in LANES
+            },
+        }
+
+
+def _make_resource(name: str) -> LaneResource:
+    return LaneResource(name, _budget(name, "total"), {lane: _budget(name, lane) for lane in LANES})
+
+
+RESOURCES: Dict[str, LaneResource] = {name: _make_resource(name) for name in _DEFAULT_BUDGETS}
+
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+@contextmanager
+def lane(name: str) -> Iterator[str]:
+    """Run the enclosed block (and every task it spawns) in lane `name`."""
+    if name not in LANES:
+        raise ValueError(f"Unknown work lane '{name}'")
+    token = _current_lane.set(name)
+    try:
+        yield name
+    finally:
+        _current_lane.reset(token)
+
+
+async def run_in_lane(name: str, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+    """`await fn(*args, **kwargs)` in lane `name` - handy for BackgroundTasks.add_task."""
+    with lane(name):
+        return await fn(*args, **kwargs)
+
+
+@asynccontextmanager
+async def work_slot(resource: str, lane_name: Optional[str] = None):
+    """Hold one `resource` slot for the current lane (or `lane_name`) while the block runs."""
+    res = RESOURCES[resource]
+    which = lane_name or current_lane()
+    await res.acquire(which)
+    try:
+        yield
+    finally:
+        res.release(which)
+
+
+def lanes_report() -> Dict[str, Any]:
+    return {name: res.report() for name, res in RESOURCES.items()}
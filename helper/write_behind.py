@@ -0,0 +1,155 @@
+# helper/write_behind.py
+import asyncio
+import logging
+import time
+import weakref
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger("uvicorn.error")
+
+# Every live batcher registers here so the app lifespan can flush them on shutdown.
+_ACTIVE_BATCHERS: "weakref.WeakSet[WriteBehindBatcher]" = weakref.WeakSet()
+
+
+class WriteBehindBatcher:
+    """
+    Collects ids and hands them to `flush_fn` in bulk.
+
+    `flush_fn` may return how many round-trips it actually used (e.g. when it
+    had to fall back to per-row requests); otherwise one per flush is assumed.
+
+    A flush happens when `max_batch` ids are pending, when the oldest pending id
+    is `max_delay` seconds old, or when `flush()` / `close()` is called.
+    Use it as `async with WriteBehindBatcher(...) as b:` to guarantee the final flush.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        flush_fn: Callable[[List[Any]], Awaitable[Optional[int]]],
+        max_batch: int = 100,
+        max_delay: float = 2.0,
+    ):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = float(max_delay)
+
+        self._pending: List[Any] = []
+        self._seen: set = set()
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._closed = False
+
+        self.stats: Dict[str, Any] = {
+            "flushes": 0,
+            "rows": 0,
+            "max_rows_per_flush": 0,
+            "round_trips": 0,
+            "failed_flushes": 0,
+        }
+        _ACTIVE_BATCHERS.add(self)
+
+    async def __aenter__(self) -> "WriteBehindBatcher":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def add(self, item_id: Any) -> None:
+        """Queue one id; duplicates within the pending window are ignored."""
+        if item_id is None:
+            return
+        if self._closed:
+            raise RuntimeError(f"Batcher '{self.name}' is closed")
+
+        flush_now = False
+        async with self._lock:
+            if item_id in self._seen:
+                return
+            self._seen.add(item_id)
+            self._pending.append(item_id)
+            if len(self._pending) >= self.max_batch:
+                flush_now = True
+            elif self._timer is None or self._timer.done():
+                self._timer = asyncio.create_task(self._flush_after_delay())
+
+        if flush_now:
+            await self.flush()
+
+    async def add_many(self, item_ids: List[Any]) -> None:
+        for item_id in item_ids:
+            await self.add(item_id)
+
+    async def _flush_after_delay(self) -> None:
+        try:
+            await asyncio.sleep(self.max_delay)
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+
+    async def flush(self) -> int:
+        """Write out everything pending. Returns the number of ids flushed."""
+        async with self._lock:
+            batch = self._pending
+            self._pending = []
+            self._seen = set()
+            if self._timer is not None and not self._timer.done() and self._timer is not asyncio.current_task():
+                self._timer.cancel()
+            self._timer = None
+
+            if not batch:
+                return 0
+
+            start = time.perf_counter()
+            try:
+                used = await self.flush_fn(batch)
+            except Exception as e:
+                # keep the ids so the next flush (or close) retries them
+                self.stats["failed_flushes"] += 1
+                self._pending = batch + self._pending
+                self._seen.update(batch)
+                logger.exception("[write-behind:%s] flush of %d id(s) failed: %s", self.name, len(batch), e)
+                return 0
+
+            self.stats["flushes"] += 1
+            self.stats["rows"] += len(batch)
+            self.stats["max_rows_per_flush"] = max(self.stats["max_rows_per_flush"], len(batch))
+            self.stats["round_trips"] += used if isinstance(used, int) else 1
+            logger.info(
+                "[write-behind:%s] flushed %d id(s) in %.1f ms",
+                self.name, len(batch), (time.perf_counter() - start) * 1000.0,
+            )
+            return len(batch)
+
+    async def close(self) -> None:
+        """Final flush; the batcher rejects new ids afterwards."""
+        if self._closed:
+            return
+        await self.flush()
+        self._closed = True
+        _ACTIVE_BATCHERS.discard(self)
+        logger.info("[write-behind:%s] closed %s", self.name, self.report())
+
+    def report(self) -> Dict[str, Any]:
+        flushes = self.stats["flushes"]
+        rows = self.stats["rows"]
+        return {
+            "flushes": flushes,
+            "rows": rows,
+            "avg_rows_per_flush": round(rows / flushes, 2) if flushes else 0,
+            "max_rows_per_flush": self.stats["max_rows_per_flush"],
+            "failed_flushes": self.stats["failed_flushes"],
+            "round_trips": self.stats["round_trips"],
+            # one request per row is what we did before batching
+            "round_trips_saved": max(0, rows - self.stats["round_trips"]),
+        }
+
+
+async def flush_all_batchers() -> None:
+    """Flush every live batcher (called from the app lifespan on shutdown)."""
+    for batcher in list(_ACTIVE_BATCHERS):
+        try:
+            await batcher.close()
+        except Exception as e:
+            logger.exception("[write-behind:%s] shutdown flush failed: %s", batcher.name, e)
@@ -18,6 +18,8 @@ from controller.client_lead_message_suggest import router as lead_message
 from controller.clientleads_and_callrail_controller import router as clientlead_router
 from controller.chat_widget_controller import router as chat_widget_router
 from controller.analysis_controller import router as analysis_router
+from controller.metrics_controller import router as metrics_router
+from controller.cache_controller import router as cache_router
 
 
 app = FastAPI(lifespan=lifespan)
@@ -42,6 +44,8 @@ app.include_router(score_router, prefix="/api", tags=["score"])
 app.include_router(lead_message, prefix="/api", tags=["lead-message"])
 app.include_router(clientlead_router, prefix="/api", tags=["client-leads"])
 app.include_router(analysis_router, prefix="/api", tags=["analysis"])
+app.include_router(metrics_router, prefix="/api", tags=["metrics"])
+app.include_router(cache_router, prefix="/api", tags=["cache"])
 
 
 # generated images for post
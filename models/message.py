@@ -1,4 +1,5 @@
 from tortoise import fields, models
+from tortoise.indexes import Index
 
 class Message(models.Model):
     id = fields.IntField(pk=True)
@@ -8,4 +9,6 @@ class Message(models.Model):
     bot_response = fields.TextField()
     created_at = fields.DatetimeField(auto_now_add=True)
 
-  
\ No newline at end of file
+    class Meta:
+        # last-N-per-chat history reads (helper/chat_context.py); migration 51
+        indexes = (Index(fields=("chat_id", "created_at"), name="idx_message_chat_created"),)
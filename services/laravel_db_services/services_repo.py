@@ -1,46 +1,86 @@
 # services/laravel_db_services/services_repo.py
-from typing import List, Dict, Optional
+import logging
+import os
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from sqlalchemy import text
-from helper.laravel_db import laravel_session
+from sqlalchemy.sql.elements import TextClause
+from helper.laravel_db import laravel_session, execute_named, fetch_all, fetch_one
+from helper.catalog_cache import SERVICE_CACHE, invalidate_services
+from helper.service_index import ServiceIndex, get_index
 
-# ---- READS ----
+logger = logging.getLogger("uvicorn.error")
+
+# Above this many services the in-memory index is skipped and search goes to SQL
+SERVICE_INDEX_MAX_ROWS = int(os.getenv("SERVICE_INDEX_MAX_ROWS", "50000"))
+_CATALOG_KEY = ("all",)
+
+def _sync_index(key, rows) -> None:
+    # every (re)load of the full catalog re-indexes only the rows that changed
+    if key == _CATALOG_KEY:
+        stats = get_index().sync(rows)
+        logger.info("[service-index] synced %s", stats)
+
+SERVICE_CACHE.on_load(_sync_index)
+
+async def _load_catalog() -> List[Dict]:
+    return await fetch_all("service.all", {"limit": SERVICE_INDEX_MAX_ROWS + 1})
+
+async def service_index() -> Optional[ServiceIndex]:
+    """The indexed catalog, or None when it can't be used (load failed / catalog too big)."""
+    try:
+        rows = await SERVICE_CACHE.get(_CATALOG_KEY, _load_catalog)
+    except Exception as e:
+        logger.warning("[service-index] catalog load failed, falling back to SQL search: %s", e)
+        return None
+    if len(rows) > SERVICE_INDEX_MAX_ROWS:
+        return None
+    idx = get_index()
+    if rows and not len(idx):
+        # the load raced an invalidation and wasn't cached, so the listener never ran
+        idx.sync(rows)
+    return idx
+
+# ---- READS (read-through cached; see helper/catalog_cache.py) ----
 async def service_list(limit: int = 50, offset: int = 0) -> List[Dict]:
-    q = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE deleted_at IS NULL
-        ORDER BY name ASC
-        LIMIT :limit OFFSET :offset
-    """)
-    async with laravel_session() as s:
-        rows = (await s.execute(q, {"limit": int(limit), "offset": int(offset)})).mappings().all()
-        return [dict(r) for r in rows]
+    params = {"limit": int(limit), "offset": int(offset)}
+    return await SERVICE_CACHE.get(
+        ("list", params["limit"], params["offset"]),
+        lambda: fetch_all("service.list", params),
+    )
 
 async def service_get(service_id: int) -> Optional[Dict]:
-    q = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE id = :sid AND deleted_at IS NULL
-        LIMIT 1
-    """)
-    async with laravel_session() as s:
-        row = (await s.execute(q, {"sid": int(service_id)})).mappings().first()
-        return dict(row) if row else None
+    sid = int(service_id)
+    # don't pin a "not found" for the whole TTL; the row may be created right after
+    return await SERVICE_CACHE.get(
+        ("get", sid),
+        lambda: fetch_one("service.get", {"sid": sid}),
+        should_cache=lambda row: row is not None,
+    )
 
 async def service_search(qstr: str, limit: int = 25) -> List[Dict]:
-    q = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE deleted_at IS NULL
-          AND (name LIKE :q OR description LIKE :q)
-        ORDER BY name ASC
-        LIMIT :limit
-    """)
-    async with laravel_session() as s:
-        rows = (await s.execute(q, {"q": f"%{qstr.strip()}%", "limit": int(limit)})).mappings().all()
-        return [dict(r) for r in rows]
+    q = qstr.strip()
+    idx = await service_index()
+    if idx is not None:
+        return idx.search(q, limit=limit)
+    params = {"q": f"%{q}%", "limit": int(limit)}
+    return await SERVICE_CACHE.get(
+        ("search", q.lower(), params["limit"]),
+        lambda: fetch_all("service.search", params),
+    )
 
 # ---- WRITE (guarded) ----
+@lru_cache(maxsize=8)
+def _update_stmt(field_names: Tuple[str, ...]) -> TextClause:
+    # one compiled UPDATE per combination of changed columns (at most 7)
+    set_frag = ", ".join([f"`{k}` = :{k}" for k in field_names])
+    return text(f"""
+        UPDATE services
+        SET {set_frag}
+        WHERE id = :sid AND deleted_at IS NULL
+        LIMIT 1
+    """)
+
 async def service_update(service_id: int, *, name: Optional[str] = None,
                          description: Optional[str] = None,
                          for_report: Optional[int] = None) -> Dict:
@@ -58,26 +98,18 @@ async def service_update(service_id: int, *, name: Optional[str] = None,
     if not fields:
         return {"ok": False, "error": "No fields to update"}
 
-    set_frag = ", ".join([f"`{k}` = :{k}" for k in fields.keys()])
     params = dict(fields)
     params["sid"] = int(service_id)
-
-    q_upd = text(f"""
-        UPDATE services
-        SET {set_frag}
-        WHERE id = :sid AND deleted_at IS NULL
-        LIMIT 1
-    """)
-    q_get = text("""
-        SELECT id, name, description, for_report
-        FROM services
-        WHERE id = :sid AND deleted_at IS NULL
-        LIMIT 1
-    """)
+    q_upd = _update_stmt(tuple(fields.keys()))
 
     async with laravel_session() as s:
-        res = await s.execute(q_upd, params)
+        res = await execute_named(s, "service.update", params, stmt=q_upd)
         # rows_affected always 0/1 because of LIMIT 1 + PK
         updated = res.rowcount or 0
-        row = (await s.execute(q_get, {"sid": int(service_id)})).mappings().first()
-        return {"ok": updated > 0, "updated": updated, "service": (dict(row) if row else None)}
+        row = (await execute_named(s, "service.get", {"sid": int(service_id)})).mappings().first()
+    if updated:
+        # list/search pages may contain the old name/description too
+        invalidate_services()
+        if row:
+            get_index().upsert(dict(row))
+    return {"ok": updated > 0, "updated": updated, "service": (dict(row) if row else None)}